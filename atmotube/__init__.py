@@ -1,9 +1,30 @@
-from .ble import (get_ble_packet,
+from .aggregate import (QuantileSketch,
+                        Summary,
+                        Window,
+                        WindowedAggregator)
+from .batching import (Batcher,
+                       Delivery)
+from .ble import (ScanStats,
+                  get_ble_packet,
                   ble_callback_wrapper)
+from .capture import (InvalidCaptureFile,
+                      CaptureSource,
+                      CaptureRecord,
+                      CaptureWriter,
+                      CaptureReader)
+from .decode_cache import DecodeCache
+from .discovery import (CharacteristicCache,
+                        read_firmware_version,
+                        start_cached_notifications)
+from .dispatch import (DispatchStats,
+                       ExecutorDispatcher)
 from .gatt import (InvalidAtmotubeService,
                    gatt_notify,
                    start_gatt_notifications,
+                   stop_gatt_notifications,
                    get_available_characteristics)
+from .join import (Reading,
+                   ReadingJoiner)
 from .packets import (InvalidByteData,
                       AtmotubeGATTPacket,
                       AtmotubeBLEPacket,
@@ -13,9 +34,36 @@ from .packets import (InvalidByteData,
                       AtmotubeProSGPC3,
                       AtmotubeProBLEAdvertising,
                       AtmotubeProBLEScanResponse)
+from .records import (AtmotubeGATTRecord,
+                      AtmotubeBLERecord,
+                      AtmotubeProStatusRecord,
+                      AtmotubeProSPS30Record,
+                      AtmotubeProBME280Record,
+                      AtmotubeProSGPC3Record,
+                      AtmotubeProBLEAdvertisingRecord,
+                      AtmotubeProBLEScanResponseRecord)
+from .replay import (ReplayStats,
+                     FakeBleakClient,
+                     FakeBleakScanner)
+from .session import (Gap,
+                      DeviceStats,
+                      GATTSession)
+from .simulate import (VirtualAtmotube,
+                       virtual_fleet,
+                       fake_clients,
+                       fake_scanner)
+from .sink import (SinkStats,
+                   Sink)
+from .sqlite import SQLiteSink
+from .streaming import (OverflowPolicy,
+                        StreamStats,
+                        PacketBuffer,
+                        stream,
+                        ble_stream)
 from .uuids import (AtmotubeProService_UUID,
                     AtmotubeProGATT_UUID,
-                    AtmotubeProUART_UUID)
+                    AtmotubeProUART_UUID,
+                    DeviceInformation_UUID)
 
 
 __version__ = "0.0.1"
@@ -0,0 +1,397 @@
+from bleak import BLEDevice
+from collections.abc import Callable, Iterable
+from functools import partial
+from typing import Any, NamedTuple
+
+import asyncio
+import inspect
+import math
+
+# The readings aggregated by default, every packet class has some of them
+DEFAULT_FIELDS = ("pm1", "pm2_5", "pm4", "pm10", "tvoc", "temperature",
+                  "humidity", "pressure")
+
+
+class QuantileSketch:
+    """
+    A mergeable sketch of a distribution that answers quantile queries
+    within a relative error, in bounded memory.
+
+    Values are counted in logarithmically sized buckets, the bucket of a
+    value x covers ``(gamma**(k-1), gamma**k]`` with
+    ``gamma = (1 + relative_accuracy) / (1 - relative_accuracy)``, so any
+    value reported from a bucket is within ``relative_accuracy`` of every
+    value counted in it. Negative values are counted in a second set of
+    buckets and values close to zero on their own. Once there are more than
+    ``max_buckets`` buckets on either side, the buckets closest to zero are
+    merged, which only loses accuracy for the smallest values.
+
+    :param relative_accuracy: The relative error of the quantiles
+    :type relative_accuracy: float
+    :param max_buckets: The most buckets on each side of zero
+    :type max_buckets: int
+    """
+    # Values smaller than this are counted as zero
+    _MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if max_buckets < 1:
+            raise ValueError("max_buckets must be at least 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.count = 0
+        self.zeros = 0
+        self._positive: dict[int, int] = {}
+        self._negative: dict[int, int] = {}
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # The middle of a bucket, in the relative sense
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        """
+        Count a value.
+        """
+        self.count += 1
+        if value > self._MIN_VALUE:
+            buckets = self._positive
+            key = self._key(value)
+        elif value < -self._MIN_VALUE:
+            buckets = self._negative
+            key = self._key(-value)
+        else:
+            self.zeros += 1
+            return
+        buckets[key] = buckets.get(key, 0) + 1
+        if len(buckets) > self.max_buckets:
+            self._collapse(buckets)
+
+    def _collapse(self, buckets: dict[int, int]) -> None:
+        # Merge the buckets closest to zero, until there are max_buckets
+        keys = sorted(buckets)
+        excess = len(keys) - self.max_buckets
+        buckets[keys[excess]] += sum(buckets.pop(key)
+                                     for key in keys[:excess])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """
+        Add the values counted by another sketch with the same accuracy.
+        """
+        if other._gamma != self._gamma:
+            raise ValueError("Can't merge sketches with different "
+                             "accuracies")
+        self.count += other.count
+        self.zeros += other.zeros
+        for mine, theirs in ((self._positive, other._positive),
+                             (self._negative, other._negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+            if len(mine) > self.max_buckets:
+                self._collapse(mine)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        The value at quantile ``q``, between 0 and 1, or None if the sketch
+        is empty.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self._positive))
+
+    def __len__(self) -> int:
+        return len(self._positive) + len(self._negative)
+
+
+class Summary:
+    """
+    The aggregate of one reading over a window: the count, sum, minimum and
+    maximum of the valid values, a :class:`QuantileSketch` of them, and the
+    number of readings that were ``None``.
+
+    :param relative_accuracy: The relative error of the quantiles
+    :type relative_accuracy: float
+    :param max_buckets: The most buckets kept by the quantile sketch
+    :type max_buckets: int
+    """
+    def __init__(self, relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048):
+        self.count = 0
+        self.missing = 0
+        self.total = 0.0
+        self.min: float | None = None
+        self.max: float | None = None
+        self.sketch = QuantileSketch(relative_accuracy, max_buckets)
+
+    def add(self, value: float | None) -> None:
+        """
+        Add a reading, ``None`` readings are only counted as missing.
+        """
+        if value is None:
+            self.missing += 1
+            return
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    def merge(self, other: "Summary") -> None:
+        """
+        Add the readings of another summary.
+        """
+        self.count += other.count
+        self.missing += other.missing
+        self.total += other.total
+        if other.min is not None and (self.min is None
+                                      or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None
+                                      or other.max > self.max):
+            self.max = other.max
+        self.sketch.merge(other.sketch)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        """
+        The approximate value at quantile ``q``, between 0 and 1, or None if
+        there were no valid readings. The minimum and maximum are exact.
+        """
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return min(max(value, self.min), self.max)
+
+    def __repr__(self) -> str:
+        return (f"Summary(count={self.count}, missing={self.missing}, "
+                f"mean={self.mean}, min={self.min}, max={self.max})")
+
+
+class Window(NamedTuple):
+    """
+    A closed window of one device, from ``start_ns`` up to, but not
+    including, ``end_ns``, with a :class:`Summary` of each reading that
+    appeared in it.
+    """
+    address: str | None
+    start_ns: int
+    end_ns: int
+    summaries: dict[str, Summary]
+
+
+class _Device:
+    # The open panes of one device, and the end pane of the next window
+    __slots__ = ("panes", "next_end")
+
+    def __init__(self, pane: int):
+        self.panes: dict[int, dict[str, Summary]] = {}
+        self.next_end = pane
+
+
+class WindowedAggregator:
+    """
+    Aggregates the readings of packets, records or readings from a
+    :class:`ReadingJoiner`, per device, over tumbling or sliding windows of
+    time, calling a callback with every :class:`Window` as it closes.
+
+    Windows are aligned to the epoch and made of panes ``slide`` seconds
+    long, the readings of a packet are added to the summaries of its pane,
+    so adding a packet takes constant time, and each window is merged from
+    its panes when it closes. Without a ``slide`` the windows tumble, they
+    are back to back. A window closes once a packet of the device arrives
+    ``allowed_lateness`` seconds after its end, packets arriving after their
+    windows have closed are dropped and counted in ``late``. Call
+    :meth:`advance` to close windows when packets stop, and :meth:`flush`
+    to close every window, including the ones still open.
+
+    Only the panes of open windows are kept, and the quantile sketches are
+    bounded, so the memory used per device doesn't grow with time.
+
+    :param callback: Called with each closed window
+    :type callback: Callable[[Window], None]
+    :param window: The length of the windows, in seconds
+    :type window: float
+    :param slide: The time between the starts of successive windows, in
+        seconds, which must divide ``window``, or None for tumbling windows
+    :type slide: float | None
+    :param fields: The readings to aggregate, readings a packet doesn't have
+        are skipped
+    :type fields: Iterable[str]
+    :param allowed_lateness: How long to wait for late packets before
+        closing a window, in seconds
+    :type allowed_lateness: float
+    :param relative_accuracy: The relative error of the quantiles
+    :type relative_accuracy: float
+    :param max_buckets: The most buckets kept by each quantile sketch
+    :type max_buckets: int
+    """
+    def __init__(self, callback: Callable[[Window], None], window: float,
+                 slide: float | None = None,
+                 fields: Iterable[str] = DEFAULT_FIELDS,
+                 allowed_lateness: float = 0.0,
+                 relative_accuracy: float = 0.01,
+                 max_buckets: int = 2048):
+        slide = window if slide is None else slide
+        self._slide_ns = round(slide * 1e9)
+        self._window_ns = round(window * 1e9)
+        if self._slide_ns <= 0 or self._window_ns % self._slide_ns:
+            raise ValueError("window must be a positive multiple of slide")
+        if allowed_lateness < 0:
+            raise ValueError("allowed_lateness must not be negative")
+        self.callback = callback
+        self.fields = tuple(fields)
+        self.late = 0
+        self._panes_per_window = self._window_ns // self._slide_ns
+        self._lateness_ns = round(allowed_lateness * 1e9)
+        self._summary = (relative_accuracy, max_buckets)
+        self._devices: dict[str | None, _Device] = {}
+        # The fields each packet class has
+        self._class_fields: dict[type, tuple[str, ...]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def _fields_of(self, packet_cls: type) -> tuple[str, ...]:
+        names = getattr(packet_cls, "_field_names_", None) \
+            or getattr(packet_cls, "_fields", ())
+        fields = self._class_fields[packet_cls] = tuple(
+            name for name in self.fields if name in names)
+        return fields
+
+    def add(self, packet: Any, address: str | None = None) -> None:
+        """
+        Add the readings of a packet, closing the windows that ended
+        ``allowed_lateness`` before it.
+        """
+        fields = self._class_fields.get(type(packet))
+        if fields is None:
+            fields = self._fields_of(type(packet))
+        timestamp_ns = packet.timestamp_ns
+        pane = timestamp_ns // self._slide_ns
+        device = self._devices.get(address)
+        if device is None:
+            device = self._devices[address] = _Device(pane)
+        elif pane + self._panes_per_window <= device.next_end:
+            self.late += 1
+            return
+        if fields:
+            summaries = device.panes.get(pane)
+            if summaries is None:
+                summaries = device.panes[pane] = {}
+            for name in fields:
+                summary = summaries.get(name)
+                if summary is None:
+                    summary = summaries[name] = Summary(*self._summary)
+                summary.add(getattr(packet, name))
+        self._close(address, device, timestamp_ns - self._lateness_ns)
+
+    def gatt_callback(self, address: str | None = None
+                      ) -> Callable[[Any], None]:
+        """
+        A callback for :func:`gatt_notify` or
+        :func:`start_gatt_notifications` that adds each packet with the
+        address of the device.
+        """
+        return partial(self.add, address=address)
+
+    def ble_callback(self, device: BLEDevice | None, packet: Any) -> None:
+        """
+        A callback for :func:`ble_callback_wrapper` that adds each packet
+        with the address of the device, skipping advertisements that aren't
+        from an Atmotube.
+        """
+        if packet is not None:
+            self.add(packet, device.address)
+
+    def _close(self, address: str | None, device: _Device,
+               watermark_ns: int) -> None:
+        # Emit the windows of a device that end at or before the watermark
+        last = watermark_ns // self._slide_ns - 1
+        while device.next_end <= last and device.panes:
+            first = min(device.panes)
+            if first > device.next_end:
+                # Skip over a gap with no packets
+                device.next_end = min(first, last + 1)
+                continue
+            self._emit(self._window(address, device, device.next_end))
+            device.panes.pop(device.next_end - self._panes_per_window + 1,
+                             None)
+            device.next_end += 1
+
+    def _window(self, address: str | None, device: _Device,
+                end: int) -> Window:
+        summaries = {}
+        for pane in range(end - self._panes_per_window + 1, end + 1):
+            for name, summary in device.panes.get(pane, {}).items():
+                if name not in summaries:
+                    summaries[name] = Summary(*self._summary)
+                summaries[name].merge(summary)
+        end_ns = (end + 1) * self._slide_ns
+        return Window(address, end_ns - self._window_ns, end_ns, summaries)
+
+    def _emit(self, window: Window) -> None:
+        if inspect.iscoroutinefunction(self.callback):
+            task = asyncio.create_task(self.callback(window))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.callback(window)
+
+    def advance(self, timestamp_ns: int) -> None:
+        """
+        Close the windows of every device that ended ``allowed_lateness``
+        before ``timestamp_ns``, for when packets stop arriving. Devices
+        with no open windows left are forgotten.
+        """
+        for address, device in list(self._devices.items()):
+            self._close(address, device, timestamp_ns - self._lateness_ns)
+            if not device.panes:
+                del self._devices[address]
+
+    def flush(self) -> None:
+        """
+        Close every window that has any packets in it, including the ones
+        that haven't ended yet, and forget every device.
+        """
+        for address, device in list(self._devices.items()):
+            if device.panes:
+                end = max(device.panes) + self._panes_per_window
+                self._close(address, device, end * self._slide_ns)
+        self._devices.clear()
+
+    async def close(self) -> None:
+        """
+        Close every window, see :meth:`flush`, and wait for the windows
+        being delivered.
+        """
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
@@ -0,0 +1,361 @@
+"""
+Air quality indices, NowCast averages and exposure from PM readings, over
+NumPy arrays, with streaming versions that give the same results one
+reading at a time.
+
+The array functions take the timestamps and PM concentrations (µg/m³) of
+the readings, such as the ``timestamp_ns`` or ``date_time`` and ``pm2_5``
+columns from :mod:`atmotube.columnar`, with NaN for invalid readings.
+Datetimes are converted like the timestamps of packets, naive datetimes
+such as ``packet.date_time`` are taken to be in local time.
+
+This module requires numpy, which is an optional dependency of PymoTube
+(``pip install PymoTube[numpy]``).
+"""
+from collections import deque
+from collections.abc import Sequence
+from typing import NamedTuple, TypeAlias
+
+import numpy as np
+
+from .clock import ns_from_datetime
+
+Timestamps: TypeAlias = Sequence[int] | np.ndarray
+Values: TypeAlias = Sequence[float | None] | np.ndarray
+
+_NS_PER_HOUR = 3_600_000_000_000
+
+
+class Breakpoints(NamedTuple):
+    """
+    The breakpoints of one pollutant in an index: each segment maps the
+    concentrations from ``low`` to ``high`` linearly onto the index values
+    from ``index_low`` to ``index_high``. Concentrations are truncated to
+    ``decimals`` places first, when given.
+    """
+    low: tuple[float, ...]
+    high: tuple[float, ...]
+    index_low: tuple[float, ...]
+    index_high: tuple[float, ...]
+    decimals: int | None = None
+
+
+class AQIScheme(NamedTuple):
+    """
+    An air quality index: the breakpoints of each pollutant, the names of
+    the categories and the highest index value of every category but the
+    last.
+    """
+    name: str
+    breakpoints: dict[str, Breakpoints]
+    categories: tuple[str, ...]
+    category_limits: tuple[float, ...]
+
+
+# The US EPA AQI, with the PM2.5 breakpoints revised in 2024. The index is
+# defined for 24 hour averages, or NowCast averages for current conditions
+US_EPA = AQIScheme(
+    "US EPA",
+    {"pm2_5": Breakpoints((0.0, 9.1, 35.5, 55.5, 125.5, 225.5),
+                          (9.0, 35.4, 55.4, 125.4, 225.4, 325.4),
+                          (0, 51, 101, 151, 201, 301),
+                          (50, 100, 150, 200, 300, 500), decimals=1),
+     "pm10": Breakpoints((0, 55, 155, 255, 355, 425),
+                         (54, 154, 254, 354, 424, 604),
+                         (0, 51, 101, 151, 201, 301),
+                         (50, 100, 150, 200, 300, 500), decimals=0)},
+    ("Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy",
+     "Very Unhealthy", "Hazardous"),
+    (50, 100, 150, 200, 300))
+
+# The European Common Air Quality Index, for hourly averages
+EU_CAQI = AQIScheme(
+    "EU CAQI",
+    {"pm2_5": Breakpoints((0, 15, 30, 55), (15, 30, 55, 110),
+                          (0, 25, 50, 75), (25, 50, 75, 100)),
+     "pm10": Breakpoints((0, 25, 50, 90), (25, 50, 90, 180),
+                         (0, 25, 50, 75), (25, 50, 75, 100))},
+    ("Very low", "Low", "Medium", "High", "Very high"),
+    (25, 50, 75, 100))
+
+
+def _to_ns(timestamps: Timestamps) -> np.ndarray:
+    # Integer nanoseconds since the epoch from ints or datetimes, converted
+    # like the packets' timestamp_ns, so naive datetimes are in local time.
+    # numpy datetimes, such as the date_time columns, are in UTC
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype.kind == 'M':
+        return timestamps.astype('datetime64[ns]').view(np.int64)
+    if timestamps.dtype.kind in 'iu' or not timestamps.size:
+        return timestamps.astype(np.int64, copy=False)
+    return np.fromiter(map(ns_from_datetime, timestamps.flat),
+                       dtype=np.int64, count=timestamps.size)
+
+
+def _to_float(values: Values) -> np.ndarray:
+    # Floats with NaN for the None readings
+    return np.asarray(values, dtype=float)
+
+
+def aqi(values: Values, pollutant: str = "pm2_5",
+        scheme: AQIScheme = US_EPA) -> np.ndarray:
+    """
+    The index values of concentrations of a pollutant, rounded to the
+    nearest integer. Concentrations above the last breakpoint carry on along
+    the last segment, and invalid readings are NaN.
+
+    :param values: The concentrations, in µg/m³, averaged the way the
+        scheme expects
+    :type values: Sequence[float | None] | np.ndarray
+    :param pollutant: ``"pm2_5"`` or ``"pm10"``
+    :type pollutant: str
+    :param scheme: The index, :data:`US_EPA` or :data:`EU_CAQI`
+    :type scheme: AQIScheme
+    :return: The index values
+    :rtype: np.ndarray
+    """
+    try:
+        breakpoints = scheme.breakpoints[pollutant]
+    except KeyError:
+        raise ValueError(f"{scheme.name} has no breakpoints for "
+                         f"{pollutant}") from None
+    values = _to_float(values)
+    if breakpoints.decimals is not None:
+        # The small offset keeps exact decimals from truncating down
+        scale = 10.0 ** breakpoints.decimals
+        values = np.floor(values * scale + 1e-9) / scale
+    low, high, index_low, index_high = (np.asarray(column, dtype=float)
+                                        for column in breakpoints[:4])
+    segment = np.clip(np.searchsorted(low, values, side='right') - 1,
+                      0, len(low) - 1)
+    index = (index_high[segment] - index_low[segment]) \
+        / (high[segment] - low[segment]) * (values - low[segment]) \
+        + index_low[segment]
+    return np.floor(np.where(values < 0, np.nan, index) + 0.5)
+
+
+def category(index: Values, scheme: AQIScheme = US_EPA) -> np.ndarray:
+    """
+    The category numbers of index values, which index
+    ``scheme.categories``, or -1 for NaN.
+
+    :param index: The index values
+    :type index: Sequence[float] | np.ndarray
+    :param scheme: The index the values come from
+    :type scheme: AQIScheme
+    :return: The categories
+    :rtype: np.ndarray
+    """
+    index = _to_float(index)
+    categories = np.searchsorted(scheme.category_limits, index, side='left')
+    return np.where(np.isnan(index), -1, categories).astype(np.int8)
+
+
+def hourly_means(timestamps: Timestamps, values: Values,
+                 period: float = 3600.0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The mean of the valid readings in each period, aligned to the epoch,
+    from the period of the first reading to the period of the last. Periods
+    without valid readings are NaN.
+
+    :param timestamps: The timestamps of the readings, in nanoseconds since
+        the epoch or as datetimes
+    :type timestamps: Sequence[int] | np.ndarray
+    :param values: The readings
+    :type values: Sequence[float | None] | np.ndarray
+    :param period: The length of each period, in seconds
+    :type period: float
+    :return: The start of each period, in nanoseconds since the epoch, and
+        the means
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    period_ns = round(period * 1e9)
+    bins = _to_ns(timestamps) // period_ns
+    values = _to_float(values)
+    if not bins.size:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    first = bins.min()
+    bins = bins - first
+    valid = ~np.isnan(values)
+    counts = np.bincount(bins[valid], minlength=bins.max() + 1)
+    sums = np.bincount(bins[valid], weights=values[valid],
+                       minlength=bins.max() + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    starts = (first + np.arange(len(means), dtype=np.int64)) * period_ns
+    return starts, means
+
+
+def _nowcast(hourly: np.ndarray, min_weight: float) -> np.ndarray:
+    # The NowCast of each row of an (N, hours) array of hourly means, the
+    # most recent last. At least two of the last three hours must be valid
+    valid = ~np.isnan(hourly)
+    enough = valid[:, -3:].sum(axis=1) >= 2
+    high = np.where(valid, hourly, -np.inf).max(axis=1)
+    low = np.where(valid, hourly, np.inf).min(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(high > 0, 1 - (high - low) / high, 1.0)
+    weight = np.clip(weight, min_weight, 1.0)
+    ages = np.arange(hourly.shape[1] - 1, -1, -1)
+    weights = np.where(valid, weight[:, np.newaxis] ** ages, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = (weights * np.where(valid, hourly, 0.0)).sum(axis=1) \
+            / weights.sum(axis=1)
+    return np.where(enough, result, np.nan)
+
+
+def nowcast(timestamps: Timestamps, values: Values, hours: int = 12,
+            min_weight: float = 0.5) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The EPA NowCast of PM readings at the end of every hour: an average of
+    the last ``hours`` hourly means weighted towards the most recent hours,
+    the more so the more the concentrations have been changing. An hour's
+    NowCast is NaN unless two of the last three hours have valid readings.
+
+    :param timestamps: The timestamps of the readings, in nanoseconds since
+        the epoch or as datetimes
+    :type timestamps: Sequence[int] | np.ndarray
+    :param values: The readings
+    :type values: Sequence[float | None] | np.ndarray
+    :param hours: The number of hourly means averaged
+    :type hours: int
+    :param min_weight: The lowest weight factor, 0.5 for particulates
+    :type min_weight: float
+    :return: The start of each hour, in nanoseconds since the epoch, and
+        the NowCast at the end of it
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    starts, means = hourly_means(timestamps, values)
+    padded = np.concatenate([np.full(hours - 1, np.nan), means])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, hours)
+    return starts, _nowcast(windows, min_weight)
+
+
+def _segments(timestamps: np.ndarray, values: np.ndarray,
+              max_gap: float) -> np.ndarray:
+    # The exposure between each pair of readings, by the trapezoid rule,
+    # or nothing across a gap or an invalid reading
+    hours = np.diff(timestamps) / _NS_PER_HOUR
+    exposure = (values[:-1] + values[1:]) / 2 * hours
+    skip = np.isnan(exposure) | (hours <= 0) | (hours > max_gap / 3600)
+    return np.where(skip, 0.0, exposure)
+
+
+def exposure(timestamps: Timestamps, values: Values,
+             max_gap: float = 300.0) -> np.ndarray:
+    """
+    The cumulative exposure at each reading, the integral of the
+    concentration over time in µg·h/m³, by the trapezoid rule. Gaps of more
+    than ``max_gap`` seconds between readings, and the time either side of
+    an invalid reading, aren't counted. Multiply by a breathing rate, in
+    m³/h, for the inhaled dose in µg.
+
+    :param timestamps: The timestamps of the readings, in order, in
+        nanoseconds since the epoch or as datetimes
+    :type timestamps: Sequence[int] | np.ndarray
+    :param values: The readings, in µg/m³
+    :type values: Sequence[float | None] | np.ndarray
+    :param max_gap: The longest time between readings that is counted, in
+        seconds
+    :type max_gap: float
+    :return: The exposure up to each reading
+    :rtype: np.ndarray
+    """
+    timestamps = _to_ns(timestamps)
+    values = _to_float(values)
+    if not values.size:
+        return np.empty(0)
+    return np.concatenate([[0.0], np.cumsum(_segments(timestamps, values,
+                                                      max_gap))])
+
+
+class NowCast:
+    """
+    The NowCast of a stream of PM readings, see :func:`nowcast`. Readings
+    are added in time order with :meth:`update`, which returns the NowCast
+    of every hour the reading completed, the same values :func:`nowcast`
+    gives for those hours.
+
+    :param hours: The number of hourly means averaged
+    :type hours: int
+    :param min_weight: The lowest weight factor, 0.5 for particulates
+    :type min_weight: float
+    """
+    def __init__(self, hours: int = 12, min_weight: float = 0.5):
+        self.hours = hours
+        self.min_weight = min_weight
+        self._means = deque([np.nan] * hours, maxlen=hours)
+        self._hour: int | None = None
+        self._sum = 0.0
+        self._count = 0
+
+    def update(self, timestamp_ns: int, value: float | None
+               ) -> list[tuple[int, float]]:
+        """
+        Add a reading.
+
+        :return: The start of each hour completed, in nanoseconds since the
+            epoch, and the NowCast at the end of it
+        :rtype: list[tuple[int, float]]
+        """
+        hour = timestamp_ns // _NS_PER_HOUR
+        completed = []
+        if self._hour is None:
+            self._hour = hour
+        while self._hour < hour:
+            completed.append(self._complete())
+        if value is not None and value == value:
+            self._sum += value
+            self._count += 1
+        return completed
+
+    def _complete(self) -> tuple[int, float]:
+        # Finish the current hour and start the next
+        self._means.append(self._sum / self._count if self._count
+                           else np.nan)
+        start = self._hour * _NS_PER_HOUR
+        self._hour += 1
+        self._sum = 0.0
+        self._count = 0
+        return start, self.value
+
+    @property
+    def value(self) -> float:
+        """
+        The NowCast at the end of the last completed hour.
+        """
+        return float(_nowcast(np.array([self._means]), self.min_weight)[0])
+
+    def flush(self) -> list[tuple[int, float]]:
+        """
+        Complete the current hour, returning its NowCast.
+        """
+        return [] if self._hour is None else [self._complete()]
+
+
+class Exposure:
+    """
+    The cumulative exposure of a stream of readings, see :func:`exposure`.
+    Readings are added in time order with :meth:`update`, which returns the
+    exposure up to the reading, the same as :func:`exposure` gives.
+
+    :param max_gap: The longest time between readings that is counted, in
+        seconds
+    :type max_gap: float
+    """
+    def __init__(self, max_gap: float = 300.0):
+        self.max_gap = max_gap
+        self.total = 0.0
+        self._last: tuple[int, float] | None = None
+
+    def update(self, timestamp_ns: int, value: float | None) -> float:
+        """
+        Add a reading, returning the exposure up to it in µg·h/m³.
+        """
+        value = np.nan if value is None else float(value)
+        if self._last is not None:
+            self.total += float(_segments(
+                np.array([self._last[0], timestamp_ns]),
+                np.array([self._last[1], value]), self.max_gap)[0])
+        self._last = (timestamp_ns, value)
+        return self.total
@@ -0,0 +1,115 @@
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+import asyncio
+import inspect
+
+from .dispatch import ExecutorDispatcher
+
+
+class Delivery(NamedTuple):
+    """
+    How notifications are handed to a callback. With ``max_batch`` the
+    callback is called with lists of packets, see :class:`Batcher`, and with
+    a ``dispatcher`` it runs in an executor instead of on the event loop.
+
+    :param max_batch: Deliver the packets in batches of at most this many
+    :type max_batch: int | None
+    :param max_latency: The longest a packet waits for its batch, in
+        seconds, or None to only deliver full batches
+    :type max_latency: float | None
+    :param dispatcher: Run the callback in an executor
+    :type dispatcher: ExecutorDispatcher | None
+    """
+    max_batch: int | None = None
+    max_latency: float | None = 1.0
+    dispatcher: ExecutorDispatcher | None = None
+
+
+class Batcher:
+    """
+    Collects items and calls a callback with a list of them, once
+    ``max_batch`` items have arrived or ``max_latency`` seconds after the
+    first item of the batch arrived, whichever comes first.
+
+    Items are added with :meth:`add`, which is a coroutine function when the
+    callback is, so it can be used as a notification callback in place of
+    the callback. It has to be called from the event loop, which runs the
+    latency timer. Call :meth:`flush` when done to deliver the last batch.
+
+    :param callback: Called with each batch, a list of items
+    :type callback: Callable[[list], None]
+    :param max_batch: The most items in a batch
+    :type max_batch: int
+    :param max_latency: The longest an item waits for its batch to be
+        delivered, in seconds, or None to only deliver full batches
+    :type max_latency: float | None
+    """
+    def __init__(self, callback: Callable[[list], None],
+                 max_batch: int = 64, max_latency: float | None = 1.0):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_latency is not None and max_latency <= 0:
+            raise ValueError("max_latency must be positive")
+        self.callback = callback
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._batch: list = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        if inspect.iscoroutinefunction(callback):
+            async def add(item: Any) -> None:
+                if self._append(item):
+                    await callback(self._take())
+        else:
+            def add(item: Any) -> None:
+                if self._append(item):
+                    callback(self._take())
+        self.add = add
+
+    def __len__(self) -> int:
+        return len(self._batch)
+
+    def _append(self, item: Any) -> bool:
+        # Add an item, returning True when the batch is full
+        batch = self._batch
+        batch.append(item)
+        if len(batch) == 1 and self.max_latency is not None \
+                and self.max_batch > 1:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_latency, self._expire)
+        return len(batch) >= self.max_batch
+
+    def _take(self) -> list:
+        batch, self._batch = self._batch, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _expire(self) -> None:
+        self._timer = None
+        if not self._batch:
+            return
+        batch = self._take()
+        if inspect.iscoroutinefunction(self.callback):
+            task = asyncio.create_task(self.callback(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.callback(batch)
+
+    async def flush(self) -> None:
+        """
+        Deliver the items waiting for a batch now, and wait for the batches
+        delivered by the latency timer.
+        """
+        if self._batch:
+            batch = self._take()
+            if inspect.iscoroutinefunction(self.callback):
+                await self.callback(batch)
+            else:
+                self.callback(batch)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
@@ -1,12 +1,17 @@
+from collections.abc import Callable, Iterable
 from enum import IntEnum
 from bleak import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+from .batching import Batcher, Delivery
+from .clock import now_ns
+from .decode_cache import DecodeCache
 from .packets import (AtmotubeBLEPacket,
                       AtmotubeProBLEAdvertising,
                       AtmotubeProBLEScanResponse)
 
 import inspect
+import time
 
 
 class AtmotubeProBLE_CONSTS(IntEnum):
@@ -21,30 +26,232 @@ PACKET_MAP = {
 }
 
 
-def get_ble_packet(b: bytearray) -> AtmotubeBLEPacket | None:
+def get_ble_packet(b: bytearray, records: bool = False,
+                   lazy: bool = False,
+                   cache: DecodeCache | None = None,
+                   timestamp_ns: int | None = None
+                   ) -> AtmotubeBLEPacket | None:
     packet_cls = PACKET_MAP.get(len(b), None)
     if packet_cls:
-        return packet_cls(b)
+        if cache is not None:
+            return cache.record(packet_cls, b, timestamp_ns=timestamp_ns) \
+                if records else cache.packet(packet_cls, b,
+                                             timestamp_ns=timestamp_ns)
+        return packet_cls.record(b, timestamp_ns=timestamp_ns) if records \
+            else packet_cls(b, lazy=lazy, timestamp_ns=timestamp_ns)
     else:
         return None
 
 
-def ble_callback_wrapper(callback):
+class ScanStats:
+    """
+    Counters for the advertisements seen by a callback from
+    :func:`ble_callback_wrapper`: those passed to the callback, and those
+    dropped because the device isn't in the allowlist, the advertisement
+    isn't from an Atmotube, or the payload is a duplicate.
+    """
+    def __init__(self):
+        self.delivered = 0
+        self.filtered = 0
+        self.not_atmotube = 0
+        self.duplicates = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.filtered + self.not_atmotube + self.duplicates
+
+    def __repr__(self) -> str:
+        return (f"ScanStats(delivered={self.delivered}, "
+                f"filtered={self.filtered}, "
+                f"not_atmotube={self.not_atmotube}, "
+                f"duplicates={self.duplicates})")
+
+
+# Returned by the decoder when an advertisement is dropped
+_DROPPED = object()
+
+
+class _Deduplicator:
+    # The last Atmotube payload of each device and length, so advertising
+    # and scan response packets are deduplicated separately, and when it was
+    # first seen. Entries older than the window can't match, and are pruned
+    # once per window so devices that have gone don't build up.
+    def __init__(self, window: float):
+        self.window = window
+        self._last_seen: dict[tuple[str, int], tuple[bytes, float]] = {}
+        self._next_prune = 0.0
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def duplicate(self, address: str, payload: bytearray,
+                  now: float) -> bool:
+        last_seen = self._last_seen
+        if now >= self._next_prune:
+            for key in [key for key, (_, seen) in last_seen.items()
+                        if now - seen >= self.window]:
+                del last_seen[key]
+            self._next_prune = now + self.window
+        key = (address, len(payload))
+        previous = last_seen.get(key)
+        if previous and previous[0] == payload and \
+                now - previous[1] < self.window:
+            return True
+        last_seen[key] = (bytes(payload), now)
+        return False
+
+
+def _ble_decoder(records: bool, lazy: bool,
+                 tap: Callable[[BLEDevice, bytearray], None] | None,
+                 addresses: Iterable[str] | None, drop_none: bool,
+                 dedup_window: float | None, stats: ScanStats,
+                 clock: Callable[[], float],
+                 cache: DecodeCache | None,
+                 clock_ns: Callable[[], int]) -> Callable:
+    # Build the function turning an advertisement into a packet, or
+    # _DROPPED, doing the cheapest checks first
+    allowed = {address.upper() for address in addresses} \
+        if addresses is not None else None
+    dedup = _Deduplicator(dedup_window) if dedup_window is not None \
+        else None
+
+    def decode(device: BLEDevice, adv: AdvertisementData):
+        timestamp_ns = clock_ns()
+        if allowed is not None and device.address.upper() not in allowed:
+            stats.filtered += 1
+            return _DROPPED
+        mfr_data = adv.manufacturer_data.get(
+                    AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID,
+                    bytearray(b''))
+        if tap and mfr_data:
+            tap(device, mfr_data)
+        if drop_none and len(mfr_data) not in PACKET_MAP:
+            stats.not_atmotube += 1
+            return _DROPPED
+        if dedup is not None and len(mfr_data) in PACKET_MAP and \
+                dedup.duplicate(device.address, mfr_data, clock()):
+            stats.duplicates += 1
+            return _DROPPED
+        stats.delivered += 1
+        return get_ble_packet(mfr_data, records=records, lazy=lazy,
+                              cache=cache, timestamp_ns=timestamp_ns)
+
+    return decode
+
+
+def _ble_delivery(callback, delivery: Delivery
+                  ) -> tuple[Callable, Batcher | None]:
+    # Wrap the callback to receive batches of (device, packet) pairs, and
+    # to run in an executor, returning the batcher as well
+    max_batch, max_latency, dispatcher = delivery
+    if max_batch is None:
+        return dispatcher.wrap(
+            callback, key_of=lambda device, packet:
+                device.address if device is not None else None), None
+    if dispatcher is not None:
+        callback = dispatcher.wrap(callback, None)
+    batcher = Batcher(callback, max_batch, max_latency)
+    add = batcher.add
+    if inspect.iscoroutinefunction(add):
+        async def batch_callback(device: BLEDevice,
+                                 packet: AtmotubeBLEPacket | None) -> None:
+            await add((device, packet))
+    else:
+        def batch_callback(device: BLEDevice,
+                           packet: AtmotubeBLEPacket | None) -> None:
+            add((device, packet))
+    return batch_callback, batcher
+
+
+async def _no_flush() -> None:
+    pass
+
+
+def ble_callback_wrapper(
+        callback, records: bool = False, lazy: bool = False,
+        tap: Callable[[BLEDevice, bytearray], None] | None = None,
+        addresses: Iterable[str] | None = None, drop_none: bool = False,
+        dedup_window: float | None = None, stats: ScanStats | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        cache: DecodeCache | None = None,
+        delivery: Delivery | None = None,
+        clock_ns: Callable[[], int] = now_ns):
+    """
+    Wrap a callback taking a device and an Atmotube BLE packet as a
+    detection callback for ``BleakScanner``.
+
+    The advertisements can be filtered before they are decoded: only
+    devices in ``addresses`` are decoded, advertisements without an Atmotube
+    payload are dropped with ``drop_none``, and a payload identical to the
+    last one from the same device is dropped until ``dedup_window`` seconds
+    after it was first seen. The counts are kept in the ``stats`` attribute
+    of the detection callback.
+
+    With the ``max_batch`` of ``delivery`` the callback is called with
+    lists of ``(device, packet)`` pairs instead, once ``max_batch`` packets
+    have arrived or ``max_latency`` seconds after the first packet of the
+    batch, whichever comes first. Await the ``flush`` method of the
+    detection callback once the scanner has stopped to deliver the last
+    batch.
+
+    With the ``dispatcher`` of ``delivery`` the callback runs in an executor
+    instead of on the event loop, the packets of each device are handled in
+    order, batches are handled in the order they were made.
+
+    :param callback: Called with the device and the packet, or None if the
+        advertisement isn't from an Atmotube
+    :type callback: Callable[[BLEDevice, AtmotubeBLEPacket | None], None]
+    :param records: Pass immutable records to the callback instead of packets
+    :type records: bool
+    :param lazy: Decode the packets on first attribute access
+    :type lazy: bool
+    :param tap: A function called with the device and manufacturer data of
+        every advertisement before it is decoded
+    :type tap: Callable[[BLEDevice, bytearray], None] | None
+    :param addresses: The addresses of the devices to listen to, defaults to
+        every device
+    :type addresses: Iterable[str] | None
+    :param drop_none: Don't call the callback for advertisements that aren't
+        from an Atmotube
+    :type drop_none: bool
+    :param dedup_window: Drop repeated payloads for this many seconds
+    :type dedup_window: float | None
+    :param stats: Counters to update with the delivered and dropped
+        advertisements, defaults to new counters
+    :type stats: ScanStats | None
+    :param clock: The clock used for deduplication, in seconds
+    :type clock: Callable[[], float]
+    :param cache: Reuse the decoded values of repeated payloads, ``lazy`` is
+        ignored when using a cache
+    :type cache: DecodeCache | None
+    :param delivery: Batch the packets, or run the callback in an executor
+    :type delivery: Delivery | None
+    :param clock_ns: The clock timestamping the packets as soon as they
+        arrive, in nanoseconds since the epoch
+    :type clock_ns: Callable[[], int]
+    :return: The detection callback, with its ``stats`` and a ``flush``
+        coroutine function delivering the packets waiting for a batch
+    """
+    stats = stats if stats is not None else ScanStats()
+    decode = _ble_decoder(records, lazy, tap, addresses, drop_none,
+                          dedup_window, stats, clock, cache, clock_ns)
+    batcher = None
+    if delivery is not None and (delivery.max_batch is not None or
+                                 delivery.dispatcher is not None):
+        callback, batcher = _ble_delivery(callback, delivery)
     if inspect.iscoroutinefunction(callback):
         async def wrapped_callback(device: BLEDevice,
                                    adv: AdvertisementData) -> None:
-            mfr_data = adv.manufacturer_data.get(
-                        AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID,
-                        bytearray(b''))
-            packet = get_ble_packet(mfr_data)
-            await callback(device, packet)
+            packet = decode(device, adv)
+            if packet is not _DROPPED:
+                await callback(device, packet)
     else:
         def wrapped_callback(device: BLEDevice,
                              adv: AdvertisementData) -> None:
-            mfr_data = adv.manufacturer_data.get(
-                        AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID,
-                        bytearray(b''))
-            packet = get_ble_packet(mfr_data)
-            callback(device, packet)
+            packet = decode(device, adv)
+            if packet is not _DROPPED:
+                callback(device, packet)
 
+    wrapped_callback.stats = stats
+    wrapped_callback.flush = _no_flush if batcher is None else batcher.flush
     return wrapped_callback
@@ -0,0 +1,324 @@
+from bleak import BLEDevice
+from collections.abc import Callable, Iterator
+from typing import NamedTuple
+from struct import Struct
+
+import mmap
+import os
+import time
+
+from .gatt import ATMOTUBE_PRO_PACKETS
+from .packets import Buffer
+
+# A capture file is a header followed by length-prefixed records, with every
+# integer little-endian:
+#
+#   header: 8s magic, u16 format version, u16 reserved
+#   record: u16 payload length, u16 source id, i64 monotonic timestamp (ns),
+#           then the payload
+#
+# Source ids below SOURCE_ANCHOR refer to a data source, defined by an
+# earlier record with the source id SOURCE_DEFINITION. The payload of a
+# definition is the u16 id of the new source, followed by its kind, address
+# and uuid, utf-8 encoded and separated by NUL. Each writer also starts with
+# a SOURCE_ANCHOR record, whose payload is the i64 wall clock time
+# (time.time_ns()) at the record's monotonic timestamp, so that the wall
+# clock time of the following records can be recovered.
+
+CAPTURE_MAGIC = b"PYMOTUBE"
+CAPTURE_VERSION = 1
+SOURCE_DEFINITION = 0xFFFF
+SOURCE_ANCHOR = 0xFFFE
+
+_HEADER = Struct("<8sHH")
+_RECORD = Struct("<HHq")
+_SOURCE_ID = Struct("<H")
+_ANCHOR = Struct("<q")
+
+
+class InvalidCaptureFile(Exception):
+    pass
+
+
+class CaptureSource(NamedTuple):
+    """
+    Where the payloads of a capture record came from, ``kind`` is either
+    ``"gatt"`` or ``"ble"`` and ``uuid`` is the GATT characteristic.
+    """
+    kind: str
+    address: str
+    uuid: str = ""
+
+
+class CaptureRecord(NamedTuple):
+    """
+    A payload read from a capture file. ``timestamp_ns`` is the monotonic
+    timestamp as recorded and ``time_ns`` the corresponding wall clock time
+    in nanoseconds since the epoch.
+    """
+    timestamp_ns: int
+    time_ns: int
+    source: CaptureSource
+    data: bytes
+
+
+class CaptureWriter:
+    """
+    Appends raw Atmotube payloads to a capture file.
+
+    The writer can be plugged into the notification callbacks with the
+    ``tap`` argument of :func:`gatt_notify`, :func:`start_gatt_notifications`
+    and :func:`ble_callback_wrapper`, see :meth:`gatt_tap` and
+    :meth:`ble_tap`. Opening an existing capture file appends to it.
+
+    :param path: The path of the capture file
+    :type path: str | os.PathLike
+    :param clock: The monotonic clock used to timestamp records, in ns
+    :type clock: Callable[[], int]
+    """
+    def __init__(self, path: str | os.PathLike,
+                 clock: Callable[[], int] = time.monotonic_ns):
+        self._clock = clock
+        self._sources: dict[CaptureSource, int] = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with CaptureReader(path) as reader:
+                self._sources = {source: source_id for source_id, source
+                                 in reader.sources.items()}
+                end = reader.end
+            self._file = open(path, "r+b")
+            # drop a record left incomplete by a crash before appending
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, 0))
+        self._write(SOURCE_ANCHOR, _ANCHOR.pack(time.time_ns()),
+                    self._clock())
+
+    def source_id(self, kind: str, address: str, uuid: str = "") -> int:
+        """
+        Get the id of a source, defining it in the file if it is new.
+
+        :param kind: The kind of source, ``"gatt"`` or ``"ble"``
+        :type kind: str
+        :param address: The address of the device
+        :type address: str
+        :param uuid: The GATT characteristic uuid, if any
+        :type uuid: str
+        :return: The source id
+        :rtype: int
+        """
+        source = CaptureSource(kind, address, str(uuid))
+        source_id = self._sources.get(source)
+        if source_id is None:
+            source_id = len(self._sources)
+            if source_id >= SOURCE_ANCHOR:
+                raise ValueError("Too many sources for one capture file")
+            self._sources[source] = source_id
+            self._write(SOURCE_DEFINITION,
+                        _SOURCE_ID.pack(source_id)
+                        + "\0".join(source).encode(),
+                        self._clock())
+        return source_id
+
+    def write(self, source_id: int, data: Buffer,
+              timestamp_ns: int | None = None) -> None:
+        """
+        Append a payload to the capture file.
+
+        :param source_id: The id of the source, from :meth:`source_id`
+        :type source_id: int
+        :param data: The raw payload
+        :type data: bytes | bytearray | memoryview
+        :param timestamp_ns: The monotonic timestamp, defaults to now
+        :type timestamp_ns: int | None
+        """
+        if timestamp_ns is None:
+            timestamp_ns = self._clock()
+        self._write(source_id, data, timestamp_ns)
+
+    def gatt_tap(self, address: str) -> Callable[[str, bytearray], None]:
+        """
+        Create a ``tap`` for :func:`gatt_notify` that records notifications
+        from the device with the given address.
+
+        :param address: The address of the device
+        :type address: str
+        :return: A function taking a characteristic uuid and raw payload
+        :rtype: Callable[[str, bytearray], None]
+        """
+        source_ids = {}
+
+        def tap(uuid: str, data: bytearray) -> None:
+            source_id = source_ids.get(uuid)
+            if source_id is None:
+                source_id = source_ids[uuid] = self.source_id("gatt",
+                                                              address, uuid)
+            self._write(source_id, data, self._clock())
+
+        return tap
+
+    def ble_tap(self) -> Callable[[BLEDevice, bytearray], None]:
+        """
+        Create a ``tap`` for :func:`ble_callback_wrapper` that records the
+        manufacturer data of advertisements.
+
+        :return: A function taking a device and raw payload
+        :rtype: Callable[[BLEDevice, bytearray], None]
+        """
+        source_ids = {}
+
+        def tap(device: BLEDevice, data: bytearray) -> None:
+            source_id = source_ids.get(device.address)
+            if source_id is None:
+                source_id = source_ids[device.address] = self.source_id(
+                    "ble", device.address)
+            self._write(source_id, data, self._clock())
+
+        return tap
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write(self, source_id: int, data: Buffer, timestamp_ns: int) -> None:
+        self._file.write(_RECORD.pack(len(data), source_id, timestamp_ns)
+                         + data)
+
+
+class CaptureReader:
+    """
+    Reads a capture file through a read-only memory map, so that only the
+    parts of the file being read are loaded into memory.
+
+    :param path: The path of the capture file
+    :type path: str | os.PathLike
+    """
+    def __init__(self, path: str | os.PathLike):
+        self._file = open(path, "rb")
+        self._mmap = None
+        self._sources: dict[int, CaptureSource] = {}
+        self._end: int | None = None
+        if os.fstat(self._file.fileno()).st_size < _HEADER.size:
+            self.close()
+            raise InvalidCaptureFile("File is too short to be a capture")
+        self._mmap = mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+        magic, version, _ = _HEADER.unpack_from(self._mmap)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            self.close()
+            raise InvalidCaptureFile(f"Not a version {CAPTURE_VERSION} "
+                                     f"Atmotube capture file")
+
+    @property
+    def sources(self) -> dict[int, CaptureSource]:
+        """
+        The sources defined in the capture file, by source id.
+        """
+        self._scan_all()
+        return self._sources
+
+    @property
+    def end(self) -> int:
+        """
+        The offset just past the last complete record in the file.
+        """
+        self._scan_all()
+        return self._end
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        mm = self._mmap
+        for source_id, timestamp_ns, time_ns, start, length in self._scan():
+            yield CaptureRecord(timestamp_ns, time_ns,
+                                self._sources[source_id],
+                                mm[start:start + length])
+
+    def decode(self) -> dict[tuple[CaptureSource, type], dict]:
+        """
+        Decode every payload in the file into columnar NumPy arrays, one set
+        of columns per source and packet class, see :mod:`atmotube.columnar`.
+        Only the index of the records and the decoded columns are held in
+        memory. The ``timestamp_ns`` columns are the wall clock times of the
+        records, ``date_time`` is the same in UTC, and the ``index`` column of
+        the BLE sources counts payload records from the start of the file.
+        Requires numpy.
+
+        :return: A dictionary mapping (source, packet class) to columns
+        :rtype: dict[tuple[CaptureSource, type], dict]
+        """
+        import numpy as np
+        from .columnar import decode_at, decode_ble_payloads
+
+        index = np.fromiter(self._scan(), dtype=[('source_id', '<u2'),
+                                                 ('timestamp_ns', '<i8'),
+                                                 ('time_ns', '<i8'),
+                                                 ('offset', '<i8'),
+                                                 ('length', '<u2')])
+        time_ns = index['time_ns']
+        result = {}
+        for source_id, source in self._sources.items():
+            selected = index['source_id'] == source_id
+            if source.kind == "ble":
+                rows = np.flatnonzero(selected)
+                groups = decode_ble_payloads(self._mmap, time_ns[rows],
+                                             lengths=index['length'][rows],
+                                             offsets=index['offset'][rows])
+                for packet_cls, columns in groups.items():
+                    columns['index'] = rows[columns['index']]
+                    result[(source, packet_cls)] = columns
+            elif source.uuid in ATMOTUBE_PRO_PACKETS:
+                packet_cls = ATMOTUBE_PRO_PACKETS[source.uuid]
+                selected &= index['length'] == packet_cls._byte_size_
+                result[(source, packet_cls)] = decode_at(
+                    packet_cls, self._mmap, index['offset'][selected],
+                    time_ns[selected])
+        return result
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _scan_all(self) -> None:
+        if self._end is None:
+            for _ in self._scan():
+                pass
+
+    def _scan(self) -> Iterator[tuple[int, int, int, int, int]]:
+        # Yields the source id, timestamps, offset and length of every
+        # payload record, keeping track of the sources and clock anchor
+        mm = self._mmap
+        size = len(mm)
+        pos = _HEADER.size
+        offset_ns = 0
+        while pos + _RECORD.size <= size:
+            length, source_id, timestamp_ns = _RECORD.unpack_from(mm, pos)
+            start = pos + _RECORD.size
+            if start + length > size:
+                break  # an incomplete record at the end of the file
+            pos = start + length
+            if source_id == SOURCE_DEFINITION:
+                new_id, = _SOURCE_ID.unpack_from(mm, start)
+                self._sources[new_id] = CaptureSource(
+                    *mm[start + _SOURCE_ID.size:pos].decode().split("\0"))
+            elif source_id == SOURCE_ANCHOR:
+                wall_ns, = _ANCHOR.unpack_from(mm, start)
+                offset_ns = wall_ns - timestamp_ns
+            else:
+                yield (source_id, timestamp_ns, timestamp_ns + offset_ns,
+                       start, length)
+        self._end = pos
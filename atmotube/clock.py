@@ -0,0 +1,65 @@
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+import time
+
+# Packets are timestamped with integer nanoseconds since the epoch, which
+# are much cheaper to take than a datetime. The default clock is monotonic,
+# anchored to the wall clock once, so the timestamps from every device are
+# ordered even when the system clock is adjusted.
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def monotonic_clock() -> Callable[[], int]:
+    """
+    A clock returning nanoseconds since the epoch that never goes backwards,
+    the monotonic clock offset to match the wall clock when it is created.
+
+    :return: The clock
+    :rtype: Callable[[], int]
+    """
+    offset = time.time_ns() - time.monotonic_ns()
+    monotonic_ns = time.monotonic_ns
+
+    def now_ns() -> int:
+        return monotonic_ns() + offset
+    return now_ns
+
+
+# The clock used to timestamp packets when no timestamp is given
+now_ns = monotonic_clock()
+
+
+def datetime_from_ns(timestamp_ns: int) -> datetime:
+    """
+    Convert nanoseconds since the epoch into a naive datetime in local time,
+    like ``datetime.now()``, truncated to microseconds.
+    """
+    seconds, nanoseconds = divmod(timestamp_ns, 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(
+        microsecond=nanoseconds // 1000)
+
+
+def ns_from_datetime(date_time: datetime) -> int:
+    """
+    Convert a datetime into nanoseconds since the epoch, naive datetimes are
+    taken to be in local time.
+    """
+    if date_time.tzinfo is None:
+        date_time = date_time.astimezone()
+    return (date_time - _EPOCH) // _MICROSECOND * 1000
+
+
+def resolve_ns(date_time: datetime | None,
+               timestamp_ns: int | None) -> int:
+    """
+    The timestamp of a payload, in nanoseconds since the epoch, from either
+    a datetime or a timestamp, defaulting to now.
+    """
+    if timestamp_ns is not None:
+        return timestamp_ns
+    if date_time is not None:
+        return ns_from_datetime(date_time)
+    return now_ns()
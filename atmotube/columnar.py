@@ -0,0 +1,302 @@
+"""
+Vectorized decoding of Atmotube payloads into columnar NumPy arrays.
+
+This module requires numpy, which is an optional dependency of PymoTube
+(``pip install PymoTube[numpy]``).
+"""
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import TypeAlias
+
+import numpy as np
+
+from .ble import PACKET_MAP
+from .clock import ns_from_datetime
+from .packets import (InvalidByteData,
+                      AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3,
+                      AtmotubeProBLEAdvertising,
+                      AtmotubeProBLEScanResponse)
+
+Columns: TypeAlias = dict[str, np.ndarray]
+Timestamps: TypeAlias = Sequence[datetime] | Sequence[int] | np.ndarray
+Buffer: TypeAlias = bytes | bytearray | memoryview
+
+# Structured dtypes mirroring the ctypes ``_fields_`` layouts. numpy has no
+# notion of bitfields or 3 byte integers, so the status flags are read as a
+# single byte and the PM fields as raw byte triplets.
+STATUS_DTYPE = np.dtype({'names': ['_flags', '_battery'],
+                         'formats': ['u1', 'u1'],
+                         'offsets': [0, 1],
+                         'itemsize': AtmotubeProStatus._byte_size_})
+
+SPS30_DTYPE = np.dtype({'names': ['_pm1', '_pm2_5', '_pm10', '_pm4'],
+                        'formats': [('u1', 3)] * 4,
+                        'offsets': [0, 3, 6, 9],
+                        'itemsize': AtmotubeProSPS30._byte_size_})
+
+BME280_DTYPE = np.dtype({'names': ['_rh', '_T', '_P', '_T_dec'],
+                         'formats': ['i1', 'i1', '<i4', '<i2'],
+                         'offsets': [0, 1, 2, 6],
+                         'itemsize': AtmotubeProBME280._byte_size_})
+
+SGPC3_DTYPE = np.dtype({'names': ['_tvoc'],
+                        'formats': ['<i2'],
+                        'offsets': [0],
+                        'itemsize': AtmotubeProSGPC3._byte_size_})
+
+# The BLE packets are big-endian
+ADVERTISING_DTYPE = np.dtype({
+    'names': ['_tvoc', '_devid', '_rh', '_T', '_P', '_flags', '_battery'],
+    'formats': ['>i2', '>i2', 'i1', 'i1', '>i4', 'u1', 'u1'],
+    'offsets': [0, 2, 4, 5, 6, 10, 11],
+    'itemsize': AtmotubeProBLEAdvertising._byte_size_})
+
+SCAN_RESPONSE_DTYPE = np.dtype({
+    'names': ['_pm1', '_pm2_5', '_pm10', '_fw_maj', '_fw_min', '_fw_bld'],
+    'formats': ['>i2', '>i2', '>i2', 'u1', 'u1', 'u1'],
+    'offsets': [0, 2, 4, 6, 7, 8],
+    'itemsize': AtmotubeProBLEScanResponse._byte_size_})
+
+# Bit positions of the status flags within the status byte, these are the
+# same for the GATT status characteristic and the BLE advertising packet
+STATUS_FLAGS = (('pm_sensor_status', 0),
+                ('error_flag', 1),
+                ('bonding_flag', 2),
+                ('charging', 3),
+                ('charging_timer', 4),
+                ('pre_heating', 6))
+
+
+def _positive(values: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    # Vectorized form of ``value/scale if value > 0 else None``
+    return np.where(values > 0, values / scale, np.nan)
+
+
+def _int24(triplets: np.ndarray) -> np.ndarray:
+    # Little-endian signed 24 bit integers from an (N, 3) array of bytes
+    values = (triplets[:, 0].astype(np.int32)
+              | (triplets[:, 1].astype(np.int32) << 8)
+              | (triplets[:, 2].astype(np.int32) << 16))
+    return (values ^ 0x800000) - 0x800000
+
+
+def _status_flags(flags: np.ndarray) -> Columns:
+    return {name: ((flags >> bit) & 1).astype(bool)
+            for name, bit in STATUS_FLAGS}
+
+
+def _decode_status(records: np.ndarray) -> Columns:
+    columns = _status_flags(records['_flags'])
+    columns['battery_level'] = records['_battery'].copy()
+    return columns
+
+
+def _decode_sps30(records: np.ndarray) -> Columns:
+    return {name: _positive(_int24(records[f"_{name}"]), 100.0)
+            for name in ('pm1', 'pm2_5', 'pm10', 'pm4')}
+
+
+def _decode_bme280(records: np.ndarray) -> Columns:
+    return {'humidity': _positive(records['_rh']),
+            'temperature': records['_T_dec'] / 100.0,
+            'pressure': _positive(records['_P'], 100.0)}
+
+
+def _decode_sgpc3(records: np.ndarray) -> Columns:
+    return {'tvoc': _positive(records['_tvoc'], 1000.0)}
+
+
+def _decode_advertising(records: np.ndarray) -> Columns:
+    columns = {'device_id': records['_devid'].astype(np.int16),
+               'tvoc': _positive(records['_tvoc'], 1000.0),
+               'humidity': _positive(records['_rh']),
+               'temperature': records['_T'].copy(),
+               'pressure': _positive(records['_P'], 100.0)}
+    columns.update(_status_flags(records['_flags']))
+    columns['battery_level'] = records['_battery'].copy()
+    return columns
+
+
+def _decode_scan_response(records: np.ndarray) -> Columns:
+    columns = {name: _positive(records[f"_{name}"])
+               for name in ('pm1', 'pm2_5', 'pm10')}
+    version = records['_fw_maj'].astype(str)
+    for part in ('_fw_min', '_fw_bld'):
+        version = np.char.add(np.char.add(version, '.'),
+                              records[part].astype(str))
+    columns['firmware_version'] = version
+    return columns
+
+
+_DECODERS: dict[type, tuple[np.dtype, Callable[[np.ndarray], Columns]]] = {
+    AtmotubeProStatus: (STATUS_DTYPE, _decode_status),
+    AtmotubeProSPS30: (SPS30_DTYPE, _decode_sps30),
+    AtmotubeProBME280: (BME280_DTYPE, _decode_bme280),
+    AtmotubeProSGPC3: (SGPC3_DTYPE, _decode_sgpc3),
+    AtmotubeProBLEAdvertising: (ADVERTISING_DTYPE, _decode_advertising),
+    AtmotubeProBLEScanResponse: (SCAN_RESPONSE_DTYPE, _decode_scan_response),
+}
+
+
+def _timestamps(timestamps: Timestamps) -> Columns:
+    # Every timestamp becomes int64 nanoseconds since the epoch, with a zero
+    # copy datetime64 view in UTC alongside. Integer timestamps are kept as
+    # they are, datetimes are converted like the packets' timestamp_ns, and
+    # numpy datetimes, which have no time zone, are taken to be in UTC
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype.kind == 'M':
+        timestamp_ns = timestamps.astype('datetime64[ns]').view(np.int64)
+    elif timestamps.dtype.kind in 'iu' or not timestamps.size:
+        timestamp_ns = timestamps.astype(np.int64, copy=False)
+    else:
+        timestamp_ns = np.fromiter(map(ns_from_datetime, timestamps.flat),
+                                   dtype=np.int64, count=timestamps.size)
+    return {'timestamp_ns': timestamp_ns,
+            'date_time': timestamp_ns.view('datetime64[ns]')}
+
+
+def _decode(packet_cls: type, raw: np.ndarray, times: Columns) -> Columns:
+    try:
+        dtype, decoder = _DECODERS[packet_cls]
+    except KeyError:
+        raise TypeError(f"{packet_cls.__name__} does not support "
+                        f"batch decoding") from None
+    if raw.size % dtype.itemsize:
+        raise InvalidByteData(f"Expected a multiple of {dtype.itemsize} "
+                              f"bytes, got {raw.size} bytes")
+    records = raw.view(dtype)
+    if times['date_time'].shape != records.shape:
+        raise ValueError(f"Expected {len(records)} timestamps, "
+                         f"got {times['date_time'].size}")
+    columns = dict(times)
+    columns.update(decoder(records))
+    return columns
+
+
+def decode_many(packet_cls: type, buffer: Buffer,
+                timestamps: Timestamps) -> Columns:
+    """
+    Decode a buffer of concatenated payloads into columnar arrays.
+
+    The columns have the same names as the attributes of the packet class,
+    plus ``date_time``. Readings the scalar path reports as ``None`` are NaN,
+    which makes every measurement column float64, flags are bool and the
+    battery level is uint8.
+
+    The timestamps are kept in an int64 ``timestamp_ns`` column, in
+    nanoseconds since the epoch like the packets' ``timestamp_ns``, and
+    ``date_time`` is a datetime64[ns] view of them in UTC. Naive datetimes
+    are taken to be in local time, and numpy datetime64 values in UTC.
+
+    :param packet_cls: The packet class the payloads belong to
+    :type packet_cls: type
+    :param buffer: N payloads of ``packet_cls._byte_size_`` bytes each
+    :type buffer: bytes | bytearray | memoryview
+    :param timestamps: The N timestamps of the payloads
+    :type timestamps: Sequence[datetime] | Sequence[int] | np.ndarray
+    :return: A dictionary mapping column names to arrays of length N
+    :rtype: Columns
+    """
+    return _decode(packet_cls,
+                   np.frombuffer(buffer, dtype=np.uint8),
+                   _timestamps(timestamps))
+
+
+def decode_ble_payloads(payloads: Sequence[Buffer] | Buffer,
+                        timestamps: Timestamps,
+                        lengths: Sequence[int] | np.ndarray | None = None,
+                        offsets: Sequence[int] | np.ndarray | None = None
+                        ) -> dict[type, Columns]:
+    """
+    Decode a mixed stream of BLE manufacturer data payloads into columnar
+    arrays, one set of columns per packet class.
+
+    Payloads are grouped by length, the same way :func:`get_ble_packet`
+    dispatches them, and each group is decoded in one step. Each set of
+    columns has an extra ``index`` column giving the position of the rows in
+    the original stream. Payloads of any other length are skipped.
+
+    :param payloads: A sequence of payloads, or a buffer containing all of
+        the payloads when ``lengths`` is given
+    :type payloads: Sequence[Buffer] | Buffer
+    :param timestamps: The timestamps of the payloads
+    :type timestamps: Sequence[datetime] | Sequence[int] | np.ndarray
+    :param lengths: The length of each payload in the buffer
+    :type lengths: Sequence[int] | np.ndarray | None
+    :param offsets: The offset of each payload in the buffer, if they are not
+        packed back to back
+    :type offsets: Sequence[int] | np.ndarray | None
+    :return: A dictionary mapping packet classes to columns
+    :rtype: dict[type, Columns]
+    """
+    if lengths is None:
+        lengths = np.fromiter(map(len, payloads), dtype=np.intp,
+                              count=len(payloads))
+        payloads = b''.join(payloads)
+    else:
+        lengths = np.asarray(lengths, dtype=np.intp)
+    raw = np.frombuffer(payloads, dtype=np.uint8)
+    if offsets is None:
+        if lengths.sum() != raw.size:
+            raise InvalidByteData(f"Expected {lengths.sum()} bytes, "
+                                  f"got {raw.size} bytes")
+        offsets = np.cumsum(lengths) - lengths
+    else:
+        offsets = np.asarray(offsets, dtype=np.intp)
+        if offsets.shape != lengths.shape or (offsets.size and (
+                offsets.min() < 0 or (offsets + lengths).max() > raw.size)):
+            raise InvalidByteData("Payloads fall outside of the buffer")
+    times = _timestamps(timestamps)
+    if times['date_time'].shape != lengths.shape:
+        raise ValueError(f"Expected {lengths.size} timestamps, "
+                         f"got {times['date_time'].size}")
+    return _decode_ble(raw, offsets, lengths, times)
+
+
+def decode_at(packet_cls: type, buffer: Buffer,
+              offsets: Sequence[int] | np.ndarray,
+              timestamps: Timestamps) -> Columns:
+    """
+    Decode payloads scattered through a larger buffer, such as a capture
+    file, into columnar arrays. Only the payloads themselves are copied out
+    of the buffer.
+
+    :param packet_cls: The packet class the payloads belong to
+    :type packet_cls: type
+    :param buffer: The buffer containing the payloads
+    :type buffer: bytes | bytearray | memoryview
+    :param offsets: The offset of each payload in the buffer
+    :type offsets: Sequence[int] | np.ndarray
+    :param timestamps: The timestamps of the payloads
+    :type timestamps: Sequence[datetime] | Sequence[int] | np.ndarray
+    :return: A dictionary mapping column names to arrays
+    :rtype: Columns
+    """
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    if offsets.size and (offsets.min() < 0 or offsets.max()
+                         + packet_cls._byte_size_ > raw.size):
+        raise InvalidByteData("Payload offsets fall outside of the buffer")
+    return _decode(packet_cls, _gather(raw, offsets, packet_cls._byte_size_),
+                   _timestamps(timestamps))
+
+
+def _gather(raw: np.ndarray, offsets: np.ndarray, length: int) -> np.ndarray:
+    # Copy the ``length`` bytes at each offset into one contiguous array
+    return raw[offsets[:, np.newaxis] + np.arange(length)].ravel()
+
+
+def _decode_ble(raw: np.ndarray, offsets: np.ndarray, lengths: np.ndarray,
+                times: Columns) -> dict[type, Columns]:
+    result = {}
+    for length, packet_cls in PACKET_MAP.items():
+        index = np.flatnonzero(lengths == length)
+        columns = _decode(packet_cls, _gather(raw, offsets[index], length),
+                          {name: column[index]
+                           for name, column in times.items()})
+        columns['index'] = index
+        result[packet_cls] = columns
+    return result
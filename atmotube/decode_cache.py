@@ -0,0 +1,110 @@
+from datetime import datetime
+from functools import lru_cache
+
+from .clock import resolve_ns
+from .packets import InvalidByteData, Buffer
+
+
+def _decode(packet_cls: type, data: bytes) -> tuple:
+    if len(data) != packet_cls._byte_size_:
+        raise InvalidByteData(f"Expected {packet_cls._byte_size_} bytes, "
+                              f"got {len(data)} bytes")
+    return packet_cls._decode_(data)
+
+
+class DecodeCache:
+    """
+    A bounded least-recently-used cache of decoded payloads, keyed by packet
+    class and raw bytes. Atmotube payloads repeat a lot, the status and scan
+    response payloads hardly ever change, so a cache hit skips decoding and
+    only stamps the packet with a new timestamp.
+
+    :param maxsize: The maximum number of payloads to keep
+    :type maxsize: int
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._values = lru_cache(maxsize=maxsize)(_decode)
+
+    def values(self, packet_cls: type, data: Buffer) -> tuple:
+        """
+        The decoded values of a payload, in the order of
+        ``packet_cls._field_names_``.
+        """
+        return self._values(packet_cls, bytes(data))
+
+    def packet(self, packet_cls: type, data: Buffer,
+               date_time: datetime | None = None,
+               timestamp_ns: int | None = None):
+        """
+        Create a packet from a payload, decoding it only if it isn't in the
+        cache.
+
+        :param packet_cls: The packet class of the payload
+        :type packet_cls: type
+        :param data: The raw payload
+        :type data: bytes | bytearray | memoryview
+        :param date_time: The timestamp of the packet, defaults to now
+        :type date_time: datetime | None
+        :param timestamp_ns: The timestamp of the packet in nanoseconds since
+            the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: The packet
+        """
+        values = self._values(packet_cls, bytes(data))
+        packet = packet_cls.from_buffer_copy(data)
+        if date_time is not None and timestamp_ns is None:
+            packet.date_time = date_time
+        else:
+            packet.timestamp_ns = resolve_ns(None, timestamp_ns)
+        packet._values_ = values
+        return packet
+
+    def record(self, packet_cls: type, data: Buffer,
+               date_time: datetime | None = None,
+               timestamp_ns: int | None = None):
+        """
+        Create a record from a payload, decoding it only if it isn't in the
+        cache.
+
+        :param packet_cls: The packet class of the payload
+        :type packet_cls: type
+        :param data: The raw payload
+        :type data: bytes | bytearray | memoryview
+        :param date_time: The timestamp of the record, defaults to now
+        :type date_time: datetime | None
+        :param timestamp_ns: The timestamp of the record in nanoseconds since
+            the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: The record
+        :rtype: NamedTuple
+        """
+        return packet_cls._record_(resolve_ns(date_time, timestamp_ns),
+                                   *self._values(packet_cls, bytes(data)))
+
+    @property
+    def hits(self) -> int:
+        return self._values.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        return self._values.cache_info().misses
+
+    @property
+    def hit_rate(self) -> float:
+        info = self._values.cache_info()
+        total = info.hits + info.misses
+        return info.hits / total if total else 0.0
+
+    def clear(self) -> None:
+        """
+        Empty the cache and reset the statistics.
+        """
+        self._values.cache_clear()
+
+    def __len__(self) -> int:
+        return self._values.cache_info().currsize
+
+    def __repr__(self) -> str:
+        return (f"DecodeCache(maxsize={self.maxsize}, size={len(self)}, "
+                f"hits={self.hits}, misses={self.misses})")
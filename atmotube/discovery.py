@@ -0,0 +1,242 @@
+from bleak import BleakClient
+from bleak.exc import BleakCharacteristicNotFoundError, BleakError
+from collections.abc import Awaitable, Callable
+from os import PathLike
+from pathlib import Path
+
+import asyncio
+import json
+
+from .decode_cache import DecodeCache
+from .gatt import (ATMOTUBE_PRO_PACKETS,
+                   PacketList,
+                   get_available_characteristics,
+                   start_gatt_notifications)
+from .packets import AtmotubeGATTPacket
+from .uuids import AtmotubeProService_UUID, DeviceInformation_UUID
+
+# The services discovered on a device whose characteristics are cached, the
+# Atmotube PRO service and the device information service with the firmware
+# revision
+CACHED_SERVICES = (AtmotubeProService_UUID.PRO,
+                   AtmotubeProService_UUID.DEVICE_INFO)
+
+
+async def read_firmware_version(client: BleakClient) -> str | None:
+    """
+    Read the firmware revision of a connected device, or None if it can't be
+    read.
+
+    :param client: The connected client
+    :type client: BleakClient
+    :return: The firmware revision
+    :rtype: str | None
+    """
+    try:
+        data = await client.read_gatt_char(
+            DeviceInformation_UUID.FIRMWARE_REVISION)
+    except BleakError:
+        return None
+    return bytes(data).decode("utf-8", errors="replace").strip("\x00 ") \
+        or None
+
+
+class CharacteristicCache:
+    """
+    Remembers the characteristics discovered on each device, keyed by
+    address and firmware version, so that a device can be subscribed to as
+    soon as it reconnects. With a ``path`` the cache is kept in a JSON file
+    and survives restarts.
+
+    Clients created with :meth:`client` for a cached device only discover
+    the services holding its characteristics when connecting, which is
+    where most of the time to connect goes. ``error`` is the last exception
+    raised while checking the cached characteristics in the background.
+
+    :param path: The JSON file to keep the cache in, or None to only keep it
+        in memory
+    :type path: str | PathLike | None
+    """
+    def __init__(self, path: str | PathLike | None = None):
+        self.path = Path(path) if path is not None else None
+        self._entries: dict[str, list[str]] = {}
+        if self.path is not None and self.path.exists():
+            self._entries = json.loads(self.path.read_text())
+        self._validations: set[asyncio.Task] = set()
+        self.error: Exception | None = None
+
+    @staticmethod
+    def _key(address: str, firmware_version: str | None) -> str:
+        return f"{address.upper()}/{firmware_version or ''}"
+
+    def __contains__(self, address: str) -> bool:
+        # Whether any firmware version of the device is cached
+        prefix = self._key(address, None)
+        return any(key.startswith(prefix) for key in self._entries)
+
+    def client(self, address: str,
+               client_factory: Callable[..., BleakClient] = BleakClient,
+               **kwargs) -> BleakClient:
+        """
+        Create a client for a device, which only discovers the services
+        holding the characteristics when the device is cached.
+
+        :param address: The address of the device
+        :type address: str
+        :param client_factory: Creates the client, it is passed the services
+            to discover as ``services`` when the device is cached
+        :type client_factory: Callable[..., BleakClient]
+        :param kwargs: Passed on to ``client_factory``
+        :return: The client
+        :rtype: BleakClient
+        """
+        if address in self:
+            kwargs["services"] = [str(uuid) for uuid in CACHED_SERVICES]
+        return client_factory(address, **kwargs)
+
+    def get(self, address: str,
+            firmware_version: str | None = None) -> PacketList | None:
+        """
+        The cached characteristics of a device, or None if there are none.
+        """
+        uuids = self._entries.get(self._key(address, firmware_version))
+        if uuids is None:
+            return None
+        return [(uuid, ATMOTUBE_PRO_PACKETS[uuid]) for uuid in uuids
+                if uuid in ATMOTUBE_PRO_PACKETS]
+
+    def put(self, address: str, packet_list: PacketList,
+            firmware_version: str | None = None) -> None:
+        """
+        Cache the characteristics of a device, replacing those cached for
+        other firmware versions of it, and save the cache file.
+        """
+        prefix = self._key(address, None)
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+        self._entries[self._key(address, firmware_version)] = \
+            [str(uuid) for uuid, _ in packet_list]
+        self.save()
+
+    def discard(self, address: str,
+                firmware_version: str | None = None) -> None:
+        """
+        Forget the characteristics of a device, saving the cache file.
+        """
+        if self._entries.pop(self._key(address, firmware_version), None):
+            self.save()
+
+    def save(self) -> None:
+        if self.path is not None:
+            self.path.write_text(json.dumps(self._entries, indent=2))
+
+    async def subscribe(self, client: BleakClient,
+                        subscribe: Callable[[PacketList], Awaitable],
+                        firmware_version: str | None = None) -> PacketList:
+        """
+        Subscribe to the characteristics of a connected device with
+        ``subscribe``, using the cached characteristics when there are any.
+
+        The cached characteristics are checked against the device's services
+        after subscribing, in the background, subscribing to any that are
+        new and updating the cache. If subscribing from the cache fails, the
+        device's characteristics are discovered and subscribed to as usual.
+
+        :param client: The connected client
+        :type client: BleakClient
+        :param subscribe: Subscribes to a list of characteristics
+        :type subscribe: Callable[[PacketList], Awaitable]
+        :param firmware_version: The firmware version of the device, if known
+        :type firmware_version: str | None
+        :return: The characteristics subscribed to
+        :rtype: PacketList
+        """
+        address = client.address
+        packet_list = self.get(address, firmware_version)
+        if packet_list is not None:
+            try:
+                await subscribe(packet_list)
+            except BleakCharacteristicNotFoundError:
+                self.discard(address, firmware_version)
+                await asyncio.gather(*[client.stop_notify(uuid)
+                                       for uuid, _ in packet_list],
+                                     return_exceptions=True)
+            else:
+                task = asyncio.create_task(self._validate(
+                    client, subscribe, firmware_version, packet_list))
+                self._validations.add(task)
+                task.add_done_callback(self._validated)
+                return packet_list
+        packet_list = get_available_characteristics(client)
+        await subscribe(packet_list)
+        self.put(address, packet_list, firmware_version)
+        return packet_list
+
+    def _validated(self, task: asyncio.Task) -> None:
+        # Keep the exception of a failed check, so it isn't lost with the
+        # task
+        self._validations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.error = task.exception()
+
+    async def _validate(self, client: BleakClient,
+                        subscribe: Callable[[PacketList], Awaitable],
+                        firmware_version: str | None,
+                        cached: PacketList) -> None:
+        discovered = get_available_characteristics(client)
+        if set(discovered) == set(cached):
+            return
+        self.put(client.address, discovered, firmware_version)
+        new = [item for item in discovered if item not in cached]
+        if new:
+            await subscribe(new)
+
+
+async def start_cached_notifications(
+        client: BleakClient,
+        callback: Callable[[AtmotubeGATTPacket], None],
+        cache: CharacteristicCache,
+        firmware_version: str | None = None,
+        records: bool = False, lazy: bool = False,
+        tap: Callable[[str, bytearray], None] | None = None,
+        decode_cache: DecodeCache | None = None,
+        **kwargs) -> PacketList:
+    """
+    Start GATT notifications for every characteristic of a device, like
+    :func:`start_gatt_notifications`, using the cached characteristics of
+    the device, see :meth:`CharacteristicCache.subscribe`. Create the client
+    with :meth:`CharacteristicCache.client` so that connecting only
+    discovers the services holding them.
+
+    :param client: The BleakClient instance of the connected Atmotube device
+    :type client: BleakClient
+    :param callback: The callback function to call when a packet is received
+    :type callback: Callable[[AtmotubeGATTPacket], None]
+    :param cache: The characteristic cache
+    :type cache: CharacteristicCache
+    :param firmware_version: The firmware version of the device, read from
+        the device when None
+    :type firmware_version: str | None
+    :param records: Pass immutable records to the callback instead of packets
+    :type records: bool
+    :param lazy: Decode the packets on first attribute access
+    :type lazy: bool
+    :param tap: A function called with the uuid and raw bytes of every
+        notification before it is decoded
+    :type tap: Callable[[str, bytearray], None] | None
+    :param decode_cache: Reuse the decoded values of repeated payloads,
+        passed on as the ``cache`` of :func:`start_gatt_notifications`
+    :type decode_cache: DecodeCache | None
+    :param kwargs: The other options of :func:`start_gatt_notifications`,
+        such as ``clock_ns``
+    :return: The characteristics subscribed to
+    :rtype: PacketList
+    """
+    async def subscribe(packet_list: PacketList) -> None:
+        await start_gatt_notifications(client, callback,
+                                       packet_list=packet_list,
+                                       records=records, lazy=lazy, tap=tap,
+                                       cache=decode_cache, **kwargs)
+    if firmware_version is None:
+        firmware_version = await read_firmware_version(client)
+    return await cache.subscribe(client, subscribe, firmware_version)
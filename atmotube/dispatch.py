@@ -0,0 +1,170 @@
+from collections import deque
+from collections.abc import Callable, Hashable
+from concurrent.futures import Executor
+from typing import Any
+
+import asyncio
+import inspect
+import time
+
+
+class DispatchStats:
+    """
+    Counters for an :class:`ExecutorDispatcher`. ``depth`` is the number of
+    calls submitted and not yet finished, ``latency`` the time from
+    submitting a call to it finishing, in seconds, and ``error`` the last
+    exception raised by a handler.
+    """
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.error: Exception | None = None
+
+    @property
+    def mean_latency(self) -> float:
+        finished = self.completed + self.failed
+        return self.total_latency / finished if finished else 0.0
+
+    def __repr__(self) -> str:
+        return (f"DispatchStats(submitted={self.submitted}, "
+                f"completed={self.completed}, failed={self.failed}, "
+                f"depth={self.depth}, max_depth={self.max_depth}, "
+                f"mean_latency={self.mean_latency:.6f}s, "
+                f"max_latency={self.max_latency:.6f}s)")
+
+
+class ExecutorDispatcher:
+    """
+    Runs sync callbacks in an executor instead of on the event loop, so slow
+    handlers don't hold up the notifications of every other device.
+
+    Calls with the same key, such as the address of a device, run one after
+    the other in the order they were submitted, calls with different keys
+    run concurrently. At most ``max_in_flight`` calls can be waiting or
+    running at once, submitting another waits for one of them to finish.
+
+    With a ``ProcessPoolExecutor`` the handler and its arguments are
+    pickled, so use a module level function and pass records rather than
+    packets.
+
+    :param executor: The executor to run the calls in, defaults to the event
+        loop's default executor
+    :type executor: Executor | None
+    :param max_in_flight: The most calls waiting or running at once
+    :type max_in_flight: int
+    :param stats: Counters to update, defaults to new counters
+    :type stats: DispatchStats | None
+    :param clock: The clock used to measure latency, in seconds
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, executor: Executor | None = None,
+                 max_in_flight: int = 64,
+                 stats: DispatchStats | None = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.stats = stats if stats is not None else DispatchStats()
+        self._clock = clock
+        self._queues: dict[Hashable, deque] = {}
+        self._waiters: deque[asyncio.Future] = deque()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, handler: Callable,
+                     *args: Any) -> None:
+        """
+        Submit a call of ``handler`` with ``args``, to run after the calls
+        already submitted with the same key. Waits while ``max_in_flight``
+        calls are already in flight, in the order they were submitted.
+        """
+        stats = self.stats
+        if stats.depth >= self.max_in_flight or self._waiters:
+            # a finished call hands its place over to the first waiter
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+        else:
+            stats.depth += 1
+        stats.submitted += 1
+        stats.max_depth = max(stats.max_depth, stats.depth)
+        job = (handler, args, self._clock())
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append(job)
+            return
+        queue = self._queues[key] = deque([job])
+        task = asyncio.create_task(self._run(key, queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, queue: deque) -> None:
+        # Run the calls of one key in order, until its queue is empty
+        loop = asyncio.get_running_loop()
+        stats = self.stats
+        while queue:
+            handler, args, submitted_at = queue[0]
+            try:
+                await loop.run_in_executor(self.executor, handler, *args)
+            except Exception as e:
+                stats.failed += 1
+                stats.error = e
+            else:
+                stats.completed += 1
+            latency = self._clock() - submitted_at
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            queue.popleft()
+            self._release()
+        del self._queues[key]
+
+    def _release(self) -> None:
+        # Hand a place in flight over to the first waiter, or free it
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.stats.depth -= 1
+
+    def wrap(self, handler: Callable, key: Hashable = None,
+             key_of: Callable[..., Hashable] | None = None) -> Callable:
+        """
+        Wrap a sync handler as an async callback that submits its calls.
+
+        :param handler: The sync handler to run in the executor
+        :type handler: Callable
+        :param key: The key of every call
+        :type key: Hashable
+        :param key_of: Computes the key of each call from its arguments,
+            instead of using ``key``
+        :type key_of: Callable[..., Hashable] | None
+        :return: The async callback
+        """
+        if inspect.iscoroutinefunction(handler):
+            raise TypeError("Only sync callbacks can run in an executor")
+
+        if key_of is not None:
+            async def callback(*args: Any) -> None:
+                await self.submit(key_of(*args), handler, *args)
+        else:
+            async def callback(*args: Any) -> None:
+                await self.submit(key, handler, *args)
+        return callback
+
+    async def join(self) -> None:
+        """
+        Wait for every submitted call to finish.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
@@ -0,0 +1,162 @@
+"""
+Typed pandas and Polars DataFrames built straight from columnar arrays.
+
+Packets are turned back into one buffer of payloads and decoded with
+:mod:`atmotube.columnar`, so no attribute is read from any packet. The
+frames have a ``date_time`` index, or column for Polars, in UTC when the
+timestamps are nanoseconds since the epoch, nullable floats with nulls
+for the invalid readings, and bool status flags.
+
+This module requires numpy and pandas (``pip install PymoTube[pandas]``),
+Polars is only needed for :func:`to_polars`.
+"""
+from collections.abc import Iterable
+from ctypes import sizeof
+from os import PathLike
+from typing import Any, TypeAlias
+
+import numpy as np
+import pandas as pd
+
+from .capture import CaptureReader, CaptureSource
+from .columnar import Columns, decode_many
+from .packets import RECORD_PACKET_CLASSES
+
+Packets: TypeAlias = Iterable[Any] | Columns
+
+
+def _payloads(packet_cls: type, packets: list) -> np.ndarray:
+    # The raw bytes of the packets as one array of payloads, padded to the
+    # payload size where the structure is shorter than the payload
+    raw = np.frombuffer(b''.join(map(bytes, packets)), dtype=np.uint8)
+    size = sizeof(packet_cls)
+    if size == packet_cls._byte_size_:
+        return raw
+    payloads = np.zeros((len(packets), packet_cls._byte_size_), np.uint8)
+    payloads[:, :size] = raw.reshape(len(packets), size)
+    return payloads.ravel()
+
+
+def _record_columns(packet_cls: type, records: list) -> Columns:
+    # The columns of a list of records, with the same types as the decoded
+    # columns, None becomes NaN in the float columns
+    fields = dict(zip(packet_cls._record_._fields, zip(*records)))
+    columns = decode_many(packet_cls, b'', np.empty(0, np.int64))
+    for name, empty in columns.items():
+        if name in fields:
+            columns[name] = np.array(fields[name], dtype=empty.dtype
+                                     if empty.dtype.kind != 'U' else str)
+    columns['date_time'] = columns['timestamp_ns'].view('datetime64[ns]')
+    return columns
+
+
+def columns(packets: Packets, packet_cls: type | None = None) -> Columns:
+    """
+    The columnar arrays of packets or records of one class, see
+    :func:`atmotube.columnar.decode_many`. Columns are passed through.
+
+    :param packets: Packets or records of one class, or columns
+    :type packets: Iterable | Columns
+    :param packet_cls: The packet class, needed when there are no packets
+    :type packet_cls: type | None
+    :return: A dictionary mapping column names to arrays
+    :rtype: Columns
+    """
+    if isinstance(packets, dict):
+        return packets
+    packets = list(packets)
+    classes = {type(packet) for packet in packets}
+    if len(classes) > 1:
+        raise TypeError("Packets of more than one class can't go in one "
+                        "frame")
+    if not classes:
+        if packet_cls is None:
+            raise ValueError("packet_cls is needed for an empty frame")
+        return decode_many(packet_cls, b'', np.empty(0, np.int64))
+    cls = classes.pop()
+    if cls in RECORD_PACKET_CLASSES:
+        return _record_columns(RECORD_PACKET_CLASSES[cls], packets)
+    timestamps = np.fromiter((packet.timestamp_ns for packet in packets),
+                             dtype=np.int64, count=len(packets))
+    return decode_many(cls, _payloads(cls, packets), timestamps)
+
+
+def _index(columns: Columns) -> pd.DatetimeIndex:
+    if 'timestamp_ns' in columns:
+        return pd.DatetimeIndex(pd.to_datetime(columns['timestamp_ns'],
+                                               unit='ns', utc=True),
+                                name='date_time')
+    return pd.DatetimeIndex(columns['date_time'], name='date_time')
+
+
+def _series(values: np.ndarray) -> Any:
+    # Nullable floats, with the NaNs masked, and strings, the rest as is
+    if values.dtype.kind == 'f':
+        return pd.arrays.FloatingArray(values, np.isnan(values))
+    if values.dtype.kind == 'U':
+        return pd.array(values, dtype='string')
+    return values
+
+
+def to_frame(packets: Packets, packet_cls: type | None = None
+             ) -> pd.DataFrame:
+    """
+    A pandas DataFrame of packets or records of one class, or of the
+    columns from :mod:`atmotube.columnar`, with a ``date_time`` index.
+
+    :param packets: Packets or records of one class, or columns
+    :type packets: Iterable | Columns
+    :param packet_cls: The packet class, needed when there are no packets
+    :type packet_cls: type | None
+    :return: The DataFrame
+    :rtype: pd.DataFrame
+    """
+    data = columns(packets, packet_cls)
+    return pd.DataFrame({name: _series(values)
+                         for name, values in data.items()
+                         if name not in ('date_time', 'timestamp_ns')},
+                        index=_index(data))
+
+
+def to_polars(packets: Packets, packet_cls: type | None = None) -> Any:
+    """
+    A Polars DataFrame of packets or records of one class, or of the
+    columns from :mod:`atmotube.columnar`, with a ``date_time`` column
+    first. Requires polars.
+
+    :param packets: Packets or records of one class, or columns
+    :type packets: Iterable | Columns
+    :param packet_cls: The packet class, needed when there are no packets
+    :type packet_cls: type | None
+    :return: The DataFrame
+    :rtype: polars.DataFrame
+    """
+    import polars as pl
+
+    data = columns(packets, packet_cls)
+    if 'timestamp_ns' in data:
+        date_time = pl.Series('date_time', data['timestamp_ns']).cast(
+            pl.Datetime('ns', time_zone='UTC'))
+    else:
+        date_time = pl.Series('date_time', data['date_time'])
+    return pl.DataFrame([date_time] + [
+        pl.Series(name, values, nan_to_null=values.dtype.kind == 'f')
+        for name, values in data.items()
+        if name not in ('date_time', 'timestamp_ns')])
+
+
+def capture_frames(capture: CaptureReader | str | PathLike
+                   ) -> dict[tuple[CaptureSource, type], pd.DataFrame]:
+    """
+    Decode every payload in a capture file into pandas DataFrames, one per
+    source and packet class, see :meth:`CaptureReader.decode`.
+
+    :param capture: A capture reader, or the path of a capture file
+    :type capture: CaptureReader | str | PathLike
+    :return: A dictionary mapping (source, packet class) to DataFrames
+    :rtype: dict[tuple[CaptureSource, type], pd.DataFrame]
+    """
+    if not isinstance(capture, CaptureReader):
+        with CaptureReader(capture) as reader:
+            return capture_frames(reader)
+    return {key: to_frame(data) for key, data in capture.decode().items()}
@@ -1,10 +1,15 @@
 from bleak import BleakClient, BleakGATTCharacteristic
 from collections.abc import Callable, Awaitable
+from functools import partial
 from typing import TypeAlias
+from weakref import WeakKeyDictionary
 
 import asyncio
 import inspect
 
+from .batching import Batcher, Delivery
+from .clock import datetime_from_ns, now_ns
+from .decode_cache import DecodeCache
 from .uuids import AtmotubeProService_UUID, AtmotubeProGATT_UUID
 from .packets import (
     AtmotubeGATTPacket,
@@ -18,6 +23,12 @@ ATMOTUBE_PRO_PACKETS = {AtmotubeProGATT_UUID.STATUS: AtmotubeProStatus,
                         AtmotubeProGATT_UUID.SGPC3: AtmotubeProSGPC3}
 
 
+# The batchers made by gatt_notify for each client, by uuid, so that
+# stop_gatt_notifications can deliver the packets waiting in them
+_BATCHERS: WeakKeyDictionary[BleakClient, dict[str, Batcher]] = \
+    WeakKeyDictionary()
+
+
 class InvalidAtmotubeService(Exception):
     pass
 
@@ -41,32 +52,112 @@ def get_available_characteristics(client: BleakClient) -> PacketList:
             if uuid in ATMOTUBE_PRO_PACKETS]
 
 
+def _accepts(func: Callable, name: str) -> bool:
+    # Whether func takes a keyword argument called name
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in parameters or any(
+        parameter.kind is inspect.Parameter.VAR_KEYWORD
+        for parameter in parameters.values())
+
+
+def _gatt_decoder(packet_cls: AtmotubeGATTPacket, records: bool, lazy: bool,
+                  cache: DecodeCache | None) -> Callable:
+    # Build the function turning a payload and its timestamp into a packet
+    # or record
+    if cache is not None:
+        return partial(cache.record if records else cache.packet, packet_cls)
+    elif records:
+        return packet_cls.record
+    elif lazy:
+        return partial(packet_cls, lazy=True)
+    elif _accepts(packet_cls, "timestamp_ns"):
+        return packet_cls
+    # Other packet classes are given the timestamp as a datetime if they
+    # take one, and are left to timestamp themselves otherwise
+    elif _accepts(packet_cls, "date_time"):
+        return lambda data, timestamp_ns: packet_cls(
+            data, date_time=datetime_from_ns(timestamp_ns))
+    else:
+        return lambda data, timestamp_ns: packet_cls(data)
+
+
 def gatt_notify(client: BleakClient, uuid: str | AtmotubeProGATT_UUID,
                 packet_cls: AtmotubeGATTPacket,
-                callback: Callable[[AtmotubeGATTPacket], None]) -> Awaitable:
+                callback: Callable[[AtmotubeGATTPacket], None],
+                records: bool = False, lazy: bool = False,
+                tap: Callable[[str, bytearray], None] | None = None,
+                cache: DecodeCache | None = None,
+                delivery: Delivery | None = None,
+                clock_ns: Callable[[], int] = now_ns) -> Awaitable:
     """
     Start GATT notifications for a specific characteristic UUID.
 
+    With the ``max_batch`` of ``delivery`` the callback is called with lists
+    of packets instead, once ``max_batch`` packets have arrived or
+    ``max_latency`` seconds after the first packet of the batch, whichever
+    comes first. The last batch is delivered by
+    :func:`stop_gatt_notifications`.
+
+    With the ``dispatcher`` of ``delivery`` the callback runs in an executor
+    instead of on the event loop, the packets of each device are handled in
+    order.
+
     :param client: The BleakClient instance of the connected Atmotube device
     :type client: BleakClient
     :param uuid: The UUID of the characteristic to notify
     :type uuid: str | AtmotubeProGATT_UUID
-    :param packet_cls: The packet class to instantiate from the received data
+    :param packet_cls: The packet class to instantiate from the received
+        data, it is passed the timestamp as ``timestamp_ns`` or ``date_time``
+        if it takes either
     :type packet_cls: AtmotubeGATTPacket
     :param callback: The callback function to call when a packet is received
     :type callback: Callable[[AtmotubeGATTPacket], None]
+    :param records: Pass immutable records to the callback instead of packets
+    :type records: bool
+    :param lazy: Decode the packets on first attribute access, ignored when
+        passing records
+    :type lazy: bool
+    :param tap: A function called with the uuid and raw bytes of every
+        notification before it is decoded, such as a capture file writer
+    :type tap: Callable[[str, bytearray], None] | None
+    :param cache: Reuse the decoded values of repeated payloads, ``lazy`` is
+        ignored when using a cache
+    :type cache: DecodeCache | None
+    :param delivery: Batch the packets, or run the callback in an executor
+    :type delivery: Delivery | None
+    :param clock_ns: The clock timestamping the packets as soon as they
+        arrive, in nanoseconds since the epoch
+    :type clock_ns: Callable[[], int]
     :return: An awaitable object representing the notification task
     :rtype: Awaitable
     """
+    max_batch, max_latency, dispatcher = delivery or Delivery()
+    if dispatcher is not None:
+        callback = dispatcher.wrap(callback, client.address)
+    if max_batch is not None:
+        batcher = Batcher(callback, max_batch, max_latency)
+        _BATCHERS.setdefault(client, {})[str(uuid).upper()] = batcher
+        callback = batcher.add
+
+    decode = _gatt_decoder(packet_cls, records, lazy, cache)
     if inspect.iscoroutinefunction(callback):
         async def packet_callback(char: BleakGATTCharacteristic,
                                   data: bytearray):
-            packet = packet_cls(data)
+            timestamp_ns = clock_ns()
+            if tap:
+                tap(uuid, data)
+            packet = decode(data, timestamp_ns=timestamp_ns)
             await callback(packet)
     else:
         def packet_callback(char: BleakGATTCharacteristic,
                             data: bytearray):
-            packet = packet_cls(data)
+            timestamp_ns = clock_ns()
+            if tap:
+                tap(uuid, data)
+            packet = decode(data, timestamp_ns=timestamp_ns)
             callback(packet)
 
     return client.start_notify(uuid, packet_callback)
@@ -75,16 +166,67 @@ def gatt_notify(client: BleakClient, uuid: str | AtmotubeProGATT_UUID,
 async def start_gatt_notifications(
         client: BleakClient,
         callback: Callable[[AtmotubeGATTPacket], None],
-        packet_list: PacketList = list(ATMOTUBE_PRO_PACKETS.items())) -> None:
+        packet_list: PacketList = list(ATMOTUBE_PRO_PACKETS.items()),
+        records: bool = False, lazy: bool = False,
+        tap: Callable[[str, bytearray], None] | None = None,
+        cache: DecodeCache | None = None,
+        delivery: Delivery | None = None,
+        clock_ns: Callable[[], int] = now_ns) -> None:
     """
     Start GATT notifications for all specified characteristics.
 
+    When batching, the packets of each characteristic are delivered in
+    separate batches, so every batch is of one packet class, stop the
+    notifications with :func:`stop_gatt_notifications` to deliver the last
+    batches.
+
     :param client: The BleakClient instance of the connected Atmotube device
     :type client: BleakClient
     :param callback: The callback function to call when a packet is received
     :type callback: Callable[[AtmotubeGATTPacket], None]
     :param packet_list: The list of UUIDs and packet classes to notify
     :type packet_list: PacketList
+    :param records: Pass immutable records to the callback instead of packets
+    :type records: bool
+    :param lazy: Decode the packets on first attribute access
+    :type lazy: bool
+    :param tap: A function called with the uuid and raw bytes of every
+        notification before it is decoded
+    :type tap: Callable[[str, bytearray], None] | None
+    :param cache: Reuse the decoded values of repeated payloads
+    :type cache: DecodeCache | None
+    :param delivery: Batch the packets, or run the callback in an executor
+    :type delivery: Delivery | None
+    :param clock_ns: The clock timestamping the packets, in nanoseconds
+        since the epoch
+    :type clock_ns: Callable[[], int]
     """
-    await asyncio.gather(*[gatt_notify(client, uuid, packet_cls, callback)
+    await asyncio.gather(*[gatt_notify(client, uuid, packet_cls, callback,
+                                       records=records, lazy=lazy, tap=tap,
+                                       cache=cache, delivery=delivery,
+                                       clock_ns=clock_ns)
                            for uuid, packet_cls in packet_list])
+
+
+async def stop_gatt_notifications(
+        client: BleakClient,
+        packet_list: PacketList = list(ATMOTUBE_PRO_PACKETS.items())
+        ) -> None:
+    """
+    Stop GATT notifications for all specified characteristics, then deliver
+    the packets still waiting for a batch when they were started with a
+    ``max_batch``.
+
+    :param client: The BleakClient instance of the connected Atmotube device
+    :type client: BleakClient
+    :param packet_list: The list of UUIDs and packet classes to stop
+    :type packet_list: PacketList
+    """
+    batchers = _BATCHERS.get(client, {})
+    try:
+        await asyncio.gather(*[client.stop_notify(uuid)
+                               for uuid, _ in packet_list])
+    finally:
+        await asyncio.gather(*[batchers.pop(str(uuid).upper()).flush()
+                               for uuid, _ in packet_list
+                               if str(uuid).upper() in batchers])
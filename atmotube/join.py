@@ -0,0 +1,246 @@
+from collections.abc import Callable
+from datetime import datetime
+from functools import partial
+from itertools import accumulate
+from operator import attrgetter
+from typing import Any, NamedTuple
+
+import asyncio
+import inspect
+
+from .clock import datetime_from_ns, now_ns
+from .packets import (AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3)
+
+
+class Reading(NamedTuple):
+    """
+    The latest values of every GATT characteristic of one device, joined
+    into a single row. Values that haven't arrived yet, or are too old, are
+    None.
+    """
+    timestamp_ns: int
+    address: str | None
+    pm1: float | None
+    pm2_5: float | None
+    pm10: float | None
+    pm4: float | None
+    humidity: int | None
+    temperature: float | None
+    pressure: float | None
+    tvoc: float | None
+    battery_level: int | None
+
+    @property
+    def date_time(self) -> datetime:
+        """
+        The timestamp as a naive datetime in local time.
+        """
+        return datetime_from_ns(self.timestamp_ns)
+
+
+# The values each packet class contributes to a reading, in reading order
+_SOURCES = {AtmotubeProSPS30: ("pm1", "pm2_5", "pm10", "pm4"),
+            AtmotubeProBME280: ("humidity", "temperature", "pressure"),
+            AtmotubeProSGPC3: ("tvoc",),
+            AtmotubeProStatus: ("battery_level",)}
+
+
+def _getter(names: tuple[str, ...]) -> Callable[[Any], tuple]:
+    get = attrgetter(*names)
+    if len(names) == 1:
+        return lambda packet: (get(packet),)
+    return get
+
+
+def _slices() -> list[slice]:
+    # Where the values of each packet class go in a reading's values
+    stops = list(accumulate(len(names) for names in _SOURCES.values()))
+    return [slice(stop - len(names), stop)
+            for stop, names in zip(stops, _SOURCES.values())]
+
+
+_SLICES = _slices()
+_EMPTY = [(None,) * len(names) for names in _SOURCES.values()]
+
+# The slot, values slice and value getter of each packet and record class
+_SLOTS = {key: (slot, _SLICES[slot], _getter(names))
+          for slot, (cls, names) in enumerate(_SOURCES.items())
+          for key in (cls, cls._record_)}
+
+
+class ReadingJoiner:
+    """
+    Joins the packets of the four GATT characteristics, which arrive
+    independently and at different rates, into one :class:`Reading` per
+    device, carrying the last value of each characteristic forward.
+
+    Packets, or records, are passed to :meth:`update`, for example with
+    :meth:`gatt_callback` as the callback of
+    :func:`start_gatt_notifications`. Without an ``interval`` a reading is
+    emitted for every packet, timestamped with the packet. With an
+    ``interval`` a reading of every device is emitted each ``interval``
+    seconds instead, timestamped with ``clock_ns``, from a timer on the
+    event loop that starts with the first packet.
+
+    Values older than ``max_age`` seconds at the time of the reading are
+    left out, and in ticked mode a device with nothing but stale values is
+    forgotten until its next packet. Only the latest packet of each
+    characteristic is kept, so the memory used per device is constant.
+
+    :param callback: Called with each reading
+    :type callback: Callable[[Reading], None]
+    :param interval: Seconds between readings, or None to emit a reading for
+        every packet
+    :type interval: float | None
+    :param max_age: The age, in seconds, after which values are left out of
+        readings, or None to carry them forward forever
+    :type max_age: float | None
+    :param clock_ns: The clock timestamping ticked readings, in nanoseconds
+        since the epoch
+    :type clock_ns: Callable[[], int]
+    """
+    def __init__(self, callback: Callable[[Reading], None],
+                 interval: float | None = None,
+                 max_age: float | None = 60.0,
+                 clock_ns: Callable[[], int] = now_ns):
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be positive")
+        if max_age is not None and max_age < 0:
+            raise ValueError("max_age must not be negative")
+        self.callback = callback
+        self.interval = interval
+        self.max_age = max_age
+        self.clock_ns = clock_ns
+        self._max_age_ns = None if max_age is None else int(max_age * 1e9)
+        # The timestamps of the latest packet of each class, and the latest
+        # values, by address
+        self._devices: dict[str | None, tuple[list, list]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        if interval is None and inspect.iscoroutinefunction(callback):
+            async def update(packet: Any, address: str | None = None
+                             ) -> None:
+                await callback(self._join(address, self._store(packet,
+                                                               address),
+                                          packet.timestamp_ns))
+        elif interval is None:
+            def update(packet: Any, address: str | None = None) -> None:
+                callback(self._join(address, self._store(packet, address),
+                                    packet.timestamp_ns))
+        else:
+            def update(packet: Any, address: str | None = None) -> None:
+                self._store(packet, address)
+                if self._timer is None:
+                    loop = asyncio.get_running_loop()
+                    when = loop.time() + interval
+                    self._timer = loop.call_at(when, self._tick, when)
+        self.update = update
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def gatt_callback(self, address: str | None = None
+                      ) -> Callable[[Any], None]:
+        """
+        A callback for :func:`gatt_notify` or
+        :func:`start_gatt_notifications` that joins the packets of the
+        device with this address.
+        """
+        return partial(self.update, address=address)
+
+    def _store(self, packet: Any, address: str | None) -> tuple[list, list]:
+        # Keep the packet's values, returning the state of the device
+        try:
+            slot, values_slice, get = _SLOTS[type(packet)]
+        except KeyError:
+            raise TypeError(f"{type(packet).__name__} can't be "
+                            f"joined") from None
+        state = self._devices.get(address)
+        if state is None:
+            state = self._devices[address] = ([None] * len(_SOURCES),
+                                              [None] * _SLICES[-1].stop)
+        state[0][slot] = packet.timestamp_ns
+        state[1][values_slice] = get(packet)
+        return state
+
+    def _join(self, address: str | None, state: tuple[list, list],
+              timestamp_ns: int) -> Reading | None:
+        # The reading at timestamp_ns, or None when every value is stale
+        timestamps, values = state
+        if self._max_age_ns is not None:
+            oldest = timestamp_ns - self._max_age_ns
+            stale = [slot for slot, packet_ns in enumerate(timestamps)
+                     if packet_ns is not None and packet_ns < oldest]
+            if stale:
+                if len(stale) == len(timestamps) - timestamps.count(None):
+                    return None
+                values = values.copy()
+                for slot in stale:
+                    values[_SLICES[slot]] = _EMPTY[slot]
+        # tuple.__new__ skips the argument handling of Reading._make
+        return tuple.__new__(Reading, (timestamp_ns, address, *values))
+
+    def reading(self, address: str | None = None,
+                timestamp_ns: int | None = None) -> Reading | None:
+        """
+        The reading of a device now, or at ``timestamp_ns``, or None if
+        there are no fresh values for it.
+        """
+        state = self._devices.get(address)
+        if state is None:
+            return None
+        if timestamp_ns is None:
+            timestamp_ns = self.clock_ns()
+        return self._join(address, state, timestamp_ns)
+
+    def tick(self) -> list[Reading]:
+        """
+        Emit the reading of every device now, forgetting the devices with
+        nothing but stale values. This is called by the timer in ticked
+        mode, and can be called directly to drive the joiner by hand.
+
+        :return: The readings emitted
+        :rtype: list[Reading]
+        """
+        timestamp_ns = self.clock_ns()
+        readings = []
+        for address, state in list(self._devices.items()):
+            reading = self._join(address, state, timestamp_ns)
+            if reading is None:
+                del self._devices[address]
+            else:
+                readings.append(reading)
+        for reading in readings:
+            self._emit(reading)
+        return readings
+
+    def _tick(self, scheduled: float) -> None:
+        # The next tick is scheduled from this one, not from now, so the
+        # readings don't drift. The timer stops once every device is stale
+        # and starts again with the next packet
+        loop = asyncio.get_running_loop()
+        when = max(scheduled + self.interval, loop.time())
+        self._timer = loop.call_at(when, self._tick, when) \
+            if self.tick() else None
+
+    def _emit(self, reading: Reading) -> None:
+        if inspect.iscoroutinefunction(self.callback):
+            task = asyncio.create_task(self.callback(reading))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.callback(reading)
+
+    async def close(self) -> None:
+        """
+        Stop the timer and wait for the readings being delivered.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
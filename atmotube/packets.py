@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from collections.abc import Sequence
 from ctypes import (BigEndianStructure,
                     LittleEndianStructure,
                     c_ubyte,
@@ -6,35 +7,318 @@ from ctypes import (BigEndianStructure,
                     c_short,
                     c_int)
 from datetime import datetime
+from numbers import Integral
+from struct import Struct, error
 from typing import TypeAlias
 
+from .clock import datetime_from_ns, now_ns, ns_from_datetime, resolve_ns
+from .records import (AtmotubeProStatusRecord,
+                      AtmotubeProSPS30Record,
+                      AtmotubeProBME280Record,
+                      AtmotubeProSGPC3Record,
+                      AtmotubeProBLEAdvertisingRecord,
+                      AtmotubeProBLEScanResponseRecord)
+
 FieldList: TypeAlias = list[tuple]
+Buffer: TypeAlias = bytes | bytearray | memoryview
 
 
 class InvalidByteData(Exception):
     pass
 
 
-# This class is intended to be abstract. It is only exposed to the user to use
-# as a type hint forfunctions that accept any Atmotube packet.
-class AtmotubeGATTPacket(LittleEndianStructure):
+# The pm_sensor, error, bonding, charging, charging_timer and pre_heating
+# flags, in that order, for every possible value of the status bitfield
+_STATUS_FLAGS = tuple(tuple(bool(flags & bit)
+                            for bit in (0x01, 0x02, 0x04, 0x08, 0x10, 0x40))
+                      for flags in range(256))
+
+
+def _encode_flags(flags: Sequence[bool]) -> int:
+    # The inverse of _STATUS_FLAGS
+    return sum(bit for flag, bit in zip(flags, (0x01, 0x02, 0x04, 0x08,
+                                                0x10, 0x40)) if flag)
+
+
+def _scaled(value: float | None, scale: float) -> int:
+    # The inverse of ``raw/scale if raw > 0 else None``
+    return 0 if value is None else round(value * scale)
+
+
+def _integers(cls: type, fields: tuple) -> tuple:
+    # Check the values of the readings that decode as integers, whole
+    # floats are taken as the integer they are equal to
+    fields = list(fields)
+    for i, name in enumerate(cls._field_names_):
+        if name not in cls._integer_fields_ or fields[i] is None:
+            continue
+        value = fields[i]
+        if isinstance(value, float) and value.is_integer():
+            fields[i] = int(value)
+        elif not isinstance(value, Integral):
+            raise ValueError(f"{name} must be a whole number for "
+                             f"{cls.__name__}, got {value!r}")
+    return tuple(fields)
+
+
+def _compile_decoder(cls: type) -> None:
+    # Compile the struct once, when the packet class is created, and expose
+    # each decoded value as a read-only attribute. The decoded values are
+    # stored as a single tuple, which is much cheaper than setting one
+    # attribute per field on a ctypes instance.
+    cls._struct_ = Struct(cls._struct_format_)
+    for i, name in enumerate(cls._field_names_):
+        setattr(cls, name, _value_property(i))
+
+
+def _value_property(i: int) -> property:
+    return property(lambda packet: packet._values_[i])
+
+
+# Packets are timestamped with integer nanoseconds since the epoch, or with a
+# datetime when one is given, and the other is computed when it is first read
+
+def _stamp(packet, date_time: datetime | None,
+           timestamp_ns: int | None) -> None:
+    if date_time is None:
+        packet._timestamp_ns = now_ns() if timestamp_ns is None \
+            else timestamp_ns
+    else:
+        packet._date_time = date_time
+        if timestamp_ns is not None:
+            packet._timestamp_ns = timestamp_ns
+
+
+def _get_date_time(packet) -> datetime:
+    date_time = packet._date_time
+    if date_time is None:
+        date_time = packet._date_time = \
+            datetime_from_ns(packet._timestamp_ns)
+    return date_time
+
+
+def _set_date_time(packet, date_time: datetime) -> None:
+    packet._date_time = date_time
+    packet._timestamp_ns = None
+
+
+def _get_timestamp_ns(packet) -> int:
+    timestamp_ns = packet._timestamp_ns
+    if timestamp_ns is None:
+        timestamp_ns = packet._timestamp_ns = \
+            ns_from_datetime(packet._date_time)
+    return timestamp_ns
+
+
+def _set_timestamp_ns(packet, timestamp_ns: int) -> None:
+    packet._timestamp_ns = timestamp_ns
+    packet._date_time = None
+
+
+_DATE_TIME = property(_get_date_time, _set_date_time,
+                      doc="The timestamp as a naive datetime in local time")
+_TIMESTAMP_NS = property(_get_timestamp_ns, _set_timestamp_ns,
+                         doc="The timestamp in nanoseconds since the epoch")
+
+
+class _AtmotubePacket:
     """
-    Abstract base class for Atmotube data packets.
+    The decoding, encoding and timestamping shared by the GATT and BLE
+    packets, mixed into the ctypes structure of each byte order.
     """
     _byte_size_: int = 0  # To be defined in subclasses
+    _struct_format_: str = ""  # To be defined in subclasses
+    _field_names_: tuple[str, ...] = ()  # To be defined in subclasses
+    _integer_fields_: tuple[str, ...] = ()  # The fields decoded as integers
+
+    _record_: type  # To be defined in subclasses
+
+    _date_time: datetime | None = None
+    _timestamp_ns: int | None = None
+    date_time = _DATE_TIME
+    timestamp_ns = _TIMESTAMP_NS
 
-    def __new__(cls, data: bytearray, date_time: datetime | None = None):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _compile_decoder(cls)
+
+    def __new__(cls, data: bytearray, date_time: datetime | None = None,
+                lazy: bool = False, timestamp_ns: int | None = None):
         if len(data) != cls._byte_size_:
             raise InvalidByteData(f"Expected {cls._byte_size_} bytes, "
                                   f"got {len(data)} bytes")
         return cls.from_buffer_copy(data)
 
-    def __init__(self, data: bytearray, date_time: datetime | None = None):
-
-        if date_time is None:
-            date_time = datetime.now()
-        self.date_time = date_time
+    def __init__(self, data: bytearray, date_time: datetime | None = None,
+                 lazy: bool = False, timestamp_ns: int | None = None):
+        _stamp(self, date_time, timestamp_ns)
+        if not lazy:
+            self._process_bytes()
+
+    def __getattr__(self, name: str) -> object:
+        # Only reached when normal attribute lookup fails, which for the
+        # decoded values means a lazy packet that has not been decoded yet
+        if name != "_values_":
+            raise AttributeError(f"'{type(self).__name__}' object has no "
+                                 f"attribute '{name}'")
         self._process_bytes()
+        return self._values_
+
+    @classmethod
+    def record(cls, data: Buffer, date_time: datetime | None = None,
+               timestamp_ns: int | None = None):
+        """
+        Decode a payload into an immutable record instead of a packet. The
+        record has the same attributes as the packet but takes up a
+        fraction of the memory.
+
+        :param data: The raw payload
+        :type data: bytes | bytearray | memoryview
+        :param date_time: The timestamp of the payload, defaults to now
+        :type date_time: datetime | None
+        :param timestamp_ns: The timestamp of the payload in nanoseconds
+            since the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: A record of the decoded values
+        :rtype: NamedTuple
+        """
+        if len(data) != cls._byte_size_:
+            raise InvalidByteData(f"Expected {cls._byte_size_} bytes, "
+                                  f"got {len(data)} bytes")
+        return cls._record_(resolve_ns(date_time, timestamp_ns),
+                            *cls._decode_(data))
+
+    @classmethod
+    def from_view(cls, view: Buffer, offset: int = 0,
+                  date_time: datetime | None = None, lazy: bool = False,
+                  timestamp_ns: int | None = None):
+        """
+        Create a packet from the bytes at ``offset`` in a larger buffer, such
+        as a capture file or a ring buffer, without copying them.
+
+        The packet shares memory with a writable buffer: it keeps the buffer
+        alive, the buffer cannot be resized (or an mmap closed) while the
+        packet exists, and overwriting those bytes changes the raw fields of
+        the packet. The decoded values are fixed when the packet is decoded,
+        so decode eagerly, or read the packet, before the bytes are reused.
+        ctypes cannot share read-only memory, so for read-only buffers only
+        the packet's own bytes are copied, use :meth:`record_from_view` to
+        decode those without copying anything.
+
+        :param view: The byte buffer containing the payload
+        :type view: bytes | bytearray | memoryview
+        :param offset: The offset of the payload in the buffer
+        :type offset: int
+        :param date_time: The timestamp of the payload, defaults to now
+        :type date_time: datetime | None
+        :param lazy: Decode the packet on first attribute access
+        :type lazy: bool
+        :param timestamp_ns: The timestamp of the payload in nanoseconds
+            since the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: A packet backed by the buffer
+        """
+        cls._check_view(view, offset)
+        try:
+            packet = cls.from_buffer(view, offset)
+        except TypeError:  # the buffer is read-only
+            packet = cls.from_buffer_copy(view, offset)
+        _stamp(packet, date_time, timestamp_ns)
+        if not lazy:
+            packet._process_bytes()
+        return packet
+
+    @classmethod
+    def record_from_view(cls, view: Buffer, offset: int = 0,
+                         date_time: datetime | None = None,
+                         timestamp_ns: int | None = None):
+        """
+        Decode the bytes at ``offset`` in a larger, writable or read-only,
+        buffer directly into a record, without copying them. The record does
+        not reference the buffer once it is created.
+
+        :param view: The byte buffer containing the payload
+        :type view: bytes | bytearray | memoryview
+        :param offset: The offset of the payload in the buffer
+        :type offset: int
+        :param date_time: The timestamp of the payload, defaults to now
+        :type date_time: datetime | None
+        :param timestamp_ns: The timestamp of the payload in nanoseconds
+            since the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: A record of the decoded values
+        :rtype: NamedTuple
+        """
+        cls._check_view(view, offset)
+        return cls._record_(resolve_ns(date_time, timestamp_ns),
+                            *cls._decode_(view, offset))
+
+    @classmethod
+    def _check_view(cls, view: Buffer, offset: int) -> None:
+        if offset < 0 or offset + cls._byte_size_ > len(view):
+            raise InvalidByteData(f"Expected {cls._byte_size_} bytes at "
+                                  f"offset {offset}, got "
+                                  f"{max(len(view) - offset, 0)} bytes")
+
+    @classmethod
+    def decode_many(cls, buffer: Buffer,
+                    timestamps: Sequence[datetime] | Sequence[int]) -> dict:
+        """
+        Decode a buffer of N concatenated payloads into columnar NumPy
+        arrays, see :func:`atmotube.columnar.decode_many`. Requires numpy.
+
+        :param buffer: N payloads of ``_byte_size_`` bytes each
+        :type buffer: bytes | bytearray | memoryview
+        :param timestamps: The N timestamps of the payloads, as datetimes or
+            integer nanoseconds since the epoch
+        :type timestamps: Sequence[datetime] | Sequence[int]
+        :return: A dictionary mapping column names to arrays
+        :rtype: dict
+        """
+        from .columnar import decode_many
+        return decode_many(cls, buffer, timestamps)
+
+    @classmethod
+    def encode(cls, **values) -> bytes:
+        """
+        Encode physical values into a raw payload, the inverse of decoding.
+        Takes one keyword argument per attribute of the packet, readings
+        given as ``None`` are encoded as invalid readings.
+
+        :return: The raw payload
+        :rtype: bytes
+        :raises ValueError: If a value is missing, out of range, or not a
+            whole number where the packet holds an integer
+        """
+        try:
+            fields = tuple(values.pop(name) for name in cls._field_names_)
+        except KeyError as e:
+            raise ValueError(f"Missing value for {e.args[0]}") from None
+        if values:
+            raise ValueError(f"Unexpected values {', '.join(values)}")
+        fields = _integers(cls, fields)
+        try:
+            payload = cls._struct_.pack(*cls._encode_(fields))
+        except (OverflowError, error) as e:
+            raise ValueError(f"Value out of range for "
+                             f"{cls.__name__}: {e}") from None
+        return payload.ljust(cls._byte_size_, b'\x00')
+
+    @classmethod
+    def from_values(cls, date_time: datetime | None = None,
+                    timestamp_ns: int | None = None, **values):
+        """
+        Create a packet from physical values, see :meth:`encode`.
+
+        :param date_time: The timestamp of the packet, defaults to now
+        :type date_time: datetime | None
+        :param timestamp_ns: The timestamp of the packet in nanoseconds
+            since the epoch, used instead of ``date_time``
+        :type timestamp_ns: int | None
+        :return: A packet with the given values
+        """
+        return cls(cls.encode(**values), date_time=date_time,
+                   timestamp_ns=timestamp_ns)
 
     def __repr__(self) -> str:
         return str(self)
@@ -47,10 +331,35 @@ class AtmotubeGATTPacket(LittleEndianStructure):
     def __str__(self) -> str:
         ...
 
-    @abstractmethod
     def _process_bytes(self) -> None:
+        self._values_ = self._decode_(self)
+
+    @classmethod
+    @abstractmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        """
+        Decode the raw bytes at ``offset`` into the values of
+        ``_field_names_``, in order.
+        """
         ...
 
+    @classmethod
+    @abstractmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        """
+        Convert the values of ``_field_names_``, in order, into the
+        arguments of ``_struct_.pack``.
+        """
+        ...
+
+
+# This class is intended to be abstract. It is only exposed to the user to use
+# as a type hint forfunctions that accept any Atmotube packet.
+class AtmotubeGATTPacket(_AtmotubePacket, LittleEndianStructure):
+    """
+    Abstract base class for Atmotube data packets.
+    """
+
 
 class AtmotubeProStatus(AtmotubeGATTPacket):
     """
@@ -69,15 +378,22 @@ class AtmotubeProStatus(AtmotubeGATTPacket):
     ]
 
     _byte_size_: int = 2
-
-    def _process_bytes(self) -> None:
-        self.pm_sensor_status = bool(self._pm_sensor)
-        self.error_flag = bool(self._error)
-        self.bonding_flag = bool(self._bonding)
-        self.charging = bool(self._charging)
-        self.charging_timer = bool(self._charging_timer)
-        self.pre_heating = bool(self._pre_heating)
-        self.battery_level = self._battery
+    _record_: type = AtmotubeProStatusRecord
+    _struct_format_: str = "<BB"
+    _field_names_: tuple[str, ...] = ("pm_sensor_status", "error_flag",
+                                      "bonding_flag", "charging",
+                                      "charging_timer", "pre_heating",
+                                      "battery_level")
+    _integer_fields_: tuple[str, ...] = ("battery_level",)
+
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        flags, battery = cls._struct_.unpack_from(data, offset)
+        return (*_STATUS_FLAGS[flags], battery)
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        return _encode_flags(values[:6]), values[6]
 
     def __str__(self) -> str:
         return (f"AtmotubeProStatus(date_time={str(self.date_time)}, "
@@ -117,16 +433,38 @@ class AtmotubeProSPS30(AtmotubeGATTPacket):
     _pack_: bool = True
     _layout_: str = "ms"
     _byte_size_: int = 12
+    # each 3 byte PM field is read as its low 16 bits and signed high byte
+    _record_: type = AtmotubeProSPS30Record
+    _struct_format_: str = "<HbHbHbHb"
+    _field_names_: tuple[str, ...] = ("pm1", "pm2_5", "pm10", "pm4")
 
     def pm_from_bytes(self, byte_array: bytearray) -> float | None:
         res = int.from_bytes(byte_array, byteorder='little', signed=True)
         return res/100.0 if res > 0 else None
 
-    def _process_bytes(self) -> None:
-        self.pm1 = self.pm_from_bytes(self._pm1)
-        self.pm2_5 = self.pm_from_bytes(self._pm2_5)
-        self.pm10 = self.pm_from_bytes(self._pm10)
-        self.pm4 = self.pm_from_bytes(self._pm4)
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        (pm1, pm1_hi, pm2_5, pm2_5_hi,
+         pm10, pm10_hi, pm4, pm4_hi) = cls._struct_.unpack_from(data, offset)
+        pm1 |= pm1_hi << 16
+        pm2_5 |= pm2_5_hi << 16
+        pm10 |= pm10_hi << 16
+        pm4 |= pm4_hi << 16
+        return (pm1/100.0 if pm1 > 0 else None,
+                pm2_5/100.0 if pm2_5 > 0 else None,
+                pm10/100.0 if pm10 > 0 else None,
+                pm4/100.0 if pm4 > 0 else None)
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        # Split each 3 byte PM field into its low 16 bits and high byte
+        fields = []
+        for value in values:
+            pm = _scaled(value, 100)
+            if not -0x800000 <= pm < 0x800000:
+                raise OverflowError(f"{value} does not fit in 3 bytes")
+            fields += (pm & 0xFFFF, pm >> 16)
+        return tuple(fields)
 
     def __str__(self) -> str:
         return (f"AtmotubeProSPS30(date_time={str(self.date_time)}, "
@@ -158,11 +496,24 @@ class AtmotubeProBME280(AtmotubeGATTPacket):
     _pack_: bool = True
     _layout_: str = "ms"
     _byte_size_: int = 8
-
-    def _process_bytes(self) -> None:
-        self.humidity = self._rh if self._rh > 0 else None
-        self.temperature = self._T_dec / 100.0
-        self.pressure = self._P / 100.0 if self._P > 0 else None
+    _record_: type = AtmotubeProBME280Record
+    _struct_format_: str = "<bbih"
+    _field_names_: tuple[str, ...] = ("humidity", "temperature", "pressure")
+    _integer_fields_: tuple[str, ...] = ("humidity",)
+
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        rh, _, P, T_dec = cls._struct_.unpack_from(data, offset)
+        return (rh if rh > 0 else None,
+                T_dec / 100.0,
+                P / 100.0 if P > 0 else None)
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        humidity, temperature, pressure = values
+        # The coarse temperature byte saturates, the reading is T_dec
+        return (humidity or 0, max(-128, min(int(temperature), 127)),
+                _scaled(pressure, 100), round(temperature * 100))
 
     def __str__(self) -> str:
         return (f"AtmotubeProBME280(date_time={str(self.date_time)}, "
@@ -191,9 +542,18 @@ class AtmotubeProSGPC3(AtmotubeGATTPacket):
     _pack_: bool = True
     _layout_: str = "ms"
     _byte_size_: int = 4
+    _record_: type = AtmotubeProSGPC3Record
+    _struct_format_: str = "<h"
+    _field_names_: tuple[str, ...] = ("tvoc",)
 
-    def _process_bytes(self) -> None:
-        self.tvoc = self._tvoc/1000.0 if self._tvoc > 0 else None
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        tvoc, = cls._struct_.unpack_from(data, offset)
+        return (tvoc/1000.0 if tvoc > 0 else None,)
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        return (_scaled(values[0], 1000),)
 
     def __str__(self) -> str:
         return (f"AtmotubeProSGPC3(date_time={str(self.date_time)}, "
@@ -206,39 +566,10 @@ class AtmotubeProSGPC3(AtmotubeGATTPacket):
                     self.tvoc == other.tvoc))
 
 
-class AtmotubeBLEPacket(BigEndianStructure):
+class AtmotubeBLEPacket(_AtmotubePacket, BigEndianStructure):
     """
     Abstract base class for Atmotube data packets.
     """
-    _byte_size_: int = 0  # To be defined in subclasses
-
-    def __new__(cls, data: bytearray, date_time: datetime | None = None):
-        if len(data) != cls._byte_size_:
-            raise InvalidByteData(f"Expected {cls._byte_size_} bytes, "
-                                  f"got {len(data)} bytes")
-        return cls.from_buffer_copy(data)
-
-    def __init__(self, data: bytearray, date_time: datetime | None = None):
-
-        if date_time is None:
-            date_time = datetime.now()
-        self.date_time = date_time
-        self._process_bytes()
-
-    def __repr__(self) -> str:
-        return str(self)
-
-    @abstractmethod
-    def __eq__(self, other: object) -> bool:
-        ...
-
-    @abstractmethod
-    def __str__(self) -> str:
-        ...
-
-    @abstractmethod
-    def _process_bytes(self) -> None:
-        ...
 
 
 class AtmotubeProBLEAdvertising(AtmotubeBLEPacket):
@@ -265,20 +596,34 @@ class AtmotubeProBLEAdvertising(AtmotubeBLEPacket):
     _pack_: bool = True
     _layout_: str = "ms"
     _byte_size_: int = 12
-
-    def _process_bytes(self) -> None:
-        self.tvoc = self._tvoc/1000.0 if self._tvoc > 0 else None
-        self.device_id = self._devid
-        self.humidity = self._rh if self._rh > 0 else None
-        self.temperature = self._T
-        self.pressure = self._P / 100.0 if self._P > 0 else None
-        self.pm_sensor_status = bool(self._pm_sensor)
-        self.error_flag = bool(self._error)
-        self.bonding_flag = bool(self._bonding)
-        self.charging = bool(self._charging)
-        self.charging_timer = bool(self._charging_timer)
-        self.pre_heating = bool(self._pre_heating)
-        self.battery_level = self._battery
+    _record_: type = AtmotubeProBLEAdvertisingRecord
+    _struct_format_: str = ">hhbbiBB"
+    _field_names_: tuple[str, ...] = ("tvoc", "device_id", "humidity",
+                                      "temperature", "pressure",
+                                      "pm_sensor_status", "error_flag",
+                                      "bonding_flag", "charging",
+                                      "charging_timer", "pre_heating",
+                                      "battery_level")
+    _integer_fields_: tuple[str, ...] = ("device_id", "humidity",
+                                         "temperature", "battery_level")
+
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        tvoc, devid, rh, T, P, flags, battery = \
+            cls._struct_.unpack_from(data, offset)
+        return (tvoc/1000.0 if tvoc > 0 else None,
+                devid,
+                rh if rh > 0 else None,
+                T,
+                P / 100.0 if P > 0 else None,
+                *_STATUS_FLAGS[flags],
+                battery)
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        tvoc, devid, rh, T, P = values[:5]
+        return (_scaled(tvoc, 1000), devid, rh or 0, T, _scaled(P, 100),
+                _encode_flags(values[5:11]), values[11])
 
     def __str__(self) -> str:
         return (f"AtmotubeProBLEAdvertising(date_time={str(self.date_time)}, "
@@ -329,12 +674,30 @@ class AtmotubeProBLEScanResponse(AtmotubeBLEPacket):
     _pack_: bool = True
     _layout_: str = "ms"
     _byte_size_: int = 9
-
-    def _process_bytes(self) -> None:
-        self.pm1 = self._pm1 if self._pm1 > 0 else None
-        self.pm2_5 = self._pm2_5 if self._pm2_5 > 0 else None
-        self.pm10 = self._pm10 if self._pm10 > 0 else None
-        self.firmware_version = f"{self._fw_maj}.{self._fw_min}.{self._fw_bld}"
+    _record_: type = AtmotubeProBLEScanResponseRecord
+    _struct_format_: str = ">hhhBBB"
+    _field_names_: tuple[str, ...] = ("pm1", "pm2_5", "pm10",
+                                      "firmware_version")
+    _integer_fields_: tuple[str, ...] = ("pm1", "pm2_5", "pm10")
+
+    @classmethod
+    def _decode_(cls, data: Buffer, offset: int = 0) -> tuple:
+        pm1, pm2_5, pm10, fw_maj, fw_min, fw_bld = \
+            cls._struct_.unpack_from(data, offset)
+        return (pm1 if pm1 > 0 else None,
+                pm2_5 if pm2_5 > 0 else None,
+                pm10 if pm10 > 0 else None,
+                f"{fw_maj}.{fw_min}.{fw_bld}")
+
+    @classmethod
+    def _encode_(cls, values: tuple) -> tuple:
+        pm1, pm2_5, pm10, firmware_version = values
+        parts = str(firmware_version).split(".")
+        if firmware_version is None or len(parts) != 3 or \
+                not all(part.isdigit() for part in parts):
+            raise ValueError(f"firmware_version must be major.minor.build "
+                             f"for {cls.__name__}, got {firmware_version!r}")
+        return (pm1 or 0, pm2_5 or 0, pm10 or 0, *map(int, parts))
 
     def __str__(self) -> str:
         return (f"AtmotubeProBLEScanResponse(date_time={str(self.date_time)}, "
@@ -351,3 +714,12 @@ class AtmotubeProBLEScanResponse(AtmotubeBLEPacket):
                     self.pm2_5 == other.pm2_5,
                     self.pm10 == other.pm10,
                     self.firmware_version == other.firmware_version))
+
+
+# The packet class of each record type, records are stored and converted
+# like the packets they were decoded from
+RECORD_PACKET_CLASSES = {cls._record_: cls
+                         for cls in (AtmotubeProStatus, AtmotubeProSPS30,
+                                     AtmotubeProBME280, AtmotubeProSGPC3,
+                                     AtmotubeProBLEAdvertising,
+                                     AtmotubeProBLEScanResponse)}
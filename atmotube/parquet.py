@@ -0,0 +1,186 @@
+"""
+A storage sink writing Atmotube packets to Apache Parquet, or Arrow IPC,
+files.
+
+This module requires pyarrow, which is an optional dependency of PymoTube
+(``pip install PymoTube[parquet]``).
+"""
+from collections.abc import Callable
+from datetime import datetime
+from os import PathLike
+from pathlib import Path
+
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .packets import (AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3,
+                      AtmotubeProBLEAdvertising,
+                      AtmotubeProBLEScanResponse)
+from .sink import TABLE_NAMES, Sink
+
+
+def _schema(*fields: tuple[str, pa.DataType]) -> pa.Schema:
+    return pa.schema([("date_time", pa.timestamp("ns", tz="UTC")),
+                      ("address", pa.string()),
+                      *fields])
+
+
+_STATUS_FLAGS = [(name, pa.bool_())
+                 for name in ("pm_sensor_status", "error_flag",
+                              "bonding_flag", "charging", "charging_timer",
+                              "pre_heating")]
+
+# The columns of each packet class, in the order of ``_field_names_``. The
+# readings reported as None are nulls.
+SCHEMAS = {
+    AtmotubeProStatus: _schema(*_STATUS_FLAGS,
+                               ("battery_level", pa.uint8())),
+    AtmotubeProSPS30: _schema(("pm1", pa.float64()),
+                              ("pm2_5", pa.float64()),
+                              ("pm10", pa.float64()),
+                              ("pm4", pa.float64())),
+    AtmotubeProBME280: _schema(("humidity", pa.int16()),
+                               ("temperature", pa.float64()),
+                               ("pressure", pa.float64())),
+    AtmotubeProSGPC3: _schema(("tvoc", pa.float64())),
+    AtmotubeProBLEAdvertising: _schema(("tvoc", pa.float64()),
+                                       ("device_id", pa.int16()),
+                                       ("humidity", pa.int16()),
+                                       ("temperature", pa.int16()),
+                                       ("pressure", pa.float64()),
+                                       *_STATUS_FLAGS,
+                                       ("battery_level", pa.uint8())),
+    AtmotubeProBLEScanResponse: _schema(("pm1", pa.int16()),
+                                        ("pm2_5", pa.int16()),
+                                        ("pm10", pa.int16()),
+                                        ("firmware_version", pa.string())),
+}
+
+
+def to_table(packet_cls: type, rows: list[tuple]) -> pa.Table:
+    """
+    Convert rows of a packet class, each the timestamp, address and
+    decoded values, into an Arrow table.
+    """
+    schema = SCHEMAS[packet_cls]
+    columns = zip(*rows) if rows else [()] * len(schema)
+    return pa.Table.from_arrays([pa.array(column, type=field.type)
+                                 for column, field in zip(columns, schema)],
+                                schema=schema)
+
+
+class _File:
+    # An open output file and its writer
+    def __init__(self, path: Path, schema: pa.Schema, format: str,
+                 opened_at: float):
+        self.path = path
+        self.opened_at = opened_at
+        self.sink = pa.OSFile(str(path), "wb")
+        self.parquet = format == "parquet"
+        if self.parquet:
+            self.writer = pq.ParquetWriter(self.sink, schema)
+        else:
+            self.writer = pa.ipc.new_file(self.sink, schema)
+
+    def write(self, table: pa.Table) -> None:
+        # One row group, or record batch, per table
+        if self.parquet:
+            self.writer.write_table(table, row_group_size=len(table))
+        else:
+            self.writer.write_table(table, max_chunksize=len(table))
+
+    def close(self) -> None:
+        self.writer.close()
+        self.sink.close()
+
+
+class ParquetSink(Sink):
+    """
+    Writes packets of every class to Parquet, or Arrow IPC, files, one
+    directory per packet class, with typed columns: the timestamp, in UTC,
+    the address of the device, and the decoded values, with nulls for readings
+    that are None.
+
+    The rows of each packet class are written as a row group once
+    ``row_group_size`` rows have arrived or ``flush_interval`` seconds
+    after the first row, from a background thread, so :meth:`write` never
+    waits on the disk. A new file is started once a file reaches
+    ``max_file_size`` bytes or is ``max_file_age`` seconds old, files are
+    only complete once closed.
+
+    :param directory: The directory to write the files in
+    :type directory: str | PathLike
+    :param row_group_size: The number of rows in each row group
+    :type row_group_size: int
+    :param flush_interval: The longest a row waits to be written, in seconds
+    :type flush_interval: float
+    :param max_file_size: Start a new file after this many bytes
+    :type max_file_size: int | None
+    :param max_file_age: Start a new file after this many seconds
+    :type max_file_age: float | None
+    :param format: ``"parquet"`` or ``"arrow"`` for Arrow IPC files
+    :type format: str
+    :param clock: The clock used for the flush interval and file age, in
+        seconds
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, directory: str | PathLike,
+                 row_group_size: int = 10_000,
+                 flush_interval: float = 60.0,
+                 max_file_size: int | None = 64 * 2**20,
+                 max_file_age: float | None = 3600.0,
+                 format: str = "parquet",
+                 clock: Callable[[], float] = time.monotonic):
+        if format not in ("parquet", "arrow"):
+            raise ValueError(f"Unknown format {format!r}, expected "
+                             f"'parquet' or 'arrow'")
+        super().__init__(row_group_size, flush_interval, clock)
+        self.directory = Path(directory)
+        self.max_file_size = max_file_size
+        self.max_file_age = max_file_age
+        self.format = format
+        self.paths: list[Path] = []
+        self._files: dict[type, _File] = {}
+        self._sequence = 0
+
+    def _open(self, packet_cls: type) -> _File:
+        name = TABLE_NAMES[packet_cls]
+        directory = self.directory / name
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self._sequence += 1
+        path = directory / f"{name}-{stamp}-{self._sequence:04d}" \
+            f".{self.format}"
+        file = self._files[packet_cls] = _File(path, SCHEMAS[packet_cls],
+                                               self.format, self._clock())
+        self.paths.append(path)
+        return file
+
+    def _expired(self, file: _File) -> bool:
+        return ((self.max_file_size is not None
+                 and file.sink.tell() >= self.max_file_size)
+                or (self.max_file_age is not None
+                    and self._clock() - file.opened_at >= self.max_file_age))
+
+    def _write_rows(self, packet_cls: type, rows: list[tuple]) -> None:
+        file = self._files.get(packet_cls) or self._open(packet_cls)
+        file.write(to_table(packet_cls, rows))
+        if self._expired(file):
+            file.close()
+            del self._files[packet_cls]
+
+    def _tick(self) -> None:
+        for packet_cls, file in list(self._files.items()):
+            if self._expired(file):
+                file.close()
+                del self._files[packet_cls]
+
+    def _close(self) -> None:
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
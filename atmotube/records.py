@@ -0,0 +1,107 @@
+from typing import NamedTuple, TypeAlias
+
+from .clock import datetime_from_ns
+
+
+# Lightweight, immutable alternatives to the ctypes packet classes. A record
+# holds only the timestamp and the decoded values, and a NamedTuple has no
+# instance __dict__, which makes it a lot smaller than the equivalent packet.
+# The timestamp is kept as integer nanoseconds since the epoch, date_time is
+# computed from it when it is read.
+
+_DATE_TIME = property(lambda record: datetime_from_ns(record.timestamp_ns),
+                      doc="The timestamp as a naive datetime in local time")
+
+
+class AtmotubeProStatusRecord(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProStatus` packet.
+    """
+    timestamp_ns: int
+    pm_sensor_status: bool
+    error_flag: bool
+    bonding_flag: bool
+    charging: bool
+    charging_timer: bool
+    pre_heating: bool
+    battery_level: int
+
+    date_time = _DATE_TIME
+
+
+class AtmotubeProSPS30Record(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProSPS30` packet.
+    """
+    timestamp_ns: int
+    pm1: float | None
+    pm2_5: float | None
+    pm10: float | None
+    pm4: float | None
+
+    date_time = _DATE_TIME
+
+
+class AtmotubeProBME280Record(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProBME280` packet.
+    """
+    timestamp_ns: int
+    humidity: int | None
+    temperature: float
+    pressure: float | None
+
+    date_time = _DATE_TIME
+
+
+class AtmotubeProSGPC3Record(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProSGPC3` packet.
+    """
+    timestamp_ns: int
+    tvoc: float | None
+
+    date_time = _DATE_TIME
+
+
+class AtmotubeProBLEAdvertisingRecord(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProBLEAdvertising` packet.
+    """
+    timestamp_ns: int
+    tvoc: float | None
+    device_id: int
+    humidity: int | None
+    temperature: int
+    pressure: float | None
+    pm_sensor_status: bool
+    error_flag: bool
+    bonding_flag: bool
+    charging: bool
+    charging_timer: bool
+    pre_heating: bool
+    battery_level: int
+
+    date_time = _DATE_TIME
+
+
+class AtmotubeProBLEScanResponseRecord(NamedTuple):
+    """
+    The decoded values of an :class:`AtmotubeProBLEScanResponse` packet.
+    """
+    timestamp_ns: int
+    pm1: int | None
+    pm2_5: int | None
+    pm10: int | None
+    firmware_version: str
+
+    date_time = _DATE_TIME
+
+
+AtmotubeGATTRecord: TypeAlias = (AtmotubeProStatusRecord
+                                 | AtmotubeProSPS30Record
+                                 | AtmotubeProBME280Record
+                                 | AtmotubeProSGPC3Record)
+
+AtmotubeBLERecord: TypeAlias = (AtmotubeProBLEAdvertisingRecord
+                                | AtmotubeProBLEScanResponseRecord)
@@ -0,0 +1,350 @@
+from bleak import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakCharacteristicNotFoundError
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from heapq import merge
+from typing import NamedTuple, TypeAlias
+
+import asyncio
+import inspect
+
+from .ble import AtmotubeProBLE_CONSTS
+from .capture import CaptureReader
+from .uuids import AtmotubeProService_UUID, DeviceInformation_UUID
+
+# A stream of (timestamp in ns, payload) pairs, in timestamp order
+PayloadStream: TypeAlias = Iterable[tuple[int, bytes]]
+
+
+class FakeCharacteristic(NamedTuple):
+    uuid: str
+
+
+class FakeService(NamedTuple):
+    uuid: str
+    characteristics: list[FakeCharacteristic]
+
+
+class FakeServiceCollection:
+    """
+    Stands in for bleak's ``BleakGATTServiceCollection``, with a single
+    Atmotube PRO service.
+    """
+    def __init__(self, uuids: Iterable[str]):
+        self._service = FakeService(
+            AtmotubeProService_UUID.PRO.lower(),
+            [FakeCharacteristic(str(uuid).lower()) for uuid in uuids])
+
+    def get_service(self, uuid: str) -> FakeService | None:
+        if str(uuid).lower() == self._service.uuid:
+            return self._service
+        return None
+
+    def get_characteristic(self, uuid: str) -> FakeCharacteristic | None:
+        for char in self._service.characteristics:
+            if char.uuid == str(uuid).lower():
+                return char
+        return None
+
+
+class ReplayStats:
+    """
+    Counters for a replay. ``max_lag`` is the furthest, in seconds, that
+    delivery fell behind the replay schedule, which shows whether the
+    consumer keeps up at the chosen speed.
+    """
+    def __init__(self):
+        self.delivered = 0
+        self.max_lag = 0.0
+
+    def __repr__(self) -> str:
+        return (f"ReplayStats(delivered={self.delivered}, "
+                f"max_lag={self.max_lag:.6f}s)")
+
+
+class _Cursor:
+    # The position in a payload stream, kept across subscriptions so that a
+    # stream that is resubscribed carries on where it stopped
+    def __init__(self, stream: Iterable):
+        self._iterator = iter(stream)
+        self._pending: list = []
+        self.started = False
+
+    def __iter__(self) -> "_Cursor":
+        return self
+
+    def __next__(self):
+        self.started = True
+        if self._pending:
+            return self._pending.pop()
+        return next(self._iterator)
+
+    def push_back(self, item) -> None:
+        self._pending.append(item)
+
+
+def _caller(callback: Callable[..., None | Awaitable[None]],
+            tasks: set[asyncio.Task]) -> Callable[..., None]:
+    # Call the callback the way bleak does, an async callback runs as a task
+    # of its own, which isn't waited for
+    if not inspect.iscoroutinefunction(callback):
+        return callback
+
+    def call(*args) -> None:
+        task = asyncio.create_task(callback(*args))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    return call
+
+
+async def _replay(stream: _Cursor, deliver: Callable[[bytes], None],
+                  speed: float | None, start_ns: int | None,
+                  stats: ReplayStats) -> None:
+    # Deliver each payload at its timestamp, relative to start_ns, scaled by
+    # speed. A stream that was replayed before is resumed relative to its
+    # next timestamp instead, as the time it was stopped for isn't part of
+    # the recording. With speed None the payloads are delivered as fast as
+    # possible, yielding to the event loop between payloads so devices
+    # interleave. A payload that is waiting to be delivered when the replay
+    # is cancelled is put back in the stream.
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    if stream.started:
+        start_ns = None
+    for item in stream:
+        timestamp_ns, payload = item
+        if start_ns is None:
+            start_ns = timestamp_ns
+        try:
+            if speed is None:
+                await asyncio.sleep(0)
+            else:
+                due = started + (timestamp_ns - start_ns) / 1e9 / speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    stats.max_lag = max(stats.max_lag, -delay)
+        except asyncio.CancelledError:
+            stream.push_back(item)
+            raise
+        deliver(payload)
+        stats.delivered += 1
+
+
+class FakeBleakClient:
+    """
+    A stand-in for ``BleakClient`` that replays payload streams as GATT
+    notifications, for exercising the notification helpers without an
+    Atmotube or a bluetooth adapter.
+
+    Each characteristic's stream starts replaying when it is subscribed to
+    with :meth:`start_notify`, and carries on from where it stopped when it
+    is subscribed to again, after a reconnect for example. Like bleak, async
+    notification callbacks run as tasks of their own, the next payload is
+    delivered without waiting for them.
+
+    :param address: The address of the simulated device
+    :type address: str
+    :param streams: The payload stream of each characteristic uuid
+    :type streams: Mapping[str, PayloadStream]
+    :param speed: The replay speed relative to real time, or None to replay
+        as fast as possible
+    :type speed: float | None
+    :param start_ns: The timestamp corresponding to the start of the replay,
+        defaults to the first timestamp of each stream
+    :type start_ns: int | None
+    :param firmware_version: The firmware revision read from the device, or
+        None if it has none
+    :type firmware_version: str | None
+    """
+    def __init__(self, address: str, streams: Mapping[str, PayloadStream],
+                 speed: float | None = 1.0, start_ns: int | None = None,
+                 firmware_version: str | None = None):
+        self.address = address
+        self.firmware_version = firmware_version
+        self.services = FakeServiceCollection(streams)
+        self.stats = ReplayStats()
+        self._streams = {str(uuid).lower(): _Cursor(stream)
+                         for uuid, stream in streams.items()}
+        self._speed = speed
+        self._start_ns = start_ns
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._callback_tasks: set[asyncio.Task] = set()
+        self._connected = False
+
+    @classmethod
+    def from_capture(cls, reader: CaptureReader, address: str,
+                     speed: float | None = 1.0) -> "FakeBleakClient":
+        """
+        Create a client replaying the GATT notifications recorded from one
+        device in a capture file.
+        """
+        streams = {}
+        for record in reader:
+            if record.source.kind == "gatt" and \
+                    record.source.address == address:
+                streams.setdefault(record.source.uuid, []).append(
+                    (record.timestamp_ns, record.data))
+        start_ns = min((s[0][0] for s in streams.values()), default=None)
+        return cls(address, streams, speed=speed, start_ns=start_ns)
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def connect(self, **kwargs) -> bool:
+        self._connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        for uuid in list(self._tasks):
+            await self.stop_notify(uuid)
+        self._connected = False
+        return True
+
+    async def read_gatt_char(self, char_specifier: str,
+                             **kwargs) -> bytearray:
+        if str(char_specifier).upper() != \
+                DeviceInformation_UUID.FIRMWARE_REVISION or \
+                self.firmware_version is None:
+            raise BleakCharacteristicNotFoundError(char_specifier)
+        return bytearray(self.firmware_version.encode())
+
+    async def start_notify(self, char_specifier: str,
+                           callback: Callable[[FakeCharacteristic, bytearray],
+                                              None | Awaitable[None]],
+                           **kwargs) -> None:
+        char = self.services.get_characteristic(char_specifier)
+        if char is None:
+            raise BleakCharacteristicNotFoundError(char_specifier)
+
+        call = _caller(callback, self._callback_tasks)
+
+        def deliver(payload: bytes) -> None:
+            call(char, bytearray(payload))
+
+        self._tasks[char.uuid] = asyncio.create_task(
+            _replay(self._streams[char.uuid], deliver, self._speed,
+                    self._start_ns, self.stats))
+
+    async def stop_notify(self, char_specifier: str) -> None:
+        task = self._tasks.pop(str(char_specifier).lower(), None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def wait_replayed(self) -> None:
+        """
+        Wait until every subscribed stream has been replayed, and the async
+        callbacks it called have returned.
+        """
+        await asyncio.gather(*self._tasks.values())
+        await asyncio.gather(*self._callback_tasks)
+
+    async def __aenter__(self) -> "FakeBleakClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.disconnect()
+
+
+def _tag(address: str,
+         stream: PayloadStream) -> Iterable[tuple[int, str, bytes]]:
+    for timestamp_ns, payload in stream:
+        yield timestamp_ns, address, payload
+
+
+class FakeBleakScanner:
+    """
+    A stand-in for ``BleakScanner`` that replays manufacturer data payloads
+    from any number of simulated devices as advertisements, merged into one
+    timeline, to a detection callback such as one from
+    :func:`ble_callback_wrapper`.
+
+    :param detection_callback: Called with each device and advertisement
+    :type detection_callback: Callable[[BLEDevice, AdvertisementData], None]
+    :param devices: The payload stream of each device address
+    :type devices: Mapping[str, PayloadStream]
+    :param speed: The replay speed relative to real time, or None to replay
+        as fast as possible
+    :type speed: float | None
+    """
+    def __init__(self,
+                 detection_callback: Callable[[BLEDevice, AdvertisementData],
+                                              None | Awaitable[None]],
+                 devices: Mapping[str, PayloadStream],
+                 speed: float | None = 1.0):
+        self.stats = ReplayStats()
+        self._callback = detection_callback
+        self._devices = devices
+        self._speed = speed
+        self._task: asyncio.Task | None = None
+        self._callback_tasks: set[asyncio.Task] = set()
+        self._timeline: _Cursor | None = None
+
+    @classmethod
+    def from_capture(cls, detection_callback, reader: CaptureReader,
+                     speed: float | None = 1.0) -> "FakeBleakScanner":
+        """
+        Create a scanner replaying the advertisements recorded in a capture
+        file.
+        """
+        devices = {}
+        for record in reader:
+            if record.source.kind == "ble":
+                devices.setdefault(record.source.address, []).append(
+                    (record.timestamp_ns, record.data))
+        return cls(detection_callback, devices, speed=speed)
+
+    async def start(self) -> None:
+        ble_devices = {address: BLEDevice(address, "ATMOTUBE", None)
+                       for address in self._devices}
+        if self._timeline is None:
+            self._timeline = _Cursor(
+                (timestamp_ns, (address, payload))
+                for timestamp_ns, address, payload in merge(
+                    *[_tag(address, stream)
+                      for address, stream in self._devices.items()],
+                    key=lambda item: item[0]))
+        call = _caller(self._callback, self._callback_tasks)
+
+        def deliver(item: tuple[str, bytes]) -> None:
+            address, payload = item
+            adv = AdvertisementData(
+                local_name="ATMOTUBE",
+                manufacturer_data={
+                    AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID:
+                        bytearray(payload)},
+                service_data={},
+                service_uuids=[],
+                tx_power=None,
+                rssi=-60,
+                platform_data=())
+            call(ble_devices[address], adv)
+
+        self._task = asyncio.create_task(_replay(
+            self._timeline, deliver, self._speed, None, self.stats))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def wait_replayed(self) -> None:
+        """
+        Wait until every advertisement has been replayed, and the async
+        callbacks it called have returned.
+        """
+        if self._task:
+            await self._task
+        await asyncio.gather(*self._callback_tasks)
+
+    async def __aenter__(self) -> "FakeBleakScanner":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
@@ -0,0 +1,423 @@
+from bleak import BleakClient
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from datetime import datetime
+from functools import partial
+from typing import NamedTuple
+
+import asyncio
+import inspect
+import random
+import time
+
+from .discovery import CharacteristicCache, read_firmware_version
+from .gatt import PacketList, get_available_characteristics, gatt_notify
+from .packets import AtmotubeGATTPacket
+
+# A characteristic that hasn't notified for this many expected intervals is
+# treated as stalled
+STALL_INTERVALS = 3
+
+
+class Gap(NamedTuple):
+    """
+    A time range with no data from one characteristic of a device, from the
+    timestamp of the last packet before the link was lost, or stalled, to
+    the first packet after it recovered. ``end`` is None for a gap that is
+    still open, when no data had come back by the time the session stopped.
+    """
+    address: str
+    uuid: str
+    start: datetime
+    end: datetime | None
+
+
+class DeviceStats:
+    """
+    Connection and packet counters for one device in a
+    :class:`GATTSession`. ``connect_time`` is the time, in seconds, the
+    latest connection took to connect, discover and subscribe,
+    ``total_connect_time`` the time taken by all ``connections``, and
+    ``connected_at`` the clock time the current connection was made, or
+    None while disconnected. ``error`` is the exception that stopped the
+    device from connecting, if any.
+    """
+    def __init__(self, address: str, clock: Callable[[], float]):
+        self.address = address
+        self.connect_time: float | None = None
+        self.total_connect_time = 0.0
+        self.connections = 0
+        self.connected_at: float | None = None
+        self.packets = 0
+        self.reconnects = 0
+        self.resubscribes = 0
+        self.error: Exception | None = None
+        self._clock = clock
+        self._uptime = 0.0
+
+    def _connected(self, started: float) -> None:
+        self.connected_at = self._clock()
+        self.connect_time = self.connected_at - started
+        self.total_connect_time += self.connect_time
+        self.connections += 1
+
+    def _disconnected(self) -> None:
+        if self.connected_at is not None:
+            self._uptime += self._clock() - self.connected_at
+            self.connected_at = None
+
+    @property
+    def packet_rate(self) -> float:
+        """
+        The average number of packets per second over the time the device
+        has been connected, leaving out the time it was disconnected.
+        """
+        elapsed = self._uptime
+        if self.connected_at is not None:
+            elapsed += self._clock() - self.connected_at
+        return self.packets / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (f"DeviceStats(address={self.address}, "
+                f"connect_time={self.connect_time}, "
+                f"connections={self.connections}, "
+                f"packets={self.packets}, "
+                f"packet_rate={self.packet_rate:.3f}/s, "
+                f"reconnects={self.reconnects}, "
+                f"resubscribes={self.resubscribes}, "
+                f"error={self.error!r})")
+
+
+class _Channel:
+    # The watchdog and gap state of one characteristic of one device
+    def __init__(self, last_seen: float):
+        self.last_seen = last_seen
+        self.last_time: datetime | None = None
+        self.gap_open = False
+
+
+class GATTSession:
+    """
+    Connects to many Atmotube PRO devices concurrently and subscribes to
+    every supported characteristic on each of them, passing each decoded
+    packet to ``callback`` along with the address of the device it came
+    from.
+
+    At most ``max_concurrent`` devices connect at the same time, since most
+    bluetooth adapters can only handle a few connection attempts at once. A
+    device that fails to connect doesn't stop the others, its exception is
+    kept in :attr:`stats`.
+
+    With ``reconnect=True`` each device is supervised: when its link drops,
+    or every characteristic in ``expected_interval`` has gone without
+    notifying for three of its expected intervals, the device is
+    disconnected and reconnected with jittered exponential backoff, then
+    re-subscribed to the characteristics found when it first connected. A
+    characteristic that stalls on its own is re-subscribed to without
+    touching the others. Devices that fail to connect the first time are
+    retried the same way. The time ranges lost are recorded in :attr:`gaps`
+    once data comes back, the gaps that are still open are in
+    :attr:`open_gaps` and are added to :attr:`gaps`, with no end, when the
+    session stops.
+
+    :param addresses: The addresses of the devices
+    :type addresses: Iterable[str]
+    :param callback: Called with the address and each decoded packet
+    :type callback: Callable[[str, AtmotubeGATTPacket], None]
+    :param max_concurrent: The maximum number of simultaneous connection
+        attempts
+    :type max_concurrent: int
+    :param client_factory: Creates a client for an address, defaults to
+        ``BleakClient``
+    :type client_factory: Callable[[str], BleakClient]
+    :param records: Pass immutable records to the callback instead of packets
+    :type records: bool
+    :param lazy: Decode the packets on first attribute access
+    :type lazy: bool
+    :param tap_factory: Creates a tap for an address, such as
+        :meth:`CaptureWriter.gatt_tap`
+    :type tap_factory: Callable[[str], Callable[[str, bytearray], None]] |
+        None
+    :param reconnect: Supervise the devices and reconnect when they drop
+    :type reconnect: bool
+    :param expected_interval: The expected time, in seconds, between
+        notifications of each characteristic uuid to watch, or one interval
+        for every characteristic
+    :type expected_interval: float | Mapping[str, float] | None
+    :param backoff: The delay, in seconds, before the first reconnection
+        attempt, doubling with each failed attempt
+    :type backoff: float
+    :param max_backoff: The longest delay between reconnection attempts
+    :type max_backoff: float
+    :param characteristic_cache: Subscribe to devices using the
+        characteristics cached from earlier connections, keyed by their
+        firmware revision. The clients of cached devices are created with
+        :meth:`CharacteristicCache.client`, so ``client_factory`` is passed
+        the services to discover as ``services``
+    :type characteristic_cache: CharacteristicCache | None
+    :param clock: The clock used for the stats and watchdog, in seconds
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, addresses: Iterable[str],
+                 callback: Callable[[str, AtmotubeGATTPacket],
+                                    None | Awaitable[None]],
+                 max_concurrent: int = 3,
+                 client_factory: Callable[[str], BleakClient] = BleakClient,
+                 records: bool = False, lazy: bool = False,
+                 tap_factory: Callable[[str], Callable[[str, bytearray],
+                                                       None]] | None = None,
+                 reconnect: bool = False,
+                 expected_interval: float | Mapping[str, float] | None = None,
+                 backoff: float = 1.0, max_backoff: float = 60.0,
+                 characteristic_cache: CharacteristicCache | None = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.addresses = list(addresses)
+        self.clients: dict[str, BleakClient] = {}
+        self.stats = {address: DeviceStats(address, clock)
+                      for address in self.addresses}
+        self.gaps: list[Gap] = []
+        self._callback = callback
+        self._max_concurrent = max_concurrent
+        self._client_factory = client_factory
+        self._records = records
+        self._lazy = lazy
+        self._tap_factory = tap_factory
+        self._reconnect = reconnect
+        self._expected_interval = expected_interval
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._characteristic_cache = characteristic_cache
+        self._clock = clock
+        self._packet_lists: dict[str, PacketList] = {}
+        self._taps: dict[str, Callable[[str, bytearray], None] | None] = {}
+        self._channels: dict[tuple[str, str], _Channel] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def _device_callback(self, address: str, uuid: str) -> Callable:
+        # Tag packets with the address of the device, count them and keep
+        # track of gaps, keeping the callback sync or async so gatt_notify
+        # handles it the same way
+        stats = self.stats[address]
+        channel = self._channels[address, uuid]
+        callback = self._callback
+
+        def seen(packet: AtmotubeGATTPacket) -> None:
+            stats.packets += 1
+            channel.last_seen = self._clock()
+            if channel.gap_open:
+                channel.gap_open = False
+                self.gaps.append(Gap(address, uuid, channel.last_time,
+                                     packet.date_time))
+            channel.last_time = packet.date_time
+
+        if inspect.iscoroutinefunction(callback):
+            async def device_callback(packet: AtmotubeGATTPacket) -> None:
+                seen(packet)
+                await callback(address, packet)
+        else:
+            def device_callback(packet: AtmotubeGATTPacket) -> None:
+                seen(packet)
+                callback(address, packet)
+        return device_callback
+
+    async def _notify(self, address: str, client: BleakClient,
+                      tap: Callable[[str, bytearray], None] | None,
+                      packet_list: PacketList) -> None:
+        now = self._clock()
+        for uuid, _ in packet_list:
+            channel = self._channels.setdefault((address, uuid),
+                                                _Channel(now))
+            channel.last_seen = now
+        await asyncio.gather(*[
+            gatt_notify(client, uuid, packet_cls,
+                        self._device_callback(address, uuid),
+                        records=self._records, lazy=self._lazy, tap=tap)
+            for uuid, packet_cls in packet_list])
+
+    async def _subscribe(self, address: str, client: BleakClient) -> None:
+        # Discover the characteristics the first time the device connects,
+        # or take them from the characteristic cache, and reuse them when it
+        # reconnects
+        tap = self._tap_factory(address) if self._tap_factory else None
+        self._taps[address] = tap
+        subscribe = partial(self._notify, address, client, tap)
+        if self._characteristic_cache is not None:
+            firmware_version = await read_firmware_version(client)
+            self._packet_lists[address] = \
+                await self._characteristic_cache.subscribe(client, subscribe,
+                                                           firmware_version)
+            return
+        packet_list = self._packet_lists.get(address)
+        if packet_list is None:
+            packet_list = get_available_characteristics(client)
+            self._packet_lists[address] = packet_list
+        await subscribe(packet_list)
+
+    def _new_client(self, address: str) -> BleakClient:
+        if self._characteristic_cache is not None:
+            return self._characteristic_cache.client(address,
+                                                     self._client_factory)
+        return self._client_factory(address)
+
+    async def _connect(self, address: str,
+                       semaphore: asyncio.Semaphore) -> bool:
+        stats = self.stats[address]
+        async with semaphore:
+            started = self._clock()
+            try:
+                client = self.clients.get(address) or \
+                    self._new_client(address)
+                await client.connect()
+            except Exception as e:
+                stats.error = e
+                return False
+            try:
+                await self._subscribe(address, client)
+            except Exception as e:
+                stats.error = e
+                await asyncio.gather(client.disconnect(),
+                                     return_exceptions=True)
+                return False
+            self.clients[address] = client
+            stats.error = None
+            stats._connected(started)
+            return True
+
+    def _intervals(self, address: str) -> dict[str, float]:
+        expected = self._expected_interval
+        if expected is None:
+            return {}
+        uuids = [uuid for uuid, _ in self._packet_lists.get(address, [])]
+        if isinstance(expected, Mapping):
+            expected = {str(uuid).upper(): interval
+                        for uuid, interval in expected.items()}
+            return {uuid: expected[uuid] for uuid in uuids
+                    if uuid in expected}
+        return {uuid: expected for uuid in uuids}
+
+    def _open_gaps(self, address: str,
+                   uuids: Iterable[str] | None = None) -> None:
+        for (device, uuid), channel in self._channels.items():
+            if device == address and channel.last_time is not None and \
+                    (uuids is None or uuid in uuids):
+                channel.gap_open = True
+
+    async def _resubscribe(self, address: str, uuids: list[str]) -> None:
+        # Restart the notifications of stalled characteristics, leaving the
+        # others subscribed
+        client = self.clients[address]
+        packet_classes = dict(self._packet_lists[address])
+        await asyncio.gather(*[client.stop_notify(uuid) for uuid in uuids],
+                             return_exceptions=True)
+        await self._notify(address, client, self._taps.get(address),
+                           [(uuid, packet_classes[uuid]) for uuid in uuids])
+        self.stats[address].resubscribes += 1
+
+    async def _watch(self, address: str) -> None:
+        # Return when the link drops or every watched characteristic has
+        # stalled, re-subscribing to characteristics that stall on their own
+        client = self.clients[address]
+        intervals = self._intervals(address)
+        period = min(intervals.values(), default=1.0) / 2
+        while True:
+            await asyncio.sleep(period)
+            if not client.is_connected:
+                return
+            now = self._clock()
+            stalled = [uuid for uuid, interval in intervals.items()
+                       if now - self._channels[address, uuid].last_seen >
+                       STALL_INTERVALS * interval]
+            if not stalled:
+                continue
+            if len(stalled) == len(intervals):
+                return
+            self._open_gaps(address, stalled)
+            try:
+                await self._resubscribe(address, stalled)
+            except Exception:
+                return
+
+    async def _supervise(self, address: str, semaphore: asyncio.Semaphore,
+                         first_attempt: asyncio.Future) -> None:
+        failures = 0
+        while True:
+            connected = await self._connect(address, semaphore)
+            if not first_attempt.done():
+                first_attempt.set_result(connected)
+            if connected:
+                failures = 0
+                await self._watch(address)
+                self.stats[address]._disconnected()
+                self.stats[address].reconnects += 1
+                self._open_gaps(address)
+                await asyncio.gather(self.clients[address].disconnect(),
+                                     return_exceptions=True)
+            else:
+                failures += 1
+            # full jitter, a random delay up to the exponential backoff
+            delay = min(self._max_backoff,
+                        self._backoff * 2 ** max(failures - 1, 0))
+            await asyncio.sleep(random.uniform(0, delay))
+
+    async def start(self) -> None:
+        """
+        Connect to and subscribe to every device, returning once every
+        device has either connected or failed to.
+        """
+        semaphore = asyncio.Semaphore(self._max_concurrent)
+        if not self._reconnect:
+            await asyncio.gather(*[self._connect(address, semaphore)
+                                   for address in self.addresses])
+            return
+        loop = asyncio.get_running_loop()
+        first_attempts = [loop.create_future() for _ in self.addresses]
+        self._tasks = [asyncio.create_task(
+                           self._supervise(address, semaphore, first))
+                       for address, first in zip(self.addresses,
+                                                 first_attempts)]
+        await asyncio.gather(*first_attempts)
+
+    async def stop(self) -> None:
+        """
+        Stop supervising and disconnect from every device, adding the gaps
+        that are still open to :attr:`gaps`.
+        """
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.gaps.extend(self.open_gaps)
+        for channel in self._channels.values():
+            channel.gap_open = False
+        clients, self.clients = self.clients, {}
+        for address in clients:
+            self.stats[address]._disconnected()
+        await asyncio.gather(*[client.disconnect()
+                               for client in clients.values()],
+                             return_exceptions=True)
+
+    @property
+    def open_gaps(self) -> list[Gap]:
+        """
+        The gaps that data hasn't come back from yet, with no end.
+        """
+        return [Gap(address, uuid, channel.last_time, None)
+                for (address, uuid), channel in self._channels.items()
+                if channel.gap_open]
+
+    @property
+    def connected(self) -> list[str]:
+        """
+        The addresses of the devices that are currently connected.
+        """
+        return [address for address in self.addresses
+                if address in self.clients
+                and self.clients[address].is_connected]
+
+    async def __aenter__(self) -> "GATTSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
@@ -0,0 +1,224 @@
+from collections.abc import Awaitable, Callable, Iterator
+from itertools import count as counter
+from math import sqrt
+from typing import Any
+
+import random
+
+from .gatt import ATMOTUBE_PRO_PACKETS
+from .packets import (AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3,
+                      AtmotubeProBLEAdvertising,
+                      AtmotubeProBLEScanResponse)
+from .replay import FakeBleakClient, FakeBleakScanner, PayloadStream
+
+
+class VirtualAtmotube:
+    """
+    A simulated Atmotube PRO whose readings drift randomly around a baseline,
+    for generating realistic payloads at any rate.
+
+    Each reading is a mean-reverting random walk that advances with the
+    timestamps asked for, so payloads for the same device stay consistent
+    across characteristics. The walk is seeded from ``seed``, or from the
+    address, so a device produces the same payloads every time.
+
+    :param address: The address of the simulated device
+    :type address: str
+    :param seed: The seed of the random walk, defaults to the address
+    :type seed: int | float | str | bytes | None
+    """
+    firmware_version: str = "116.5.30"
+
+    # (baseline range, relative volatility per sqrt(second)), readings revert
+    # to their baseline on a time scale of about 10 minutes
+    _readings_: dict[str, tuple[tuple[float, float], float]] = {
+        'pm2_5': ((2.0, 35.0), 0.02),
+        'tvoc': ((0.05, 0.8), 0.02),
+        'temperature': ((18.0, 27.0), 0.002),
+        'humidity': ((25.0, 65.0), 0.005),
+        'pressure': ((980.0, 1035.0), 0.0002),
+    }
+    _reversion_: float = 1 / 600
+
+    def __init__(self, address: str,
+                 seed: int | float | str | bytes | None = None):
+        self.address = address
+        self._rng = random.Random(address if seed is None else seed)
+        self.device_id = self._rng.randrange(1, 0x8000)
+        self._baseline = {name: self._rng.uniform(*span)
+                          for name, (span, _) in self._readings_.items()}
+        self._state = dict(self._baseline)
+        self._battery = self._rng.uniform(40.0, 100.0)
+        self._time_ns: int | None = None
+
+    def advance(self, timestamp_ns: int) -> None:
+        """
+        Advance the readings to ``timestamp_ns``, earlier timestamps leave
+        the readings unchanged.
+        """
+        if self._time_ns is None:
+            self._time_ns = timestamp_ns
+        dt = (timestamp_ns - self._time_ns) / 1e9
+        if dt <= 0:
+            return
+        self._time_ns = timestamp_ns
+        for name, (_, volatility) in self._readings_.items():
+            baseline = self._baseline[name]
+            value = self._state[name]
+            value += (baseline - value) * min(self._reversion_ * dt, 1.0)
+            value += baseline * volatility * sqrt(dt) * self._rng.gauss()
+            self._state[name] = max(value, 0.0)
+        self._battery = max(self._battery - dt / 360, 0.0)
+
+    def values(self, packet_cls: type) -> dict[str, Any]:
+        """
+        The current readings, as keyword arguments for
+        ``packet_cls.encode``.
+        """
+        state = self._state
+        pm2_5 = round(state['pm2_5'], 2)
+        temperature = round(state['temperature'], 2)
+        flags = {'pm_sensor_status': True, 'error_flag': False,
+                 'bonding_flag': False, 'charging': False,
+                 'charging_timer': False, 'pre_heating': False,
+                 'battery_level': round(self._battery)}
+        if packet_cls is AtmotubeProStatus:
+            return flags
+        if packet_cls is AtmotubeProSPS30:
+            return {'pm1': round(pm2_5 * 0.7, 2), 'pm2_5': pm2_5,
+                    'pm10': round(pm2_5 * 1.3, 2),
+                    'pm4': round(pm2_5 * 1.1, 2)}
+        if packet_cls is AtmotubeProBME280:
+            return {'humidity': round(state['humidity']),
+                    'temperature': temperature,
+                    'pressure': round(state['pressure'], 2)}
+        if packet_cls is AtmotubeProSGPC3:
+            return {'tvoc': round(state['tvoc'], 3)}
+        if packet_cls is AtmotubeProBLEAdvertising:
+            return {'tvoc': round(state['tvoc'], 3),
+                    'device_id': self.device_id,
+                    'humidity': round(state['humidity']),
+                    'temperature': round(temperature),
+                    'pressure': round(state['pressure'], 2),
+                    **flags}
+        if packet_cls is AtmotubeProBLEScanResponse:
+            return {'pm1': round(pm2_5 * 0.7), 'pm2_5': round(pm2_5),
+                    'pm10': round(pm2_5 * 1.3),
+                    'firmware_version': self.firmware_version}
+        raise TypeError(f"Cannot simulate {packet_cls.__name__} packets")
+
+    def payload(self, packet_cls: type, timestamp_ns: int) -> bytes:
+        """
+        The raw payload of a ``packet_cls`` packet at ``timestamp_ns``.
+        """
+        self.advance(timestamp_ns)
+        return packet_cls.encode(**self.values(packet_cls))
+
+    def stream(self, packet_cls: type | tuple[type, ...], rate: float = 1.0,
+               count: int | None = None,
+               start_ns: int = 0) -> PayloadStream:
+        """
+        Generate a stream of ``(timestamp_ns, payload)`` pairs at ``rate``
+        payloads per second, starting at a random phase within the first
+        period. Given several packet classes, the stream cycles through them,
+        like the advertising and scan response packets of a device.
+
+        :param packet_cls: The packet class, or classes, to generate
+        :type packet_cls: type | tuple[type, ...]
+        :param rate: Payloads per second
+        :type rate: float
+        :param count: The number of payloads, defaults to an endless stream
+        :type count: int | None
+        :param start_ns: The timestamp the stream starts from
+        :type start_ns: int
+        :return: A generator of ``(timestamp_ns, payload)`` pairs
+        :rtype: Iterator[tuple[int, bytes]]
+        """
+        classes = packet_cls if isinstance(packet_cls, tuple) \
+            else (packet_cls,)
+        period = 1e9 / rate
+        start_ns += round(self._rng.uniform(0, period))
+        return self._stream(classes, period, count, start_ns)
+
+    def _stream(self, classes: tuple[type, ...], period: float,
+                count: int | None,
+                start_ns: int) -> Iterator[tuple[int, bytes]]:
+        indices = counter() if count is None else range(count)
+        for i in indices:
+            timestamp_ns = start_ns + round(i * period)
+            yield timestamp_ns, self.payload(classes[i % len(classes)],
+                                             timestamp_ns)
+
+
+def virtual_fleet(n_devices: int,
+                  seed: int | str = 0) -> list[VirtualAtmotube]:
+    """
+    Create ``n_devices`` simulated Atmotubes with distinct addresses. The
+    same seed always gives the same fleet.
+    """
+    addresses = (":".join(f"{byte:02X}" for byte in
+                          (0xAA, 0xBB, *i.to_bytes(4, 'big')))
+                 for i in range(n_devices))
+    return [VirtualAtmotube(address, seed=f"{seed}/{address}")
+            for address in addresses]
+
+
+def fake_clients(devices: list[VirtualAtmotube], rate: float = 1.0,
+                 count: int | None = None,
+                 speed: float | None = 1.0) -> list[FakeBleakClient]:
+    """
+    Create a :class:`FakeBleakClient` for each simulated device, notifying
+    every Atmotube PRO characteristic at ``rate`` payloads per second.
+
+    :param devices: The simulated devices
+    :type devices: list[VirtualAtmotube]
+    :param rate: Payloads per second per characteristic
+    :type rate: float
+    :param count: The number of payloads per characteristic, defaults to
+        endless streams
+    :type count: int | None
+    :param speed: The replay speed, see :class:`FakeBleakClient`
+    :type speed: float | None
+    :return: A fake client per device
+    :rtype: list[FakeBleakClient]
+    """
+    return [FakeBleakClient(device.address,
+                            {uuid: device.stream(packet_cls, rate, count)
+                             for uuid, packet_cls
+                             in ATMOTUBE_PRO_PACKETS.items()},
+                            speed=speed, start_ns=0)
+            for device in devices]
+
+
+def fake_scanner(detection_callback: Callable[..., None | Awaitable[None]],
+                 devices: list[VirtualAtmotube], rate: float = 1.0,
+                 count: int | None = None,
+                 speed: float | None = 1.0) -> FakeBleakScanner:
+    """
+    Create a :class:`FakeBleakScanner` replaying alternating advertising and
+    scan response packets from every simulated device at ``rate``
+    advertisements per second per device.
+
+    :param detection_callback: Called with each device and advertisement
+    :type detection_callback: Callable[[BLEDevice, AdvertisementData], None]
+    :param devices: The simulated devices
+    :type devices: list[VirtualAtmotube]
+    :param rate: Advertisements per second per device
+    :type rate: float
+    :param count: The number of advertisements per device, defaults to
+        endless streams
+    :type count: int | None
+    :param speed: The replay speed, see :class:`FakeBleakScanner`
+    :type speed: float | None
+    :return: A fake scanner
+    :rtype: FakeBleakScanner
+    """
+    packets = (AtmotubeProBLEAdvertising, AtmotubeProBLEScanResponse)
+    return FakeBleakScanner(detection_callback,
+                            {device.address: device.stream(packets, rate,
+                                                           count)
+                             for device in devices},
+                            speed=speed)
@@ -0,0 +1,242 @@
+from bleak import BLEDevice
+from collections.abc import Callable, Iterable
+from functools import partial
+from typing import Any
+
+import queue
+import threading
+import time
+
+from .packets import (RECORD_PACKET_CLASSES,
+                      AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3,
+                      AtmotubeProBLEAdvertising,
+                      AtmotubeProBLEScanResponse)
+
+# The name of the table, or directory, each packet class is stored in
+TABLE_NAMES = {AtmotubeProStatus: "status",
+               AtmotubeProSPS30: "sps30",
+               AtmotubeProBME280: "bme280",
+               AtmotubeProSGPC3: "sgpc3",
+               AtmotubeProBLEAdvertising: "advertising",
+               AtmotubeProBLEScanResponse: "scan_response"}
+
+# Queued to stop the writer thread
+_CLOSE = object()
+
+
+class SinkStats:
+    """
+    Counters for a :class:`Sink`: the rows and row groups written, and the
+    rows lost to write errors, ``error`` is the last of those errors.
+    """
+    def __init__(self):
+        self.rows = 0
+        self.row_groups = 0
+        self.dropped = 0
+        self.error: Exception | None = None
+
+    def __repr__(self) -> str:
+        return (f"SinkStats(rows={self.rows}, "
+                f"row_groups={self.row_groups}, "
+                f"dropped={self.dropped}, error={self.error!r})")
+
+
+class Sink:
+    """
+    Base class for storage sinks. A sink buffers the rows of each packet
+    class separately and hands them to a background thread to write as one
+    row group, once ``row_group_size`` rows have arrived or
+    ``flush_interval`` seconds after the first row of the group, so writing
+    a packet never waits on storage.
+
+    Each row is the timestamp, in nanoseconds since the epoch, the address
+    of the device and the decoded values of a packet or record. Subclasses
+    implement :meth:`_write_rows`, and optionally :meth:`_tick` and
+    :meth:`_close`, which are all called from the writer thread.
+
+    :param row_group_size: The number of rows in each row group
+    :type row_group_size: int
+    :param flush_interval: The longest a row waits to be written, in seconds
+    :type flush_interval: float
+    :param clock: The clock used for the flush interval, in seconds
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, row_group_size: int = 10_000,
+                 flush_interval: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be at least 1")
+        if flush_interval <= 0:
+            raise ValueError("flush_interval must be positive")
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+        self.stats = SinkStats()
+        self._clock = clock
+        self._rows: dict[type, list[tuple]] = {}
+        self._started: dict[type, float] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def write(self, packet: Any, address: str | None = None) -> None:
+        """
+        Add a packet, or record, to the sink. Can be used as a notification
+        callback.
+
+        :param packet: A packet or record of any Atmotube packet class
+        :param address: The address of the device the packet came from
+        :type address: str | None
+        """
+        if isinstance(packet, tuple):
+            packet_cls = RECORD_PACKET_CLASSES[type(packet)]
+            row = (packet[0], address, *packet[1:])
+        else:
+            packet_cls = type(packet)
+            row = (packet.timestamp_ns, address, *packet._values_)
+        self._add(packet_cls, row)
+
+    def write_many(self, packets: Iterable[Any],
+                   address: str | None = None) -> None:
+        """
+        Add a batch of packets, or records, to the sink, such as the batches
+        delivered with a ``max_batch``.
+        """
+        for packet in packets:
+            self.write(packet, address)
+
+    def gatt_callback(self, address: str | None = None
+                      ) -> Callable[[Any], None]:
+        """
+        A callback for :func:`gatt_notify` or
+        :func:`start_gatt_notifications` that writes each packet with the
+        address of the device.
+        """
+        return partial(self.write, address=address)
+
+    def ble_callback(self, device: BLEDevice | None, packet: Any) -> None:
+        """
+        A callback for :func:`ble_callback_wrapper` that writes each packet
+        with the address of the device, skipping advertisements that aren't
+        from an Atmotube.
+        """
+        if packet is not None:
+            self.write(packet, device.address)
+
+    def _add(self, packet_cls: type, row: tuple) -> None:
+        if self._closed:
+            raise ValueError("The sink is closed")
+        if self._thread is None:
+            self._start()
+        with self._lock:
+            rows = self._rows.get(packet_cls)
+            if rows is None:
+                rows = self._rows[packet_cls] = []
+                self._started[packet_cls] = self._clock()
+            rows.append(row)
+            if len(rows) < self.row_group_size:
+                return
+            del self._rows[packet_cls]
+        self._queue.put((packet_cls, rows))
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run,
+                                        name=type(self).__name__,
+                                        daemon=True)
+        self._thread.start()
+
+    def _take(self, expired_only: bool) -> list[tuple[type, list[tuple]]]:
+        # Take the buffered rows, or only those waiting longer than the
+        # flush interval
+        now = self._clock()
+        with self._lock:
+            taken = [(packet_cls, rows)
+                     for packet_cls, rows in self._rows.items()
+                     if not expired_only or now - self._started[packet_cls]
+                     >= self.flush_interval]
+            for packet_cls, _ in taken:
+                del self._rows[packet_cls]
+        return taken
+
+    def flush(self) -> None:
+        """
+        Hand every buffered row to the writer thread now, without waiting
+        for them to be written.
+        """
+        for item in self._take(expired_only=False):
+            self._queue.put(item)
+
+    def _run(self) -> None:
+        poll = min(self.flush_interval, 1.0)
+        while True:
+            try:
+                item = self._queue.get(timeout=poll)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                break
+            if item is not None:
+                self._write(*item)
+            for packet_cls, rows in self._take(expired_only=True):
+                self._write(packet_cls, rows)
+            self._guard(self._tick)
+        for packet_cls, rows in self._take(expired_only=False):
+            self._write(packet_cls, rows)
+        self._guard(self._close)
+
+    def _guard(self, method: Callable[[], None]) -> None:
+        # Keep the writer thread running when a subclass hook fails
+        try:
+            method()
+        except Exception as e:
+            self.stats.error = e
+
+    def _write(self, packet_cls: type, rows: list[tuple]) -> None:
+        try:
+            self._write_rows(packet_cls, rows)
+        except Exception as e:
+            self.stats.dropped += len(rows)
+            self.stats.error = e
+        else:
+            self.stats.rows += len(rows)
+            self.stats.row_groups += 1
+
+    def _write_rows(self, packet_cls: type, rows: list[tuple]) -> None:
+        """
+        Write one row group of a packet class, each row is the timestamp,
+        address and the values of ``packet_cls._field_names_``.
+        """
+        raise NotImplementedError
+
+    def _tick(self) -> None:
+        """
+        Called regularly from the writer thread, such as to roll files.
+        """
+
+    def _close(self) -> None:
+        """
+        Called from the writer thread after the last rows are written.
+        """
+
+    def close(self) -> None:
+        """
+        Write every buffered row and close the sink, waiting for the writer
+        thread to finish. From async code, run it in a thread with
+        ``await asyncio.to_thread(sink.close)``.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            self._start()
+        self._queue.put(_CLOSE)
+        self._thread.join()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,145 @@
+from collections.abc import Callable, Iterator
+from contextlib import closing
+from datetime import datetime
+from os import PathLike
+from types import NoneType
+from typing import get_args, get_type_hints
+
+import sqlite3
+import time
+
+from .clock import ns_from_datetime
+from .sink import TABLE_NAMES, Sink
+
+_SQL_TYPES = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT"}
+
+
+def _value_types(packet_cls: type) -> list[type]:
+    # The python type of each of the packet's values, without the None
+    hints = get_type_hints(packet_cls._record_)
+    return [next(arg for arg in get_args(hints[name]) or (hints[name],)
+                 if arg is not NoneType)
+            for name in packet_cls._field_names_]
+
+
+def _create_table(packet_cls: type) -> list[str]:
+    table = TABLE_NAMES[packet_cls]
+    columns = ", ".join(f"{name} {_SQL_TYPES[value_type]}"
+                        for name, value_type in zip(packet_cls._field_names_,
+                                                    _value_types(packet_cls)))
+    return [f"CREATE TABLE IF NOT EXISTS {table} "
+            f"(device TEXT, timestamp INTEGER NOT NULL, {columns})",
+            f"CREATE INDEX IF NOT EXISTS {table}_device_timestamp "
+            f"ON {table} (device, timestamp)"]
+
+
+def _insert(packet_cls: type) -> str:
+    placeholders = ", ".join("?" * (len(packet_cls._field_names_) + 2))
+    return f"INSERT INTO {TABLE_NAMES[packet_cls]} VALUES ({placeholders})"
+
+
+def query(path: str | PathLike, packet_cls: type, device: str | None,
+          start: datetime | None = None,
+          end: datetime | None = None) -> Iterator[tuple]:
+    """
+    Read the records of one device and packet class in a time range from a
+    database written by :class:`SQLiteSink`, in time order. The rows are
+    read from the ``(device, timestamp)`` index as the iterator advances,
+    so the table is never loaded into memory.
+
+    :param path: The database file
+    :type path: str | PathLike
+    :param packet_cls: The packet class to read
+    :type packet_cls: type
+    :param device: The address of the device, or None for packets written
+        without an address
+    :type device: str | None
+    :param start: The start of the range, inclusive, defaults to the first
+        record
+    :type start: datetime | None
+    :param end: The end of the range, exclusive, defaults to the last record
+    :type end: datetime | None
+    :return: An iterator of records
+    :rtype: Iterator[NamedTuple]
+    """
+    columns = ", ".join(packet_cls._field_names_)
+    bools = [i for i, value_type in enumerate(_value_types(packet_cls))
+             if value_type is bool]
+    sql = (f"SELECT timestamp, {columns} FROM {TABLE_NAMES[packet_cls]} "
+           f"WHERE device IS ? AND timestamp >= ? AND timestamp < ? "
+           f"ORDER BY timestamp")
+    limits = (ns_from_datetime(start) // 1000 if start is not None
+              else -2**63,
+              ns_from_datetime(end) // 1000 if end is not None
+              else 2**63 - 1)
+    with closing(sqlite3.connect(path)) as connection:
+        for timestamp, *values in connection.execute(sql, (device, *limits)):
+            for i in bools:
+                if values[i] is not None:
+                    values[i] = bool(values[i])
+            yield packet_cls._record_(timestamp * 1000, *values)
+
+
+class SQLiteSink(Sink):
+    """
+    Writes packets of every class to a SQLite database, one table per packet
+    class, with a ``device`` and ``timestamp`` column, in microseconds since
+    the epoch, followed by the decoded values, and an index on
+    ``(device, timestamp)``.
+
+    The rows of each packet class are inserted in one transaction with
+    ``executemany`` once ``row_group_size`` rows have arrived or
+    ``flush_interval`` seconds after the first row, from a background
+    thread, so :meth:`write` never waits on the disk. The database is put
+    in WAL mode, so it can be queried while it is being written.
+
+    :param path: The database file
+    :type path: str | PathLike
+    :param row_group_size: The number of rows inserted in each transaction
+    :type row_group_size: int
+    :param flush_interval: The longest a row waits to be written, in seconds
+    :type flush_interval: float
+    :param clock: The clock used for the flush interval, in seconds
+    :type clock: Callable[[], float]
+    """
+    def __init__(self, path: str | PathLike, row_group_size: int = 1000,
+                 flush_interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(row_group_size, flush_interval, clock)
+        self.path = path
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                for packet_cls in TABLE_NAMES:
+                    for statement in _create_table(packet_cls):
+                        connection.execute(statement)
+        self._inserts = {packet_cls: _insert(packet_cls)
+                         for packet_cls in TABLE_NAMES}
+        # sqlite connections belong to the thread that opened them, this
+        # one is opened by the writer thread
+        self._connection: sqlite3.Connection | None = None
+
+    def _write_rows(self, packet_cls: type, rows: list[tuple]) -> None:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            # durable across application crashes, and much faster, in WAL
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executemany(
+                self._inserts[packet_cls],
+                [(address, timestamp_ns // 1000, *values)
+                 for timestamp_ns, address, *values in rows])
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def query(self, packet_cls: type, device: str | None,
+              start: datetime | None = None,
+              end: datetime | None = None) -> Iterator[tuple]:
+        """
+        Read the records of one device and packet class in a time range,
+        see :func:`query`. Only rows that have been written are returned.
+        """
+        return query(self.path, packet_cls, device, start, end)
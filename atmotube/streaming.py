@@ -0,0 +1,303 @@
+from bleak import BleakClient, BleakScanner, BLEDevice
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Hashable
+from enum import StrEnum
+from functools import partial
+from typing import Any
+
+import asyncio
+
+from .ble import ble_callback_wrapper
+from .gatt import (ATMOTUBE_PRO_PACKETS,
+                   PacketList,
+                   gatt_notify,
+                   stop_gatt_notifications)
+from .packets import AtmotubeBLEPacket, AtmotubeGATTPacket
+
+
+class OverflowPolicy(StrEnum):
+    """
+    What a :class:`PacketBuffer` does with a new packet when it is full.
+
+    ``BLOCK`` waits for the consumer to make room, ``DROP_OLDEST`` drops
+    the oldest packet in the buffer and ``DROP_NEWEST`` the new packet.
+    ``COALESCE`` keeps only the latest packet from each characteristic, a
+    new packet replaces the one waiting from the same characteristic, and
+    the oldest packet is dropped when the buffer is full.
+    """
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE = "coalesce"
+
+
+class StreamStats:
+    """
+    Counters for a :class:`PacketBuffer`: the packets received from the
+    callbacks, delivered to the consumer, and dropped or replaced by the
+    overflow policy.
+    """
+    def __init__(self):
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def __repr__(self) -> str:
+        return (f"StreamStats(received={self.received}, "
+                f"delivered={self.delivered}, dropped={self.dropped})")
+
+
+class PacketBuffer:
+    """
+    A bounded buffer between notification callbacks and an ``async for``
+    loop, which applies an :class:`OverflowPolicy` when the consumer falls
+    behind.
+
+    Packets are added with :meth:`put_nowait`, or awaited with :meth:`put`
+    for the ``BLOCK`` policy, along with a key identifying where they came
+    from, which is used to coalesce packets. Iterating over the buffer
+    yields packets until it is closed and empty.
+
+    With the ``BLOCK`` policy the slot freed by the consumer is handed to
+    the longest waiting :meth:`put`, so packets are delivered in the order
+    they were put. At most ``max_waiting`` puts wait at a time, as every
+    notification is a task of its own, the packets of any more are dropped.
+
+    :param maxsize: The maximum number of packets waiting in the buffer
+    :type maxsize: int
+    :param policy: What to do with new packets when the buffer is full
+    :type policy: OverflowPolicy
+    :param stats: Counters to update, defaults to new counters
+    :type stats: StreamStats | None
+    :param max_waiting: The maximum number of puts waiting for room with
+        the ``BLOCK`` policy, defaults to ``maxsize``
+    :type max_waiting: int | None
+    """
+    def __init__(self, maxsize: int = 256,
+                 policy: OverflowPolicy = OverflowPolicy.BLOCK,
+                 stats: StreamStats | None = None,
+                 max_waiting: int | None = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if max_waiting is not None and max_waiting < 0:
+            raise ValueError("max_waiting must not be negative")
+        self.maxsize = maxsize
+        self.max_waiting = maxsize if max_waiting is None else max_waiting
+        self.policy = OverflowPolicy(policy)
+        self.stats = stats if stats is not None else StreamStats()
+        # COALESCE keeps one packet per key, in the order the keys arrived
+        self._items: deque[Any] | dict[Hashable, Any] = \
+            {} if self.policy is OverflowPolicy.COALESCE else deque()
+        self._getter: asyncio.Future | None = None
+        # The puts waiting for room, with their packets
+        self._putters: deque[tuple[asyncio.Future, Any]] = deque()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    def put_nowait(self, key: Hashable, packet: Any) -> None:
+        """
+        Add a packet to the buffer, applying the overflow policy if it is
+        full. With the ``BLOCK`` policy a full buffer raises
+        ``asyncio.QueueFull``. Packets put once the buffer is closed are
+        dropped.
+        """
+        self.stats.received += 1
+        if self._closed:
+            self.stats.dropped += 1
+            return
+        items = self._items
+        if self.policy is OverflowPolicy.COALESCE:
+            if key in items:
+                self.stats.dropped += 1
+            elif len(items) >= self.maxsize:
+                del items[next(iter(items))]
+                self.stats.dropped += 1
+            items[key] = packet
+        elif len(items) < self.maxsize:
+            items.append(packet)
+        elif self.policy is OverflowPolicy.DROP_OLDEST:
+            items.popleft()
+            items.append(packet)
+            self.stats.dropped += 1
+        elif self.policy is OverflowPolicy.DROP_NEWEST:
+            self.stats.dropped += 1
+            return
+        else:
+            self.stats.received -= 1
+            raise asyncio.QueueFull
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+
+    async def put(self, key: Hashable, packet: Any) -> None:
+        """
+        Add a packet to the buffer, waiting for room first with the
+        ``BLOCK`` policy. The packet is dropped if ``max_waiting`` puts are
+        already waiting.
+        """
+        if (self.policy is not OverflowPolicy.BLOCK or self._closed
+                or not (self.full() or self._putters)):
+            self.put_nowait(key, packet)
+            return
+        self.stats.received += 1
+        if len(self._putters) >= self.max_waiting:
+            self.stats.dropped += 1
+            return
+        putter = asyncio.get_running_loop().create_future()
+        entry = (putter, packet)
+        self._putters.append(entry)
+        try:
+            await putter
+        except asyncio.CancelledError:
+            # Unless the packet was already handed to the buffer
+            if entry in self._putters:
+                self._putters.remove(entry)
+                self.stats.received -= 1
+            raise
+
+    async def get(self) -> Any:
+        """
+        Remove and return the oldest packet, waiting for one if the buffer is
+        empty. Raises ``StopAsyncIteration`` once the buffer is closed and
+        empty.
+        """
+        while not self._items:
+            if self._closed:
+                raise StopAsyncIteration
+            self._getter = asyncio.get_running_loop().create_future()
+            await self._getter
+        if isinstance(self._items, dict):
+            packet = self._items.pop(next(iter(self._items)))
+        else:
+            packet = self._items.popleft()
+        self.stats.delivered += 1
+        if self._putters:
+            # Hand the slot to the longest waiting put
+            putter, waiting = self._putters.popleft()
+            self._items.append(waiting)
+            putter.set_result(None)
+        return packet
+
+    def close(self) -> None:
+        """
+        Stop accepting packets, the packets already in the buffer can still
+        be read. The packets put from now on, and those of the puts waiting
+        for room, are counted as dropped.
+        """
+        self._closed = True
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+        while self._putters:
+            putter, _ = self._putters.popleft()
+            putter.set_result(None)
+            self.stats.dropped += 1
+
+    def __aiter__(self) -> "PacketBuffer":
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.get()
+
+
+async def stream(client: BleakClient,
+                 packet_list: PacketList = list(ATMOTUBE_PRO_PACKETS.items()),
+                 maxsize: int = 256,
+                 policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 stats: StreamStats | None = None,
+                 **kwargs) -> AsyncIterator[AtmotubeGATTPacket]:
+    """
+    Subscribe to GATT notifications and iterate over the packets with
+    ``async for``, through a bounded buffer. The notifications are stopped
+    when the loop ends, the packets that arrive after that, such as the last
+    batch with ``max_batch``, are counted as dropped.
+
+    By default the oldest packets are dropped when the buffer is full. With
+    the ``BLOCK`` policy the notification callbacks wait for room in the
+    buffer instead, bleak runs every async callback as a task of its own,
+    so up to ``maxsize`` more packets wait, in order, and any more are
+    dropped.
+
+    :param client: The BleakClient instance of the connected Atmotube device
+    :type client: BleakClient
+    :param packet_list: The list of UUIDs and packet classes to notify
+    :type packet_list: PacketList
+    :param maxsize: The maximum number of packets waiting in the buffer
+    :type maxsize: int
+    :param policy: What to do with new packets when the buffer is full
+    :type policy: OverflowPolicy
+    :param stats: Counters to update with the received, delivered and
+        dropped packets
+    :type stats: StreamStats | None
+    :param kwargs: Passed on to :func:`gatt_notify`, such as ``records``
+    :return: An async iterator of packets
+    :rtype: AsyncIterator[AtmotubeGATTPacket]
+    """
+    buffer = PacketBuffer(maxsize, policy, stats)
+    put = buffer.put if buffer.policy is OverflowPolicy.BLOCK \
+        else buffer.put_nowait
+    await asyncio.gather(*[gatt_notify(client, uuid, packet_cls,
+                                       partial(put, uuid), **kwargs)
+                           for uuid, packet_cls in packet_list])
+    try:
+        async for packet in buffer:
+            yield packet
+    finally:
+        buffer.close()
+        await asyncio.gather(stop_gatt_notifications(client, packet_list),
+                             return_exceptions=True)
+
+
+async def ble_stream(scanner_factory: Callable[..., BleakScanner]
+                     = BleakScanner,
+                     maxsize: int = 256,
+                     policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                     stats: StreamStats | None = None,
+                     **kwargs
+                     ) -> AsyncIterator[tuple[BLEDevice, AtmotubeBLEPacket]]:
+    """
+    Scan for Atmotube advertisements and iterate over ``(device, packet)``
+    pairs with ``async for``, through a bounded buffer. Advertisements
+    that aren't from an Atmotube are skipped. The scanner is stopped when
+    the loop ends. ``COALESCE`` keeps the latest advertising and scan
+    response packet of each device.
+
+    :param scanner_factory: Creates a scanner from a detection callback,
+        defaults to ``BleakScanner``
+    :type scanner_factory: Callable[..., BleakScanner]
+    :param maxsize: The maximum number of packets waiting in the buffer
+    :type maxsize: int
+    :param policy: What to do with new packets when the buffer is full
+    :type policy: OverflowPolicy
+    :param stats: Counters to update with the received, delivered and
+        dropped packets
+    :type stats: StreamStats | None
+    :param kwargs: Passed on to :func:`ble_callback_wrapper`, such as
+        ``addresses``
+    :return: An async iterator of devices and packets
+    :rtype: AsyncIterator[tuple[BLEDevice, AtmotubeBLEPacket]]
+    """
+    buffer = PacketBuffer(maxsize, policy, stats)
+    if buffer.policy is OverflowPolicy.BLOCK:
+        async def callback(device: BLEDevice,
+                           packet: AtmotubeBLEPacket) -> None:
+            await buffer.put((device.address, type(packet)),
+                             (device, packet))
+    else:
+        def callback(device: BLEDevice, packet: AtmotubeBLEPacket) -> None:
+            buffer.put_nowait((device.address, type(packet)),
+                              (device, packet))
+    kwargs.setdefault("drop_none", True)
+    detection_callback = ble_callback_wrapper(callback, **kwargs)
+    scanner = scanner_factory(detection_callback)
+    await scanner.start()
+    try:
+        async for item in buffer:
+            yield item
+    finally:
+        buffer.close()
+        await scanner.stop()
+        await detection_callback.flush()
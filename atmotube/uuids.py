@@ -16,6 +16,11 @@ class AtmotubeProGATT_UUID(StrEnum):
     SPS30 = "DB450005-8E9A-4818-ADD7-6ED94A328AB4"
 
 
+class DeviceInformation_UUID(StrEnum):
+    """UUIDs for the device information characteristics."""
+    FIRMWARE_REVISION = "00002A26-0000-1000-8000-00805F9B34FB"
+
+
 class AtmotubeProUART_UUID(StrEnum):
     """UUIDs for AtmoTube Pro UART characteristics."""
     TX = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
@@ -0,0 +1,66 @@
+# Decoding realistic payload streams with and without a DecodeCache. The
+# streams come from simulated devices sampled once a second, and the cache
+# starts empty for every pass over a stream, so the hit rates are those of
+# the stream itself
+#
+# Run with: python benchmarks/bench_cache.py
+from common import DATE_TIME, EXAMPLE_PACKETS, print_results, time_per_call
+from atmotube import DecodeCache, VirtualAtmotube
+
+N_PAYLOADS = 2000
+
+
+def stream(packet_cls: type) -> list[bytes]:
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    return [payload for _, payload in device.stream(packet_cls,
+                                                    count=N_PAYLOADS)]
+
+
+def decode_all(packet_cls: type, payloads: list[bytes]) -> None:
+    for payload in payloads:
+        packet_cls(payload, date_time=DATE_TIME)
+
+
+def decode_cached(packet_cls: type, payloads: list[bytes]) -> DecodeCache:
+    cache = DecodeCache(maxsize=256)
+    for payload in payloads:
+        cache.packet(packet_cls, payload, date_time=DATE_TIME)
+    return cache
+
+
+def record_all(packet_cls: type, payloads: list[bytes]) -> None:
+    for payload in payloads:
+        packet_cls.record(payload, date_time=DATE_TIME)
+
+
+def record_cached(packet_cls: type, payloads: list[bytes]) -> DecodeCache:
+    cache = DecodeCache(maxsize=256)
+    for payload in payloads:
+        cache.record(packet_cls, payload, date_time=DATE_TIME)
+    return cache
+
+
+def hit_rates() -> dict[str, float]:
+    return {packet_cls.__name__: decode_cached(packet_cls,
+                                               stream(packet_cls)).hit_rate
+            for packet_cls, _ in EXAMPLE_PACKETS}
+
+
+def run() -> dict[str, float]:
+    results = {}
+    for packet_cls, _ in EXAMPLE_PACKETS:
+        name = packet_cls.__name__
+        payloads = stream(packet_cls)
+        for label, func in [("packet", decode_all),
+                            ("packet cached", decode_cached),
+                            ("record", record_all),
+                            ("record cached", record_cached)]:
+            results[f"{name} {label}"] = time_per_call(
+                lambda: func(packet_cls, payloads), repeat=5) / N_PAYLOADS
+    return results
+
+
+if __name__ == "__main__":
+    print_results("Cache hit rate", {name: rate * 100 for name, rate
+                                     in hit_rates().items()}, unit="%")
+    print_results(f"Decoding {N_PAYLOADS} simulated payloads", run())
@@ -0,0 +1,80 @@
+# Overhead of get_ble_packet dispatch and of the callback wrappers built by
+# gatt_notify and ble_callback_wrapper
+#
+# Run with: python benchmarks/bench_callbacks.py
+from bleak import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from common import EXAMPLE_PACKETS, print_results, time_per_call
+from atmotube import ble_callback_wrapper, get_ble_packet, gatt_notify
+from atmotube.ble import AtmotubeProBLE_CONSTS
+
+import asyncio
+import time
+
+N_CALLS = 20_000
+
+
+class RecordingClient:
+    # Just enough of a BleakClient to capture the notification callback
+    def start_notify(self, uuid, callback):
+        self.callback = callback
+
+
+def noop(*args) -> None:
+    pass
+
+
+async def async_noop(*args) -> None:
+    pass
+
+
+def time_async(func, *args) -> float:
+    # Time an async callback, awaited N_CALLS times inside one event loop
+    async def loop() -> float:
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter_ns()
+            for _ in range(N_CALLS):
+                await func(*args)
+            best = min(best, time.perf_counter_ns() - start)
+        return best / N_CALLS
+    return asyncio.run(loop())
+
+
+def advertisement(data: bytes) -> AdvertisementData:
+    return AdvertisementData(
+        local_name="ATMOTUBE",
+        manufacturer_data={AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID: data},
+        service_data={}, service_uuids=[], tx_power=None, rssi=-60,
+        platform_data=())
+
+
+def run() -> dict[str, float]:
+    results = {}
+    for packet_cls, data in EXAMPLE_PACKETS[:4]:
+        name = packet_cls.__name__
+        client = RecordingClient()
+        gatt_notify(client, "uuid", packet_cls, noop)
+        results[f"gatt_notify sync {name}"] = time_per_call(
+            lambda: client.callback(None, data))
+        gatt_notify(client, "uuid", packet_cls, async_noop)
+        results[f"gatt_notify async {name}"] = time_async(client.callback,
+                                                          None, data)
+
+    device = BLEDevice("AA:BB:CC:DD:EE:FF", "ATMOTUBE", None)
+    sync_wrapper = ble_callback_wrapper(noop)
+    async_wrapper = ble_callback_wrapper(async_noop)
+    for packet_cls, data in EXAMPLE_PACKETS[4:] + [(None, b'\x00\x01')]:
+        name = packet_cls.__name__ if packet_cls else "unknown"
+        adv = advertisement(data)
+        results[f"get_ble_packet {name}"] = time_per_call(
+            lambda: get_ble_packet(data))
+        results[f"ble_callback_wrapper sync {name}"] = time_per_call(
+            lambda: sync_wrapper(device, adv))
+        results[f"ble_callback_wrapper async {name}"] = time_async(
+            async_wrapper, device, adv)
+    return results
+
+
+if __name__ == "__main__":
+    print_results("Callback overhead", run())
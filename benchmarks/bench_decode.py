@@ -0,0 +1,41 @@
+# Per-packet decode latency of the packet classes
+#
+# Run with: python benchmarks/bench_decode.py
+from common import (DATE_TIME, EXAMPLE_PACKETS, TIMESTAMP_NS, print_results,
+                    time_per_call)
+
+
+def ctypes_fields(packet) -> list:
+    # Reads every raw field through its ctypes descriptor, the way packets
+    # were decoded before the precompiled struct decoders
+    return [int.from_bytes(value, byteorder='little', signed=True)
+            if hasattr(value, '_length_') else value
+            for value in (getattr(packet, name)
+                          for name, *_ in packet._fields_)]
+
+
+def run() -> dict[str, float]:
+    results = {}
+    for packet_cls, data in EXAMPLE_PACKETS:
+        name = packet_cls.__name__
+        packet = packet_cls(data, date_time=DATE_TIME)
+        results[f"{name} construct"] = time_per_call(
+            lambda: packet_cls(data, date_time=DATE_TIME))
+        results[f"{name} construct timestamp_ns"] = time_per_call(
+            lambda: packet_cls(data, timestamp_ns=TIMESTAMP_NS))
+        results[f"{name} construct now"] = time_per_call(
+            lambda: packet_cls(data))
+        results[f"{name} construct lazy"] = time_per_call(
+            lambda: packet_cls(data, date_time=DATE_TIME, lazy=True))
+        results[f"{name} ctypes fields"] = time_per_call(
+            lambda: ctypes_fields(packet))
+        results[f"{name} struct decode"] = time_per_call(
+            lambda: packet_cls._decode_(data))
+        other = packet_cls(data, date_time=DATE_TIME)
+        results[f"{name} __str__"] = time_per_call(lambda: str(packet))
+        results[f"{name} __eq__"] = time_per_call(lambda: packet == other)
+    return results
+
+
+if __name__ == "__main__":
+    print_results("Packet decoding", run())
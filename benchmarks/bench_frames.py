@@ -0,0 +1,55 @@
+# Building a pandas DataFrame from a day of packets: attribute by attribute
+# from every packet, the naive way, against to_frame, which decodes the
+# packets' bytes in bulk. Also from records and from already decoded
+# columns
+#
+# Run with: python benchmarks/bench_frames.py
+from common import print_results
+from atmotube import AtmotubeProSPS30, VirtualAtmotube
+
+import time
+
+N_PACKETS = 86_400
+REPEAT = 3
+
+
+def best_time(func, *args) -> float:
+    # The best time per packet, in ns
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter_ns()
+        func(*args)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / N_PACKETS
+
+
+def naive_frame(packets: list):
+    import pandas as pd
+    return pd.DataFrame([{'date_time': packet.date_time,
+                          **{name: getattr(packet, name)
+                             for name in packet._field_names_}}
+                         for packet in packets]).set_index('date_time')
+
+
+def run() -> dict[str, float]:
+    try:
+        from atmotube.frames import to_frame
+    except ImportError:
+        return {}
+    stream = list(VirtualAtmotube("AA:BB:CC:DD:EE:FF").stream(
+        AtmotubeProSPS30, count=N_PACKETS))
+    packets = [AtmotubeProSPS30(payload, timestamp_ns=timestamp)
+               for timestamp, payload in stream]
+    records = [AtmotubeProSPS30.record(payload, timestamp_ns=timestamp)
+               for timestamp, payload in stream]
+    columns = AtmotubeProSPS30.decode_many(
+        b''.join(payload for _, payload in stream),
+        [timestamp for timestamp, _ in stream])
+    return {"naive DataFrame from packets": best_time(naive_frame, packets),
+            "to_frame from packets": best_time(to_frame, packets),
+            "to_frame from records": best_time(to_frame, records),
+            "to_frame from columns": best_time(to_frame, columns)}
+
+
+if __name__ == "__main__":
+    print_results(f"DataFrame of {N_PACKETS} SPS30 packets", run())
@@ -0,0 +1,79 @@
+# Cost of joining the GATT characteristics of many devices into readings:
+# the time to store each packet, with and without emitting a reading for
+# it, and the time per device of a tick. The packets are records from a
+# fleet of simulated devices, interleaved the way a busy hub receives them
+#
+# Run with: python benchmarks/bench_join.py
+from common import print_results
+from atmotube import ReadingJoiner, virtual_fleet
+from atmotube.gatt import ATMOTUBE_PRO_PACKETS
+
+import time
+
+N_DEVICES = 500
+N_PACKETS = 20  # per device and characteristic
+REPEAT = 5
+
+
+def packets() -> list[tuple]:
+    # (record, address) pairs, in timestamp order across the fleet
+    stream = [(timestamp_ns, packet_cls.record(payload,
+                                               timestamp_ns=timestamp_ns),
+               device.address)
+              for device in virtual_fleet(N_DEVICES)
+              for packet_cls in ATMOTUBE_PRO_PACKETS.values()
+              for timestamp_ns, payload in device.stream(packet_cls,
+                                                         count=N_PACKETS)]
+    stream.sort(key=lambda item: item[0])
+    return [(record, address) for _, record, address in stream]
+
+
+def time_updates(joiner: ReadingJoiner, stream: list[tuple]) -> float:
+    # The best time per packet, in ns
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter_ns()
+        for record, address in stream:
+            joiner._store(record, address)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(stream)
+
+
+def time_emit(stream: list[tuple]) -> float:
+    best = float('inf')
+    for _ in range(REPEAT):
+        update = ReadingJoiner(lambda reading: None).update
+        start = time.perf_counter_ns()
+        for record, address in stream:
+            update(record, address)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(stream)
+
+
+def time_tick(joiner: ReadingJoiner) -> float:
+    # The best time per device of a tick, in ns
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter_ns()
+        joiner.tick()
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(joiner)
+
+
+def run() -> dict[str, float]:
+    stream = packets()
+    last = stream[-1][0].timestamp_ns
+    joiner = ReadingJoiner(lambda reading: None, interval=1.0, max_age=None,
+                           clock_ns=lambda: last)
+    return {"store": time_updates(joiner, stream),
+            "store and emit": time_emit(stream),
+            "tick, per device": time_tick(joiner)}
+
+
+if __name__ == "__main__":
+    results = run()
+    print_results(f"Joining {N_DEVICES} devices", results)
+    print_results("Sustained rate", {name: 1e9 / value
+                                     for name, value in results.items()
+                                     if name.startswith("store")},
+                  unit="packets/s")
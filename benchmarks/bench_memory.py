@@ -0,0 +1,34 @@
+# Memory retained per decoded packet, measured with tracemalloc
+#
+# Run with: python benchmarks/bench_memory.py
+from common import EXAMPLE_PACKETS, print_results
+
+import tracemalloc
+
+N_PACKETS = 10_000
+
+
+def retained_bytes(factory) -> float:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        retained = [factory() for _ in range(N_PACKETS)]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del retained
+    return (after - before) / N_PACKETS
+
+
+def run() -> dict[str, float]:
+    results = {}
+    for packet_cls, data in EXAMPLE_PACKETS:
+        name = packet_cls.__name__
+        results[f"{name} packet"] = retained_bytes(lambda: packet_cls(data))
+        results[f"{name} record"] = retained_bytes(
+            lambda: packet_cls.record(data))
+    return results
+
+
+if __name__ == "__main__":
+    print_results("Memory per retained packet", run(), unit="bytes")
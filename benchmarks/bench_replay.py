@@ -0,0 +1,69 @@
+# Throughput of the GATT and BLE notification pipelines, replaying synthetic
+# payloads from many simulated devices as fast as possible
+#
+# Run with: python benchmarks/bench_replay.py
+from common import EXAMPLE_PACKETS, print_results
+from atmotube import (FakeBleakClient,
+                      FakeBleakScanner,
+                      ble_callback_wrapper,
+                      get_available_characteristics,
+                      start_gatt_notifications)
+from atmotube.gatt import ATMOTUBE_PRO_PACKETS
+
+import asyncio
+import time
+
+N_DEVICES = 20
+N_PAYLOADS = 500
+
+
+def gatt_streams() -> dict:
+    payloads = {packet_cls: data for packet_cls, data in EXAMPLE_PACKETS}
+    return {uuid: [(i * 10**9, payloads[packet_cls])
+                   for i in range(N_PAYLOADS)]
+            for uuid, packet_cls in ATMOTUBE_PRO_PACKETS.items()}
+
+
+def ble_devices() -> dict:
+    payloads = [data for _, data in EXAMPLE_PACKETS[4:]]
+    return {f"AA:BB:CC:DD:EE:{i:02X}": [(j * 10**9, payloads[j % 2])
+                                        for j in range(N_PAYLOADS)]
+            for i in range(N_DEVICES)}
+
+
+async def replay_gatt() -> int:
+    received = []
+    clients = [FakeBleakClient(f"AA:BB:CC:DD:EE:{i:02X}", gatt_streams(),
+                               speed=None)
+               for i in range(N_DEVICES)]
+    for client in clients:
+        await start_gatt_notifications(
+            client, received.append,
+            packet_list=get_available_characteristics(client))
+    await asyncio.gather(*[client.wait_replayed() for client in clients])
+    return len(received)
+
+
+async def replay_ble() -> int:
+    received = []
+    callback = ble_callback_wrapper(
+        lambda device, packet: received.append(packet))
+    async with FakeBleakScanner(callback, ble_devices(),
+                                speed=None) as scanner:
+        await scanner.wait_replayed()
+    return len(received)
+
+
+def per_packet(replay) -> float:
+    start = time.perf_counter_ns()
+    n_packets = asyncio.run(replay())
+    return (time.perf_counter_ns() - start) / n_packets
+
+
+def run() -> dict[str, float]:
+    return {"GATT pipeline": per_packet(replay_gatt),
+            "BLE pipeline": per_packet(replay_ble)}
+
+
+if __name__ == "__main__":
+    print_results(f"Replaying {N_DEVICES} devices at maximum speed", run())
@@ -0,0 +1,78 @@
+# Sustained write rates of the storage sinks: the time a notification
+# callback spends handing a record to a sink, and the time to get every
+# record onto disk, from the first write until the sink is closed. The
+# records come from simulated devices, and every pass writes to a new file
+#
+# Run with: python benchmarks/bench_sink.py
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import time
+
+from common import print_results
+from atmotube import (AtmotubeProSPS30, AtmotubeProBLEAdvertising,
+                      SQLiteSink, VirtualAtmotube, get_ble_packet)
+
+N_ROWS = 20_000
+REPEAT = 3
+
+
+def records() -> list[tuple]:
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    gatt = [AtmotubeProSPS30.record(payload)
+            for _, payload in device.stream(AtmotubeProSPS30,
+                                            count=N_ROWS // 2)]
+    ble = [get_ble_packet(payload, records=True)
+           for _, payload in device.stream(AtmotubeProBLEAdvertising,
+                                           count=N_ROWS // 2)]
+    return [row for pair in zip(gatt, ble) for row in pair]
+
+
+def sinks(directory: Path) -> dict:
+    factories = {
+        "sqlite": lambda n: SQLiteSink(directory / f"{n}.db"),
+        "sqlite row_group_size=10000": lambda n: SQLiteSink(
+            directory / f"{n}-large.db", row_group_size=10_000),
+    }
+    try:
+        from atmotube.parquet import ParquetSink
+    except ImportError:
+        pass
+    else:
+        factories["parquet"] = lambda n: ParquetSink(directory / f"{n}")
+    return factories
+
+
+def time_sink(factory, rows: list[tuple]) -> tuple[float, float]:
+    # The best write and end to end times, in ns/row
+    write_times, total_times = [], []
+    for n in range(REPEAT):
+        sink = factory(n)
+        start = time.perf_counter_ns()
+        for row in rows:
+            sink.write(row, "AA:BB:CC:DD:EE:FF")
+        written = time.perf_counter_ns()
+        sink.close()
+        done = time.perf_counter_ns()
+        write_times.append((written - start) / len(rows))
+        total_times.append((done - start) / len(rows))
+    return min(write_times), min(total_times)
+
+
+def run() -> dict[str, float]:
+    rows = records()
+    results = {}
+    with TemporaryDirectory() as directory:
+        for name, factory in sinks(Path(directory)).items():
+            write, total = time_sink(factory, rows)
+            results[f"{name} write"] = write
+            results[f"{name} write and flush"] = total
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    print_results(f"Writing {N_ROWS} records", results, unit="ns/row")
+    print_results("Sustained insert rate",
+                  {name: 1e9 / value for name, value in results.items()
+                   if name.endswith("flush")}, unit="rows/s")
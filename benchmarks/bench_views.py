@@ -0,0 +1,50 @@
+# Decoding packets out of a large capture buffer, copying each payload out of
+# the buffer versus decoding it in place
+#
+# Run with: python benchmarks/bench_views.py
+from common import DATE_TIME, EXAMPLE_PACKETS, print_results
+
+import time
+
+N_PACKETS = 10_000
+
+
+def per_packet(func, buffer, size) -> float:
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        func(buffer, size)
+        best = min(best, time.perf_counter_ns() - start)
+    return best / N_PACKETS
+
+
+def run() -> dict[str, float]:
+    results = {}
+    for packet_cls, data in EXAMPLE_PACKETS:
+        name = packet_cls.__name__
+        size = len(data)
+        buffer = bytearray(data * N_PACKETS)
+        view = memoryview(buffer)
+
+        def copy(buffer, size):
+            return [packet_cls(buffer[i:i + size], date_time=DATE_TIME)
+                    for i in range(0, len(buffer), size)]
+
+        def shared(buffer, size):
+            return [packet_cls.from_view(view, i, date_time=DATE_TIME)
+                    for i in range(0, len(buffer), size)]
+
+        def records(buffer, size):
+            return [packet_cls.record_from_view(view, i, date_time=DATE_TIME)
+                    for i in range(0, len(buffer), size)]
+
+        results[f"{name} copy"] = per_packet(copy, buffer, size)
+        results[f"{name} from_view"] = per_packet(shared, buffer, size)
+        results[f"{name} record_from_view"] = per_packet(records, buffer,
+                                                         size)
+        view.release()
+    return results
+
+
+if __name__ == "__main__":
+    print_results("Decoding from a capture buffer", run())
@@ -0,0 +1,45 @@
+# Shared helpers for the benchmark scripts
+from collections.abc import Callable
+from datetime import datetime
+
+import timeit
+
+from atmotube import (AtmotubeProStatus,
+                      AtmotubeProSPS30,
+                      AtmotubeProBME280,
+                      AtmotubeProSGPC3,
+                      AtmotubeProBLEAdvertising,
+                      AtmotubeProBLEScanResponse)
+
+DATE_TIME = datetime(2024, 1, 1, 12, 0, 0)
+TIMESTAMP_NS = 1_704_110_400_000_000_000
+
+EXAMPLE_PACKETS = [
+    (AtmotubeProStatus, bytearray(b'Ad')),
+    (AtmotubeProSPS30, bytearray(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00')),
+    (AtmotubeProBME280, bytearray(b'\x0e\x17\x8ao\x01\x00\x1a\t')),
+    (AtmotubeProSGPC3, bytearray(b'\x02\x00\x00\x00')),
+    (AtmotubeProBLEAdvertising, bytearray(b'\x0052?\x16\x15\x00\x01i\x92Ac')),
+    (AtmotubeProBLEScanResponse,
+     bytearray(b'\x00\x02\x00\x03\x00\x04t\x05\x1e')),
+]
+
+
+def time_per_call(func: Callable[[], object], repeat: int = 50) -> float:
+    """
+    Time a function call, returning the best of ``repeat`` short runs in
+    nanoseconds per call. Many short runs give much more stable minimums
+    than a few long ones on a busy machine.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, number // 10)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def print_results(title: str, results: dict[str, float],
+                  unit: str = "ns/packet") -> None:
+    print(title)
+    width = max(map(len, results))
+    for name, value in results.items():
+        print(f"  {name:<{width}}  {value:12.1f} {unit}")
@@ -0,0 +1,107 @@
+# Run every benchmark, save the results as JSON and compare them against a
+# baseline, exiting with status 1 if anything got slower or bigger
+#
+# Run with: python benchmarks/run.py [--baseline benchmarks/baseline.json]
+# Save a new baseline with: python benchmarks/run.py --save-baseline
+from pathlib import Path
+
+import argparse
+import importlib
+import json
+import platform
+import sys
+
+BENCHMARKS = {
+    "decode": ("bench_decode", "ns/packet"),
+    "views": ("bench_views", "ns/packet"),
+    "callbacks": ("bench_callbacks", "ns/packet"),
+    "cache": ("bench_cache", "ns/packet"),
+    "replay": ("bench_replay", "ns/packet"),
+    "sink": ("bench_sink", "ns/row"),
+    "join": ("bench_join", "ns/packet"),
+    "frames": ("bench_frames", "ns/packet"),
+    "memory": ("bench_memory", "bytes"),
+}
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def run_all(selected: list[str]) -> dict:
+    results = {}
+    for name in selected:
+        module, unit = BENCHMARKS[name]
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = {"unit": unit,
+                         "results": importlib.import_module(module).run()}
+    return {"python": platform.python_version(),
+            "machine": platform.machine(),
+            "benchmarks": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    # Every benchmark is lower-is-better, so anything more than threshold
+    # above the baseline is a regression
+    regressions = []
+    for name, bench in current["benchmarks"].items():
+        old = baseline["benchmarks"].get(name, {}).get("results", {})
+        for case, value in bench["results"].items():
+            if case not in old or old[case] <= 0:
+                continue
+            change = value / old[case] - 1
+            flag = "REGRESSION" if change > threshold else ""
+            print(f"  {name}: {case:<55} {old[case]:10.1f} -> "
+                  f"{value:10.1f} {bench['unit']:<9} {change:+7.1%} {flag}")
+            if change > threshold:
+                regressions.append(f"{name}: {case}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run the PymoTube benchmarks and compare them against a "
+                    "baseline")
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"benchmarks to run, any of "
+                             f"{', '.join(BENCHMARKS)}, defaults to all")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE,
+                        help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before failing, as a "
+                             "fraction (default 0.2)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file "
+                             "instead of comparing")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    current = run_all(args.benchmarks or list(BENCHMARKS))
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(json.dumps(current, indent=2))
+        print(f"No baseline at {args.baseline}, run with --save-baseline "
+              f"to create one", file=sys.stderr)
+        return 0
+
+    regressions = compare(current, json.loads(args.baseline.read_text()),
+                          args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over "
+              f"{args.threshold:.0%}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,28 +9,22 @@ from bleak import BleakClient, BleakScanner
 from atmotube import (
     AtmotubeGATTPacket,
     AtmotubeProSPS30, AtmotubeProStatus, AtmotubeProBME280, AtmotubeProSGPC3,
-    start_gatt_notifications, get_available_characteristics
+    OverflowPolicy, StreamStats, stream, get_available_characteristics
     )
 
 import asyncio
 import logging
 
 
-async def collect_data(mac: str, queue: asyncio.Queue,
-                       collection_time: int) -> None:
+async def collect_data(mac: str, collection_time: int) -> None:
     """
-    Connects to the Atmotube device and collects data for a specified time.
+    Connects to the Atmotube device and logs data for a specified time.
 
     :param mac: The MAC address of the Atmotube device
     :type mac: str
-    :param queue: An asyncio Queue to put the received packets into
-    :type queue: asyncio.Queue
     :param collection_time: The duration in seconds to collect data
     :type collection_time: int
     """
-    async def callback_queue(packet: AtmotubeGATTPacket) -> None:
-        await queue.put(packet)
-
     device = await BleakScanner.find_device_by_address(mac)
     if not device:
         raise Exception("Device not found")
@@ -39,10 +33,20 @@ async def collect_data(mac: str, queue: asyncio.Queue,
         if not client.is_connected:
             raise Exception("Failed to connect to device")
         packet_list = get_available_characteristics(client)
-        await start_gatt_notifications(client, callback_queue,
-                                       packet_list=packet_list)
-        await asyncio.sleep(collection_time)
-        await queue.put(None)
+        stats = StreamStats()
+        # keep at most 100 packets waiting, dropping the oldest if logging
+        # can't keep up
+        packets = stream(client, packet_list, maxsize=100,
+                         policy=OverflowPolicy.DROP_OLDEST, stats=stats)
+        try:
+            async with asyncio.timeout(collection_time):
+                async for packet in packets:
+                    log_packet(packet)
+        except TimeoutError:
+            pass
+        await packets.aclose()
+        logging.info(f"{stats.delivered} packets logged, "
+                     f"{stats.dropped} dropped")
 
 
 def log_packet(packet: AtmotubeGATTPacket) -> None:
@@ -80,23 +84,7 @@ def log_packet(packet: AtmotubeGATTPacket) -> None:
 def main() -> None:
     mac = "C2:2B:42:15:30:89"  # the mac address of my Atmotube
     collection_time = 60  # seconds
-    queue = asyncio.Queue()
-
-    async def runner() -> None:
-        """
-        Main runner function to collect and log data.
-        """
-        collector = asyncio.create_task(
-            collect_data(mac, queue, collection_time)
-            )
-        while True:
-            item = await queue.get()
-            if item is None:
-                break
-            log_packet(item)
-        await collector
-
-    asyncio.run(runner())
+    asyncio.run(collect_data(mac, collection_time))
 
 
 if __name__ == "__main__":
@@ -15,5 +15,8 @@ setuptools.setup(
     url="https://github.com/aefarrell/PymoTube",
     license='MIT',
     python_requires='>=3.11',
-    install_requires=['bleak']
+    install_requires=['bleak'],
+    extras_require={'numpy': ['numpy'], 'parquet': ['pyarrow'],
+                    'pandas': ['numpy', 'pandas'],
+                    'polars': ['numpy', 'pandas', 'polars']}
 )
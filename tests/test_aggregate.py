@@ -0,0 +1,169 @@
+import pytest
+
+import asyncio
+import random
+
+from atmotube import (
+    AtmotubeProSPS30,
+    AtmotubeProBME280,
+    AtmotubeProSGPC3,
+    AtmotubeProStatus,
+    QuantileSketch,
+    ReadingJoiner,
+    Summary,
+    WindowedAggregator,
+    ble_callback_wrapper,
+    fake_scanner,
+    virtual_fleet)
+
+SECOND = 1_000_000_000
+SGPC3_BYTE = b'\x02\x00\x00\x00'
+
+
+def sgpc3(tvoc, seconds):
+    return AtmotubeProSGPC3.from_values(tvoc=tvoc,
+                                        timestamp_ns=int(seconds * SECOND))
+
+
+@pytest.mark.parametrize("values", [
+    [random.lognormvariate(2, 1) for _ in range(5000)],
+    [random.gauss(0, 20) for _ in range(5000)],
+    [0.0] * 10 + [random.uniform(1, 100) for _ in range(1000)],
+])
+def test_quantile_sketch_accuracy(values):
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for q in range(101):
+        expected = ordered[int(q / 100 * (len(values) - 1))]
+        assert sketch.quantile(q / 100) == \
+            pytest.approx(expected, rel=0.01, abs=1e-9)
+    assert sketch.count == len(values)
+
+
+def test_quantile_sketch_merge_and_bounds():
+    halves = QuantileSketch(), QuantileSketch()
+    whole = QuantileSketch()
+    for i in range(1, 1001):
+        halves[i % 2].add(i)
+        whole.add(i)
+    halves[0].merge(halves[1])
+    assert halves[0].quantile(0.5) == whole.quantile(0.5)
+    with pytest.raises(ValueError):
+        halves[0].merge(QuantileSketch(relative_accuracy=0.05))
+    bounded = QuantileSketch(max_buckets=10)
+    for i in range(1, 10_000):
+        bounded.add(i)
+    assert len(bounded) == 10
+    assert bounded.quantile(1.0) == pytest.approx(9999, rel=0.01)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_summary_handles_none():
+    summary = Summary()
+    for value in (None, 1.0, 3.0, None, 2.0):
+        summary.add(value)
+    assert (summary.count, summary.missing) == (3, 2)
+    assert (summary.mean, summary.min, summary.max) == (2.0, 1.0, 3.0)
+    assert summary.quantile(0) == 1.0
+    assert summary.quantile(0.5) == pytest.approx(2.0, rel=0.01)
+    empty = Summary()
+    empty.add(None)
+    assert empty.mean is None and empty.quantile(0.5) is None
+
+
+def test_tumbling_windows():
+    windows = []
+    aggregator = WindowedAggregator(windows.append, window=60)
+    for i, tvoc in enumerate([0.001, 0.002, None, 0.004]):
+        aggregator.add(sgpc3(tvoc, 50 + i * 5), "AA")
+    assert [w.start_ns for w in windows] == [0]
+    assert windows[0].summaries['tvoc'].count == 2
+    assert windows[0].summaries['tvoc'].mean == pytest.approx(0.0015)
+    # a late packet is dropped, one in a later window closes the window
+    aggregator.add(sgpc3(0.009, 10), "AA")
+    assert aggregator.late == 1
+    aggregator.add(sgpc3(0.005, 200), "AA")
+    assert [(w.start_ns, w.end_ns) for w in windows] == \
+        [(0, 60 * SECOND), (60 * SECOND, 120 * SECOND)]
+    summary = windows[1].summaries['tvoc']
+    assert (summary.count, summary.missing, summary.max) == (1, 1, 0.004)
+    aggregator.flush()
+    assert windows[-1].start_ns == 180 * SECOND
+    assert len(aggregator) == 0
+
+
+def test_sliding_windows():
+    windows = []
+    aggregator = WindowedAggregator(windows.append, window=30, slide=10)
+    for second in range(0, 60):
+        aggregator.add(sgpc3((second + 1) / 1000, second))
+    assert [w.end_ns // SECOND for w in windows] == [10, 20, 30, 40, 50]
+    assert [w.summaries['tvoc'].count for w in windows] == \
+        [10, 20, 30, 30, 30]
+    assert windows[-1].summaries['tvoc'].min == 0.021
+    assert windows[-1].summaries['tvoc'].max == 0.05
+    aggregator.flush()
+    assert [w.end_ns // SECOND for w in windows[5:]] == [60, 70, 80]
+    with pytest.raises(ValueError):
+        WindowedAggregator(windows.append, window=30, slide=20)
+
+
+def test_windows_skip_gaps_and_advance():
+    windows = []
+    aggregator = WindowedAggregator(windows.append, window=60, slide=30,
+                                    allowed_lateness=5)
+    aggregator.add(sgpc3(0.001, 10), "AA")
+    aggregator.add(sgpc3(0.002, 10 ** 6), "AA")
+    assert [w.end_ns // SECOND for w in windows] == [30, 60]
+    aggregator.add(sgpc3(0.003, 5), "BB")
+    aggregator.advance(40 * SECOND)
+    assert [w.address for w in windows[2:]] == ["BB"]
+    aggregator.advance(70 * SECOND)
+    assert len(aggregator) == 1
+    assert len(windows) == 4
+
+
+def test_aggregate_packet_classes():
+    windows = []
+    aggregator = WindowedAggregator(windows.append, window=1)
+    aggregator.add(AtmotubeProSPS30(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00',
+                                    timestamp_ns=0))
+    aggregator.add(AtmotubeProBME280.record(b'\x0e\x17\x8ao\x01\x00\x1a\t',
+                                            timestamp_ns=1))
+    aggregator.add(AtmotubeProStatus(b'Ad', timestamp_ns=2))
+    aggregator.flush()
+    assert sorted(windows[0].summaries) == ["humidity", "pm1", "pm10",
+                                            "pm2_5", "pm4", "pressure",
+                                            "temperature"]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_readings_async():
+    windows = []
+
+    async def callback(window):
+        await asyncio.sleep(0)
+        windows.append(window)
+
+    aggregator = WindowedAggregator(callback, window=60)
+    joiner = ReadingJoiner(aggregator.add)
+    joiner.update(sgpc3(0.002, 1), "AA")
+    joiner.update(sgpc3(0.004, 61), "AA")
+    await aggregator.close()
+    assert [w.summaries['tvoc'].mean for w in windows] == [0.002, 0.004]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_ble():
+    windows = []
+    aggregator = WindowedAggregator(windows.append, window=3600)
+    callback = ble_callback_wrapper(aggregator.ble_callback)
+    async with fake_scanner(callback, virtual_fleet(2), count=20,
+                            speed=None) as scanner:
+        await scanner.wait_replayed()
+    aggregator.flush()
+    assert {w.address for w in windows} == {d.address
+                                            for d in virtual_fleet(2)}
+    assert sum(w.summaries['pm2_5'].count for w in windows) == 20
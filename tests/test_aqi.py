@@ -0,0 +1,132 @@
+import pytest
+from datetime import datetime, timezone
+
+import time
+
+from atmotube import AtmotubeProSPS30, VirtualAtmotube
+from atmotube.clock import datetime_from_ns
+
+np = pytest.importorskip("numpy")
+
+from atmotube.aqi import (  # noqa: E402
+    US_EPA, EU_CAQI, Exposure, NowCast, aqi, category, exposure,
+    hourly_means, nowcast)
+
+HOUR = 3_600_000_000_000
+
+
+def test_us_epa_aqi():
+    assert list(aqi([0.0, 9.0, 9.05, 12.0, 35.5, 55.4, 500.0, np.nan, -1])
+                [:7]) == [0, 50, 50, 56, 101, 150, 848]
+    assert np.isnan(aqi([np.nan, -1.0])).all()
+    assert list(aqi([54, 55, 154.9, 604], pollutant="pm10")) == \
+        [50, 51, 100, 500]
+    assert aqi(35.5) == 101
+    with pytest.raises(ValueError):
+        aqi([1.0], pollutant="o3")
+
+
+def test_eu_caqi():
+    index = aqi([0, 15, 20, 110, 220], scheme=EU_CAQI)
+    assert list(index) == [0, 25, 33, 100, 150]
+    assert list(category(index, EU_CAQI)) == [0, 0, 1, 3, 4]
+    assert EU_CAQI.categories[category(index, EU_CAQI)[2]] == "Low"
+
+
+def test_category():
+    assert list(category([0, 50, 51, 101, 301, 800, np.nan])) == \
+        [0, 0, 1, 2, 5, 5, -1]
+    assert US_EPA.categories[category(aqi(35.5))] == \
+        "Unhealthy for Sensitive Groups"
+
+
+def test_hourly_means():
+    timestamps = [0, HOUR // 2, HOUR, 3 * HOUR + 1]
+    starts, means = hourly_means(timestamps, [1.0, 3.0, None, 4.0])
+    assert list(starts) == [0, HOUR, 2 * HOUR, 3 * HOUR]
+    assert means[0] == 2.0 and means[3] == 4.0
+    assert np.isnan(means[1:3]).all()
+    starts, means = hourly_means(np.array([], dtype=np.int64), [])
+    assert len(starts) == len(means) == 0
+
+
+def test_nowcast():
+    timestamps = np.arange(24) * HOUR
+    _, constant = nowcast(timestamps, np.full(24, 12.0))
+    assert np.isnan(constant[0])
+    assert constant[1:] == pytest.approx(12.0)
+    _, values = nowcast([0, HOUR], [10.0, 20.0])
+    # w = 1 - (20 - 10) / 20 = 0.5
+    assert values[1] == pytest.approx((20 + 10 * 0.5) / 1.5)
+    # two of the last three hours must be valid
+    _, values = nowcast([0, 3 * HOUR], [10.0, 20.0])
+    assert np.isnan(values).all()
+
+
+def test_exposure():
+    timestamps = np.array([0, 60, 120, 1000, 1060, 1120]) * 1_000_000_000
+    values = [10.0, 20.0, np.nan, 30.0, 30.0, 30.0]
+    cumulative = exposure(timestamps, values)
+    assert cumulative[1] == pytest.approx(15 / 60)
+    # no exposure next to the invalid reading, or across the gap
+    assert cumulative[3] == cumulative[1]
+    assert cumulative[-1] == pytest.approx(15 / 60 + 30 / 30)
+    dates = timestamps.astype('datetime64[ns]')
+    assert np.array_equal(exposure(dates, values), cumulative)
+    assert len(exposure([], [])) == 0
+
+
+@pytest.mark.filterwarnings("error")
+def test_datetime_timestamps(monkeypatch):
+    # naive datetimes, like packet.date_time, are in local time
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        timestamps = 1_704_110_400 * 10**9 + np.arange(6) * 20 * 60 * 10**9
+        values = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+        expected = hourly_means(timestamps, values)
+        local = [datetime_from_ns(int(t)) for t in timestamps]
+        aware = [datetime.fromtimestamp(int(t) // 10**9, timezone.utc)
+                 for t in timestamps]
+        for dates in (local, aware):
+            starts, means = hourly_means(dates, values)
+            assert np.array_equal(starts, expected[0])
+            assert np.array_equal(means, expected[1])
+            assert np.array_equal(exposure(dates, values),
+                                  exposure(timestamps, values))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def readings():
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    stream = list(device.stream(AtmotubeProSPS30, rate=1 / 60, count=2000))
+    columns = AtmotubeProSPS30.decode_many(
+        b''.join(payload for _, payload in stream),
+        [timestamp for timestamp, _ in stream])
+    pm2_5 = columns['pm2_5']
+    pm2_5[::97] = np.nan
+    # a day long gap
+    timestamps = columns['timestamp_ns'].copy()
+    timestamps[1000:] += 24 * HOUR
+    return timestamps, pm2_5
+
+
+def test_streaming_matches_bulk():
+    timestamps, pm2_5 = readings()
+    starts, expected = nowcast(timestamps, pm2_5)
+    stream = NowCast()
+    results = []
+    for timestamp, value in zip(timestamps.tolist(), pm2_5.tolist()):
+        results.extend(stream.update(timestamp, value))
+    results.extend(stream.flush())
+    assert [start for start, _ in results] == list(starts)
+    np.testing.assert_array_equal([value for _, value in results], expected)
+
+    expected = exposure(timestamps, pm2_5)
+    stream = Exposure()
+    results = [stream.update(timestamp, None if value != value else value)
+               for timestamp, value in zip(timestamps.tolist(),
+                                           pm2_5.tolist())]
+    np.testing.assert_array_equal(results, expected)
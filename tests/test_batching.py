@@ -0,0 +1,144 @@
+import pytest
+
+import asyncio
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    Batcher,
+    Delivery,
+    FakeBleakClient,
+    FakeBleakScanner,
+    gatt_notify,
+    ble_callback_wrapper,
+    start_gatt_notifications,
+    stop_gatt_notifications,
+    virtual_fleet)
+
+
+@pytest.mark.asyncio
+async def test_batcher_max_batch():
+    batches = []
+    batcher = Batcher(batches.append, max_batch=3, max_latency=None)
+    for i in range(7):
+        batcher.add(i)
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+    assert len(batcher) == 1
+    await batcher.flush()
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    await batcher.flush()
+    assert len(batches) == 3
+    with pytest.raises(ValueError):
+        Batcher(batches.append, max_batch=0)
+    with pytest.raises(ValueError):
+        Batcher(batches.append, max_latency=0)
+
+
+@pytest.mark.asyncio
+async def test_batcher_max_latency():
+    batches = []
+    batcher = Batcher(batches.append, max_batch=100, max_latency=0.02)
+    batcher.add(1)
+    batcher.add(2)
+    assert batches == []
+    await asyncio.sleep(0.05)
+    assert batches == [[1, 2]]
+    # a full batch cancels the timer
+    batcher = Batcher(batches.append, max_batch=2, max_latency=0.02)
+    batcher.add(3)
+    batcher.add(4)
+    await asyncio.sleep(0.05)
+    assert batches == [[1, 2], [3, 4]]
+
+
+@pytest.mark.asyncio
+async def test_batcher_async_callback():
+    batches = []
+
+    async def callback(batch):
+        await asyncio.sleep(0)
+        batches.append(batch)
+
+    batcher = Batcher(callback, max_batch=2, max_latency=0.01)
+    await batcher.add(1)
+    await batcher.add(2)
+    await batcher.add(3)
+    assert batches == [[1, 2]]
+    await asyncio.sleep(0.03)
+    await batcher.flush()
+    assert batches == [[1, 2], [3]]
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_batches():
+    payloads = [(i * 10**6, bytes([i, 0, 0, 0])) for i in range(1, 8)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    batches = []
+
+    async def callback(batch):
+        batches.append([record.tvoc for record in batch])
+
+    async with client:
+        await gatt_notify(client, AtmotubeProGATT_UUID.SGPC3,
+                          AtmotubeProSGPC3, callback, records=True,
+                          delivery=Delivery(3, 0.02))
+        await client.wait_replayed()
+        await asyncio.sleep(0.05)
+    assert batches == [[0.001, 0.002, 0.003], [0.004, 0.005, 0.006],
+                       [0.007]]
+
+
+@pytest.mark.asyncio
+async def test_ble_callback_wrapper_batches():
+    fleet = virtual_fleet(2)
+    devices = {device.address: device.stream(AtmotubeProBLEAdvertising,
+                                             count=5)
+               for device in fleet}
+    batches = []
+    callback = ble_callback_wrapper(batches.append, drop_none=True,
+                                    delivery=Delivery(4, 0.02))
+    async with FakeBleakScanner(callback, devices, speed=None) as scanner:
+        await scanner.wait_replayed()
+        await asyncio.sleep(0.05)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    for device, packet in (item for batch in batches for item in batch):
+        assert device.address in devices
+        assert isinstance(packet, AtmotubeProBLEAdvertising)
+
+
+@pytest.mark.asyncio
+async def test_stop_gatt_notifications_flushes():
+    payloads = [(i * 10**6, bytes([i, 0, 0, 0])) for i in range(1, 6)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    batches = []
+    async with client:
+        await start_gatt_notifications(
+            client, batches.append,
+            [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)],
+            delivery=Delivery(3, None))
+        await client.wait_replayed()
+        assert len(batches) == 1
+        # only full batches are delivered without a latency, until stopping
+        await stop_gatt_notifications(
+            client, [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)])
+    assert [len(batch) for batch in batches] == [3, 2]
+
+
+@pytest.mark.asyncio
+async def test_ble_callback_wrapper_flush():
+    fleet = virtual_fleet(1)
+    devices = {device.address: device.stream(AtmotubeProBLEAdvertising,
+                                             count=5)
+               for device in fleet}
+    batches = []
+    callback = ble_callback_wrapper(batches.append, drop_none=True,
+                                    delivery=Delivery(4, None))
+    async with FakeBleakScanner(callback, devices, speed=None) as scanner:
+        await scanner.wait_replayed()
+    await callback.flush()
+    assert [len(batch) for batch in batches] == [4, 1]
+    # without batching there is nothing to flush
+    await ble_callback_wrapper(batches.append).flush()
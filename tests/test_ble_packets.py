@@ -70,4 +70,52 @@ def test_ble_packets_inequality():
     adv_packet = AtmotubeProBLEAdvertising(ble_adv_byte, date_time=datetime_obj)
     scn_packet = AtmotubeProBLEScanResponse(ble_scn_byte, date_time=datetime_obj)
     assert adv_packet != scn_packet
-    assert scn_packet != adv_packet
\ No newline at end of file
+    assert scn_packet != adv_packet
+
+
+@pytest.mark.parametrize("packet_cls,byte_array", [
+    (AtmotubeProBLEAdvertising, ble_adv_byte),
+    (AtmotubeProBLEScanResponse, ble_scn_byte)])
+def test_ble_packet_record(packet_cls, byte_array):
+    packet = packet_cls(byte_array, date_time=datetime_obj)
+    record = packet_cls.record(byte_array, date_time=datetime_obj)
+    assert isinstance(record, packet_cls._record_)
+    for name in record._fields:
+        assert getattr(record, name) == getattr(packet, name)
+    with pytest.raises(InvalidByteData):
+        packet_cls.record(byte_array[:-1])
+
+
+def test_ble_lazy_packet():
+    lazy = AtmotubeProBLEScanResponse(ble_scn_byte, date_time=datetime_obj,
+                                      lazy=True)
+    assert '_values_' not in lazy.__dict__
+    assert lazy.firmware_version == "116.5.30"
+    assert lazy == AtmotubeProBLEScanResponse(ble_scn_byte,
+                                              date_time=datetime_obj)
+
+
+@pytest.mark.parametrize("packet_cls,byte_array,out_of_range", [
+    (AtmotubeProBLEAdvertising, ble_adv_byte, {'battery_level': 256}),
+    (AtmotubeProBLEScanResponse, ble_scn_byte,
+     {'firmware_version': "1.2.300"})])
+def test_ble_packet_encode(packet_cls, byte_array, out_of_range):
+    record = packet_cls.record(byte_array, date_time=datetime_obj)
+    values = record._asdict()
+    del values['timestamp_ns']
+    assert packet_cls.encode(**values) == byte_array
+    assert packet_cls.from_values(date_time=datetime_obj, **values) == \
+        packet_cls(byte_array, date_time=datetime_obj)
+    with pytest.raises(ValueError):
+        packet_cls.encode(**{**values, **out_of_range})
+    with pytest.raises(ValueError, match="must be a whole number"):
+        packet_cls.encode(**{**values, 'pm1' if 'pm1' in values
+                             else 'humidity': 45.5})
+
+
+def test_scan_response_encode_firmware_version():
+    values = {'pm1': 2, 'pm2_5': 3, 'pm10': 4}
+    for firmware_version in (None, "1.2", "1.x.3"):
+        with pytest.raises(ValueError, match="firmware_version"):
+            AtmotubeProBLEScanResponse.encode(
+                firmware_version=firmware_version, **values)
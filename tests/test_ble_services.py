@@ -11,8 +11,10 @@ from atmotube import (
     ble_callback_wrapper,
     AtmotubeProBLEAdvertising,
     AtmotubeProBLEScanResponse,
+    AtmotubeProBLEScanResponseRecord,
+    ScanStats,
 )
-from atmotube.ble import AtmotubeProBLE_CONSTS
+from atmotube.ble import AtmotubeProBLE_CONSTS, _Deduplicator
 
 TEST_PACKETS = [
     (AtmotubeProBLEAdvertising,bytearray(b'\x0052?\x16\x15\x00\x01i\x92Ac')),
@@ -31,6 +33,17 @@ def test_get_ble_packet(packet_cls, byte_array):
     assert p1 == p2
 
 
+@pytest.mark.parametrize("packet_cls,byte_array", TEST_PACKETS)
+def test_get_ble_packet_timestamp_ns(packet_cls, byte_array):
+    p1 = get_ble_packet(byte_array, timestamp_ns=1_704_110_400_000_000_000)
+    if packet_cls is None:
+        assert p1 is None
+        return
+    p2 = packet_cls(byte_array, timestamp_ns=p1.timestamp_ns)
+    assert p1.timestamp_ns == p2.timestamp_ns == 1_704_110_400_000_000_000
+    assert p1 == p2
+
+
 def test_ble_callback_wrapper_sync():
     mock_callback = Mock()
     wrapped = ble_callback_wrapper(mock_callback)
@@ -79,4 +92,143 @@ async def test_ble_callback_wrapper_async():
     mock_callback.assert_awaited_once()
     called_device, called_packet = mock_callback.call_args[0]
     assert called_device == device
-    assert isinstance(called_packet, AtmotubeProBLEScanResponse)
\ No newline at end of file
+    assert isinstance(called_packet, AtmotubeProBLEScanResponse)
+
+
+@pytest.mark.asyncio
+async def test_ble_callback_wrapper_records():
+    mock_callback = AsyncMock()
+    wrapped = ble_callback_wrapper(mock_callback, records=True)
+
+    device = Mock(spec=BLEDevice)
+    adv_data = AdvertisementData(
+        local_name="ATMOTUBE",
+        manufacturer_data={
+            AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID: TEST_PACKETS[1][1]
+        },
+        service_data={},
+        service_uuids=[],
+        rssi=-60,
+        tx_power=None,
+        platform_data=[]
+    )
+
+    await wrapped(device, adv_data)
+
+    called_device, called_record = mock_callback.call_args[0]
+    assert isinstance(called_record, AtmotubeProBLEScanResponseRecord)
+    assert called_record.firmware_version == "116.5.30"
+
+
+def test_ble_callback_wrapper_tap():
+    mock_callback = Mock()
+    tap = Mock()
+    wrapped = ble_callback_wrapper(mock_callback, tap=tap)
+
+    device = Mock(spec=BLEDevice)
+    for mfr_data in ({AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID:
+                      TEST_PACKETS[0][1]}, {}):
+        adv_data = AdvertisementData(
+            local_name="ATMOTUBE",
+            manufacturer_data=mfr_data,
+            service_data={},
+            service_uuids=[],
+            rssi=-60,
+            tx_power=None,
+            platform_data=[]
+        )
+        wrapped(device, adv_data)
+
+    # only advertisements with Atmotube manufacturer data are tapped
+    tap.assert_called_once_with(device, TEST_PACKETS[0][1])
+    assert mock_callback.call_count == 2
+
+
+def advertisement(mfr_data):
+    return AdvertisementData(
+        local_name="ATMOTUBE",
+        manufacturer_data={
+            AtmotubeProBLE_CONSTS.MANUFACTURER_DATA_ID: mfr_data
+        } if mfr_data else {},
+        service_data={},
+        service_uuids=[],
+        rssi=-60,
+        tx_power=None,
+        platform_data=[]
+    )
+
+
+def test_ble_callback_wrapper_filtering():
+    mock_callback = Mock()
+    tap = Mock()
+    stats = ScanStats()
+    now = [0.0]
+    wrapped = ble_callback_wrapper(mock_callback, tap=tap,
+                                   addresses=["aa:bb:cc:dd:ee:ff"],
+                                   drop_none=True, dedup_window=10.0,
+                                   stats=stats, clock=lambda: now[0])
+    atmotube = BLEDevice("AA:BB:CC:DD:EE:FF", "ATMOTUBE", None)
+    other = BLEDevice("11:22:33:44:55:66", "OTHER", None)
+    adv, scan = TEST_PACKETS[0][1], TEST_PACKETS[1][1]
+    changed = bytearray(adv)
+    changed[-1] -= 1
+
+    for device, mfr_data, time in [(other, adv, 0.0),
+                                   (atmotube, b'', 0.0),
+                                   (atmotube, TEST_PACKETS[2][1], 0.0),
+                                   (atmotube, adv, 0.0),
+                                   (atmotube, scan, 1.0),
+                                   (atmotube, adv, 2.0),
+                                   (atmotube, scan, 3.0),
+                                   (atmotube, changed, 4.0),
+                                   (atmotube, changed, 5.0),
+                                   (atmotube, changed, 14.0)]:
+        now[0] = time
+        wrapped(device, advertisement(mfr_data))
+
+    # the other device is never looked at
+    assert all(call.args[0] == atmotube for call in tap.call_args_list)
+    assert [type(call.args[1]) for call in mock_callback.call_args_list] == [
+        AtmotubeProBLEAdvertising, AtmotubeProBLEScanResponse,
+        AtmotubeProBLEAdvertising, AtmotubeProBLEAdvertising]
+    assert (stats.delivered, stats.filtered, stats.not_atmotube,
+            stats.duplicates) == (4, 1, 2, 3)
+    assert stats.dropped == 6
+
+
+@pytest.mark.asyncio
+async def test_ble_callback_wrapper_filtering_async():
+    mock_callback = AsyncMock()
+    stats = ScanStats()
+    wrapped = ble_callback_wrapper(mock_callback, drop_none=True,
+                                   stats=stats)
+    device = Mock(spec=BLEDevice)
+    await wrapped(device, advertisement(TEST_PACKETS[2][1]))
+    await wrapped(device, advertisement(TEST_PACKETS[0][1]))
+    mock_callback.assert_awaited_once()
+    assert (stats.delivered, stats.not_atmotube) == (1, 1)
+
+
+def test_ble_callback_wrapper_dedup_bounded():
+    mock_callback = Mock()
+    now = [0.0]
+    wrapped = ble_callback_wrapper(mock_callback, dedup_window=1.0,
+                                   clock=lambda: now[0])
+    adv = TEST_PACKETS[0][1]
+    other = BLEDevice("11:22:33:44:55:66", "OTHER", None)
+    # payloads that aren't from an Atmotube are passed on, not remembered
+    wrapped(other, advertisement(b'\x01\x02'))
+    wrapped(other, advertisement(b'\x01\x02'))
+    assert mock_callback.call_count == 2
+    assert wrapped.stats.duplicates == 0
+    for i in range(100):
+        now[0] = i * 0.5
+        device = BLEDevice(f"AA:BB:CC:DD:EE:{i:02X}", "ATMOTUBE", None)
+        wrapped(device, advertisement(adv))
+    assert wrapped.stats.delivered == 102
+    # only the devices seen within the last windows are remembered
+    dedup = _Deduplicator(1.0)
+    for i in range(100):
+        dedup.duplicate(f"AA:BB:CC:DD:EE:{i:02X}", adv, i * 0.5)
+    assert len(dedup) <= 4
+    assert dedup.duplicate("AA:BB:CC:DD:EE:63", adv, 49.9)
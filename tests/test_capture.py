@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import Mock
+from bleak import BLEDevice
+from itertools import count
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSPS30,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    CaptureReader,
+    CaptureSource,
+    CaptureWriter,
+    InvalidCaptureFile)
+
+MAC = "C2:2B:42:15:30:89"
+SPS30_BYTE = bytearray(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00')
+SGPC3_BYTE = bytearray(b'\x02\x00\x00\x00')
+ADV_BYTE = bytearray(b'\x0052?\x16\x15\x00\x01i\x92Ac')
+SCN_BYTE = bytearray(b'\x00\x02\x00\x03\x00\x04t\x05\x1e')
+
+
+def write_capture(path):
+    clock = count(1_000_000, 1_000_000)
+    with CaptureWriter(path, clock=lambda: next(clock)) as writer:
+        gatt_tap = writer.gatt_tap(MAC)
+        ble_tap = writer.ble_tap()
+        device = Mock(spec=BLEDevice, address=MAC)
+        gatt_tap(AtmotubeProGATT_UUID.SPS30, SPS30_BYTE)
+        ble_tap(device, ADV_BYTE)
+        gatt_tap(AtmotubeProGATT_UUID.SGPC3, SGPC3_BYTE)
+        ble_tap(device, SCN_BYTE)
+        gatt_tap(AtmotubeProGATT_UUID.SPS30, SPS30_BYTE)
+
+
+def test_capture_round_trip(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path)
+
+    with CaptureReader(path) as reader:
+        records = list(reader)
+        assert reader.sources == {
+            0: CaptureSource("gatt", MAC, AtmotubeProGATT_UUID.SPS30),
+            1: CaptureSource("ble", MAC),
+            2: CaptureSource("gatt", MAC, AtmotubeProGATT_UUID.SGPC3)}
+
+    assert [r.data for r in records] == [SPS30_BYTE, ADV_BYTE, SGPC3_BYTE,
+                                         SCN_BYTE, SPS30_BYTE]
+    assert [r.source.uuid for r in records] == [
+        AtmotubeProGATT_UUID.SPS30, "", AtmotubeProGATT_UUID.SGPC3, "",
+        AtmotubeProGATT_UUID.SPS30]
+    # timestamps are monotonic, and offset by the same amount in wall time
+    stamps = [r.timestamp_ns for r in records]
+    assert stamps == sorted(stamps)
+    assert len({r.time_ns - r.timestamp_ns for r in records}) == 1
+
+
+def test_capture_append(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path)
+    # a record cut short by a crash is dropped when appending
+    with open(path, "ab") as f:
+        f.write(b'\x0c\x00\x00\x00')
+
+    with CaptureWriter(path) as writer:
+        writer.gatt_tap(MAC)(AtmotubeProGATT_UUID.SGPC3, SGPC3_BYTE)
+        writer.write(writer.source_id("gatt", "AA:BB"), SGPC3_BYTE)
+
+    with CaptureReader(path) as reader:
+        records = list(reader)
+        assert len(reader.sources) == 4
+    assert len(records) == 7
+    assert records[5].source == CaptureSource(
+        "gatt", MAC, AtmotubeProGATT_UUID.SGPC3)
+    assert records[6].source.address == "AA:BB"
+
+
+def test_capture_decode(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = tmp_path / "capture.bin"
+    write_capture(path)
+
+    with CaptureReader(path) as reader:
+        decoded = reader.decode()
+
+    sps30 = decoded[(CaptureSource("gatt", MAC, AtmotubeProGATT_UUID.SPS30),
+                     AtmotubeProSPS30)]
+    assert list(sps30['pm2_5']) == [1.85, 1.85]
+    sgpc3 = decoded[(CaptureSource("gatt", MAC, AtmotubeProGATT_UUID.SGPC3),
+                     AtmotubeProSGPC3)]
+    assert list(sgpc3['tvoc']) == [0.002]
+    adv = decoded[(CaptureSource("ble", MAC), AtmotubeProBLEAdvertising)]
+    scn = decoded[(CaptureSource("ble", MAC), AtmotubeProBLEScanResponse)]
+    assert list(adv['device_id']) == [12863]
+    assert list(adv['index']) == [1]
+    assert list(scn['firmware_version']) == ["116.5.30"]
+    assert list(scn['index']) == [3]
+    assert np.all(np.diff(sps30['date_time']) > np.timedelta64(0))
+
+
+def test_capture_invalid_file(tmp_path):
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b'')
+    with pytest.raises(InvalidCaptureFile):
+        CaptureReader(path)
+    path.write_bytes(b'NOTACAPTUREFILE')
+    with pytest.raises(InvalidCaptureFile):
+        CaptureReader(path)
@@ -0,0 +1,90 @@
+import pytest
+
+import time
+from datetime import datetime, timezone
+from unittest.mock import ANY, AsyncMock, Mock
+
+from bleak import BleakClient
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from atmotube import (
+    AtmotubeProSGPC3,
+    AtmotubeProBLEScanResponse,
+    DecodeCache,
+    ble_callback_wrapper,
+    gatt_notify)
+from atmotube.clock import (datetime_from_ns, monotonic_clock, now_ns,
+                            ns_from_datetime)
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0, 123456)
+SCN_BYTE = bytearray(b'\x00\x02\x00\x03\x00\x04t\x05\x1e')
+
+
+def test_monotonic_clock():
+    clock = monotonic_clock()
+    stamps = [clock() for _ in range(1000)]
+    assert all(isinstance(stamp, int) for stamp in stamps)
+    assert stamps == sorted(stamps)
+    assert abs(clock() - time.time_ns()) < 1_000_000_000
+
+
+def test_datetime_conversions():
+    timestamp_ns = ns_from_datetime(datetime_obj)
+    assert timestamp_ns % 1000 == 0
+    assert datetime_from_ns(timestamp_ns) == datetime_obj
+    assert datetime_from_ns(timestamp_ns + 999) == datetime_obj
+    assert ns_from_datetime(datetime(1970, 1, 1, tzinfo=timezone.utc)) == 0
+
+
+def test_packet_timestamps():
+    before = now_ns()
+    packet = AtmotubeProSGPC3(b'\x02\x00\x00\x00')
+    record = AtmotubeProSGPC3.record(b'\x02\x00\x00\x00')
+    assert before <= packet.timestamp_ns <= record.timestamp_ns <= now_ns()
+    packet = AtmotubeProSGPC3(b'\x02\x00\x00\x00', timestamp_ns=1_500)
+    assert packet.timestamp_ns == 1_500
+    assert packet.date_time == datetime_from_ns(1_500)
+    packet.date_time = datetime_obj
+    assert packet.timestamp_ns == ns_from_datetime(datetime_obj)
+    record = AtmotubeProSGPC3.record(b'\x02\x00\x00\x00',
+                                     date_time=datetime_obj)
+    assert record.date_time == datetime_obj
+    assert record.timestamp_ns == ns_from_datetime(datetime_obj)
+
+
+def test_decode_cache_timestamps():
+    cache = DecodeCache()
+    first = cache.packet(AtmotubeProBLEScanResponse, SCN_BYTE,
+                         timestamp_ns=1)
+    second = cache.packet(AtmotubeProBLEScanResponse, SCN_BYTE,
+                          timestamp_ns=2)
+    assert (first.timestamp_ns, second.timestamp_ns) == (1, 2)
+    assert cache.record(AtmotubeProBLEScanResponse, SCN_BYTE,
+                        timestamp_ns=3).timestamp_ns == 3
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_clock():
+    client = AsyncMock(spec=BleakClient)
+    callback = Mock()
+    clock = Mock(side_effect=[10, 20])
+    await gatt_notify(client, "uuid", AtmotubeProSGPC3, callback,
+                      records=True, clock_ns=clock)
+    client.start_notify.assert_called_once_with("uuid", ANY)
+    packet_callback = client.start_notify.call_args[0][1]
+    packet_callback(None, bytearray(b'\x02\x00\x00\x00'))
+    packet_callback(None, bytearray(b'\x03\x00\x00\x00'))
+    assert [call.args[0].timestamp_ns for call in callback.call_args_list] \
+        == [10, 20]
+
+
+def test_ble_callback_wrapper_clock():
+    callback = Mock()
+    wrapped = ble_callback_wrapper(callback, clock_ns=lambda: 42)
+    device = Mock(spec=BLEDevice)
+    adv = Mock(spec=AdvertisementData)
+    adv.manufacturer_data = {0xFFFF: SCN_BYTE}
+    wrapped(device, adv)
+    packet = callback.call_args.args[1]
+    assert packet.timestamp_ns == 42
@@ -0,0 +1,148 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from atmotube import (
+    InvalidByteData,
+    AtmotubeProStatus,
+    AtmotubeProSPS30,
+    AtmotubeProBME280,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse
+)
+from atmotube.clock import ns_from_datetime
+
+np = pytest.importorskip("numpy")
+
+from atmotube.columnar import decode_ble_payloads  # noqa: E402
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0)
+
+GATT_PACKETS = [
+    (AtmotubeProStatus, [bytearray(b'Ad'), bytearray(b'\x08c'),
+                         bytearray(b'\xff\x00')]),
+    (AtmotubeProSPS30,
+     [bytearray(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00'),
+      bytearray(b'\xff\xff\xff\x00\x00\x00J\x01\x00\x01\x00\x80')]),
+    (AtmotubeProBME280, [bytearray(b'\x0e\x17\x8ao\x01\x00\x1a\t'),
+                         bytearray(b'\x00\xfe\x00\x00\x00\x00\x38\xff')]),
+    (AtmotubeProSGPC3, [bytearray(b'\x02\x00\x00\x00'),
+                        bytearray(b'\x00\x00\x00\x00'),
+                        bytearray(b'\xfe\xff\x00\x00')]),
+]
+
+
+def assert_matches_scalar(columns, packets):
+    for name, column in columns.items():
+        assert len(column) == len(packets)
+        for value, packet in zip(column, packets):
+            expected = getattr(packet, name)
+            if expected is None:
+                assert np.isnan(value)
+            elif isinstance(expected, datetime):
+                assert value == np.datetime64(ns_from_datetime(expected),
+                                              'ns')
+            else:
+                assert value == expected
+
+
+@pytest.mark.parametrize("packet_cls,payloads", GATT_PACKETS)
+def test_decode_many_matches_scalar(packet_cls, payloads):
+    timestamps = [datetime_obj + timedelta(seconds=i)
+                  for i in range(len(payloads))]
+    packets = [packet_cls(p, date_time=ts)
+               for p, ts in zip(payloads, timestamps)]
+    columns = packet_cls.decode_many(b''.join(payloads), timestamps)
+    assert_matches_scalar(columns, packets)
+
+
+def test_decode_many_dtypes():
+    columns = AtmotubeProStatus.decode_many(b'AdAc', [datetime_obj] * 2)
+    assert columns['date_time'].dtype == np.dtype('datetime64[ns]')
+    assert columns['timestamp_ns'].dtype == np.int64
+    assert columns['pre_heating'].dtype == np.bool_
+    assert columns['battery_level'].dtype == np.uint8
+    columns = AtmotubeProBME280.decode_many(b'', [])
+    assert columns['humidity'].dtype == np.float64
+    assert len(columns['humidity']) == 0
+
+
+def test_decode_many_invalid():
+    with pytest.raises(InvalidByteData):
+        AtmotubeProSGPC3.decode_many(b'\x02\x00\x00\x00\x02', [datetime_obj])
+    with pytest.raises(ValueError):
+        AtmotubeProSGPC3.decode_many(b'\x02\x00\x00\x00', [])
+
+
+BLE_PACKETS = [
+    (AtmotubeProBLEAdvertising,
+     [bytearray(b'\x0052?\x16\x15\x00\x01i\x92Ac'),
+      bytearray(b'\x00\x00\xff\xff\x00\xfe\x00\x00\x00\x00\x08\x05')]),
+    (AtmotubeProBLEScanResponse,
+     [bytearray(b'\x00\x02\x00\x03\x00\x04t\x05\x1e'),
+      bytearray(b'\xff\xff\x00\x00\x01\x00\x01\x02\x03')]),
+]
+
+
+@pytest.mark.parametrize("packet_cls,payloads", BLE_PACKETS)
+def test_decode_many_ble_matches_scalar(packet_cls, payloads):
+    timestamps = [datetime_obj + timedelta(seconds=i)
+                  for i in range(len(payloads))]
+    packets = [packet_cls(p, date_time=ts)
+               for p, ts in zip(payloads, timestamps)]
+    columns = packet_cls.decode_many(b''.join(payloads), timestamps)
+    assert_matches_scalar(columns, packets)
+
+
+def test_decode_ble_payloads():
+    adv, scn = BLE_PACKETS[0][1], BLE_PACKETS[1][1]
+    payloads = [adv[0], scn[0], bytearray(b''), scn[1],
+                bytearray(b'\x00\x01\x02'), adv[1]]
+    timestamps = [datetime_obj + timedelta(seconds=i)
+                  for i in range(len(payloads))]
+    lengths = [len(p) for p in payloads]
+
+    for result in (decode_ble_payloads(payloads, timestamps),
+                   decode_ble_payloads(b''.join(payloads), timestamps,
+                                       lengths=lengths)):
+        assert set(result) == {AtmotubeProBLEAdvertising,
+                               AtmotubeProBLEScanResponse}
+        for packet_cls, columns in result.items():
+            index = columns.pop('index')
+            packets = [packet_cls(payloads[i], date_time=timestamps[i])
+                       for i in index]
+            assert len(packets) == 2
+            assert_matches_scalar(columns, packets)
+
+
+def test_decode_ble_payloads_invalid():
+    payload = BLE_PACKETS[0][1][0]
+    with pytest.raises(InvalidByteData):
+        decode_ble_payloads(payload, [datetime_obj], lengths=[11])
+    with pytest.raises(ValueError):
+        decode_ble_payloads([payload], [])
+
+
+def test_decode_many_int_timestamps():
+    timestamps = np.arange(3, dtype=np.int64) * 1_000_000_007
+    columns = AtmotubeProStatus.decode_many(b'AdAcAb', timestamps)
+    assert columns['timestamp_ns'].dtype == np.int64
+    assert np.array_equal(columns['timestamp_ns'], timestamps)
+    assert columns['date_time'].dtype == np.dtype('datetime64[ns]')
+    assert columns['date_time'][1] == np.datetime64(1_000_000_007, 'ns')
+    payloads = BLE_PACKETS[0][1] + BLE_PACKETS[1][1]
+    result = decode_ble_payloads(payloads, [1, 2, 3, 4])
+    assert list(result[AtmotubeProBLEScanResponse]['timestamp_ns']) == [3, 4]
+
+
+@pytest.mark.filterwarnings("error")
+def test_decode_many_datetime_timestamps():
+    # Naive, aware and numpy datetimes all give the same UTC nanoseconds
+    timestamp_ns = ns_from_datetime(datetime_obj)
+    aware = datetime_obj.astimezone(timezone.utc)
+    for timestamps in ([datetime_obj], [aware],
+                       np.array([timestamp_ns], dtype='datetime64[ns]'),
+                       [timestamp_ns]):
+        columns = AtmotubeProStatus.decode_many(b'Ad', timestamps)
+        assert columns['timestamp_ns'].tolist() == [timestamp_ns]
+        assert columns['date_time'][0] == np.datetime64(timestamp_ns, 'ns')
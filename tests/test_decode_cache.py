@@ -0,0 +1,84 @@
+import pytest
+from unittest.mock import Mock
+
+from datetime import datetime
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSGPC3,
+    AtmotubeProSPS30,
+    AtmotubeProSPS30Record,
+    AtmotubeProBLEScanResponse,
+    DecodeCache,
+    FakeBleakClient,
+    InvalidByteData,
+    gatt_notify,
+    get_ble_packet)
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0)
+SPS30_BYTE = bytearray(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00')
+SGPC3_BYTE = bytearray(b'\x02\x00\x00\x00')
+SCN_BYTE = bytearray(b'\x00\x02\x00\x03\x00\x04t\x05\x1e')
+
+
+def test_decode_cache_packets():
+    cache = DecodeCache(maxsize=2)
+    first = cache.packet(AtmotubeProSPS30, SPS30_BYTE, date_time=datetime_obj)
+    second = cache.packet(AtmotubeProSPS30, bytes(SPS30_BYTE))
+    assert first == AtmotubeProSPS30(SPS30_BYTE, date_time=datetime_obj)
+    assert bytes(second) == SPS30_BYTE
+    assert second.pm2_5 == 1.85
+    assert second.date_time > first.date_time
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+    record = cache.record(AtmotubeProSPS30, SPS30_BYTE,
+                          date_time=datetime_obj)
+    assert isinstance(record, AtmotubeProSPS30Record)
+    assert record == AtmotubeProSPS30.record(SPS30_BYTE,
+                                             date_time=datetime_obj)
+    assert cache.hit_rate == 2 / 3
+
+
+def test_decode_cache_eviction():
+    cache = DecodeCache(maxsize=2)
+    cache.values(AtmotubeProSGPC3, SGPC3_BYTE)
+    cache.values(AtmotubeProSPS30, SPS30_BYTE)
+    cache.values(AtmotubeProSGPC3, SGPC3_BYTE)
+    # the SPS30 payload is the least recently used
+    cache.values(AtmotubeProSGPC3, b'\x03\x00\x00\x00')
+    cache.values(AtmotubeProSPS30, SPS30_BYTE)
+    assert (cache.hits, cache.misses, len(cache)) == (1, 4, 2)
+    # the same bytes are cached separately for each packet class
+    with pytest.raises(InvalidByteData):
+        cache.values(AtmotubeProSGPC3, SPS30_BYTE)
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_get_ble_packet_cache():
+    cache = DecodeCache()
+    packets = [get_ble_packet(SCN_BYTE, cache=cache) for _ in range(3)]
+    assert all(isinstance(packet, AtmotubeProBLEScanResponse)
+               for packet in packets)
+    assert packets[2].firmware_version == "116.5.30"
+    record = get_ble_packet(SCN_BYTE, records=True, cache=cache)
+    assert record == AtmotubeProBLEScanResponse.record(
+        SCN_BYTE, timestamp_ns=record.timestamp_ns)
+    assert get_ble_packet(b'\x00', cache=cache) is None
+    assert cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_cache():
+    cache = DecodeCache()
+    callback = Mock()
+    stream = [(i, bytes(SGPC3_BYTE)) for i in range(5)]
+    async with FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: stream},
+                               speed=None) as client:
+        await gatt_notify(client, AtmotubeProGATT_UUID.SGPC3,
+                          AtmotubeProSGPC3, callback, cache=cache)
+        await client.wait_replayed()
+    assert callback.call_count == 5
+    assert all(call.args[0].tvoc == 0.002
+               for call in callback.call_args_list)
+    assert (cache.hits, cache.misses) == (4, 1)
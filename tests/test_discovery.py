@@ -0,0 +1,184 @@
+import pytest
+
+import asyncio
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProService_UUID,
+    AtmotubeProSPS30,
+    AtmotubeProSGPC3,
+    AtmotubeProStatus,
+    CharacteristicCache,
+    DecodeCache,
+    FakeBleakClient,
+    GATTSession,
+    start_cached_notifications)
+
+SPS30_BYTE = bytes(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00')
+SGPC3_BYTE = bytes(b'\x02\x00\x00\x00')
+
+STREAMS = {AtmotubeProGATT_UUID.SPS30: [(0, SPS30_BYTE)],
+           AtmotubeProGATT_UUID.SGPC3: [(0, SGPC3_BYTE)]}
+
+
+class CountingClient(FakeBleakClient):
+    # Counts how many times the Atmotube service is looked up
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.discoveries = 0
+        get_service = self.services.get_service
+
+        def counting_get_service(uuid):
+            self.discoveries += 1
+            return get_service(uuid)
+        self.services.get_service = counting_get_service
+
+
+def test_cache_persistence(tmp_path):
+    path = tmp_path / "characteristics.json"
+    cache = CharacteristicCache(path)
+    assert cache.get("aa:bb") is None
+    cache.put("aa:bb", [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)],
+              firmware_version="116.5.30")
+    assert cache.get("AA:BB") is None
+    assert CharacteristicCache(path).get("AA:BB", "116.5.30") == \
+        [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)]
+    cache.discard("AA:BB", "116.5.30")
+    assert CharacteristicCache(path).get("AA:BB", "116.5.30") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_notifications(tmp_path):
+    cache = CharacteristicCache(tmp_path / "characteristics.json")
+    packets = []
+
+    client = CountingClient("AA:BB", STREAMS, speed=None)
+    async with client:
+        packet_list = await start_cached_notifications(client, packets.append,
+                                                       cache)
+        await client.wait_replayed()
+    assert client.discoveries == 1
+    assert set(packet_list) == {
+        (AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30),
+        (AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)}
+
+    # reconnecting subscribes from the cache, then validates it
+    client = CountingClient("AA:BB", STREAMS, speed=None)
+    async with client:
+        assert await start_cached_notifications(client, packets.append,
+                                                cache) == packet_list
+        assert client.discoveries == 0
+        await client.wait_replayed()
+        await asyncio.sleep(0)
+        assert client.discoveries == 1
+    assert len(packets) == 4
+
+
+@pytest.mark.asyncio
+async def test_cached_notifications_options():
+    # the options of start_gatt_notifications are passed on
+    packets = []
+    decode_cache = DecodeCache()
+    async with FakeBleakClient("AA:BB", STREAMS, speed=None) as client:
+        await start_cached_notifications(client, packets.append,
+                                         CharacteristicCache(),
+                                         decode_cache=decode_cache,
+                                         clock_ns=lambda: 42)
+        await client.wait_replayed()
+    assert len(packets) == 2
+    assert all(packet.timestamp_ns == 42 for packet in packets)
+    assert decode_cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_mismatch(tmp_path):
+    cache = CharacteristicCache()
+    cache.put("AA:BB", [(AtmotubeProGATT_UUID.STATUS, AtmotubeProStatus),
+                        (AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)])
+    packets = []
+    # the device doesn't have the status characteristic
+    async with FakeBleakClient("AA:BB", STREAMS, speed=None) as client:
+        packet_list = await start_cached_notifications(client, packets.append,
+                                                       cache)
+        await client.wait_replayed()
+    assert set(packet_list) == set(cache.get("AA:BB")) == {
+        (AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30),
+        (AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)}
+    assert {type(packet) for packet in packets} == \
+        {AtmotubeProSPS30, AtmotubeProSGPC3}
+
+    # the device has a characteristic that isn't in the cache
+    cache.put("AA:BB", [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)])
+    packets = []
+    async with FakeBleakClient("AA:BB", STREAMS, speed=None) as client:
+        await start_cached_notifications(client, packets.append, cache)
+        await asyncio.sleep(0.01)
+        await client.wait_replayed()
+    assert set(cache.get("AA:BB")) == set(packet_list)
+    assert {type(packet) for packet in packets} == \
+        {AtmotubeProSPS30, AtmotubeProSGPC3}
+
+
+@pytest.mark.asyncio
+async def test_session_characteristic_cache():
+    cache = CharacteristicCache()
+    cache.put("AA:BB", [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)],
+              firmware_version="116.5.30")
+    client = CountingClient("AA:BB", STREAMS, speed=None,
+                            firmware_version="116.5.30")
+    requested = []
+
+    def factory(address, services=None):
+        requested.append(services)
+        return client
+    received = []
+    session = GATTSession(["AA:BB"], lambda address, packet: received.append(
+                              packet), client_factory=factory,
+                          characteristic_cache=cache)
+    async with session:
+        await asyncio.sleep(0.01)
+        await client.wait_replayed()
+    # only the cached services are discovered when connecting
+    assert requested == [[AtmotubeProService_UUID.PRO,
+                          AtmotubeProService_UUID.DEVICE_INFO]]
+    assert client.discoveries == 1
+    assert len(received) == 2
+    assert session.stats["AA:BB"].packets == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_firmware_update():
+    cache = CharacteristicCache()
+    cache.put("AA:BB", [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)],
+              firmware_version="116.5.29")
+    assert "aa:bb" in cache
+    assert cache.client("CC:DD", lambda address, **kwargs: kwargs) == {}
+    client = CountingClient("AA:BB", STREAMS, speed=None,
+                            firmware_version="116.5.30")
+    async with client:
+        await start_cached_notifications(client, lambda packet: None, cache)
+    # the new firmware isn't cached, so the device is discovered again
+    assert client.discoveries == 1
+    assert cache.get("AA:BB", "116.5.29") is None
+    assert set(cache.get("AA:BB", "116.5.30")) == {
+        (AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30),
+        (AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)}
+
+
+@pytest.mark.asyncio
+async def test_cache_validation_error():
+    cache = CharacteristicCache()
+    cache.put("AA:BB", [(AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)])
+    calls = []
+
+    async def subscribe(packet_list):
+        calls.append(packet_list)
+        if len(calls) > 1:
+            raise RuntimeError("subscribe failed")
+    async with FakeBleakClient("AA:BB", STREAMS, speed=None) as client:
+        await cache.subscribe(client, subscribe)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    # the background check tried to subscribe to the new characteristic
+    assert calls[1] == [(AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30)]
+    assert isinstance(cache.error, RuntimeError)
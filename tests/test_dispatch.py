@@ -0,0 +1,153 @@
+import pytest
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    Delivery,
+    DispatchStats,
+    ExecutorDispatcher,
+    FakeBleakClient,
+    FakeBleakScanner,
+    ble_callback_wrapper,
+    gatt_notify,
+    virtual_fleet)
+
+
+def tvoc(record):
+    # module level, so it can be pickled for a process pool
+    return record.tvoc
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_keeps_key_order():
+    handled = []
+    lock = threading.Lock()
+
+    def handler(key, i):
+        time.sleep(random.random() / 1000)
+        with lock:
+            handled.append((key, i))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        dispatcher = ExecutorDispatcher(executor)
+        for i in range(20):
+            for key in "abc":
+                await dispatcher.submit(key, handler, key, i)
+        await dispatcher.join()
+    for key in "abc":
+        assert [i for k, i in handled if k == key] == list(range(20))
+    stats = dispatcher.stats
+    assert (stats.submitted, stats.completed, stats.failed) == (60, 60, 0)
+    assert stats.depth == 0
+    assert 0 < stats.mean_latency <= stats.max_latency
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_bounds_in_flight():
+    release = threading.Event()
+    stats = DispatchStats()
+    dispatcher = ExecutorDispatcher(max_in_flight=2, stats=stats)
+    await dispatcher.submit("a", release.wait)
+    await dispatcher.submit("b", release.wait)
+    submit = asyncio.create_task(dispatcher.submit("c", release.wait))
+    await asyncio.sleep(0.01)
+    assert not submit.done()
+    assert stats.depth == 2
+    release.set()
+    await submit
+    await dispatcher.join()
+    assert stats.max_depth == 2
+    assert stats.completed == 3
+    with pytest.raises(ValueError):
+        ExecutorDispatcher(max_in_flight=0)
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_failures():
+    def handler(i):
+        if i == 1:
+            raise RuntimeError("sink failed")
+
+    dispatcher = ExecutorDispatcher()
+    callback = dispatcher.wrap(handler, "a")
+    for i in range(3):
+        await callback(i)
+    await dispatcher.join()
+    assert (dispatcher.stats.completed, dispatcher.stats.failed) == (2, 1)
+    assert isinstance(dispatcher.stats.error, RuntimeError)
+
+    async def async_handler(i):
+        pass
+
+    with pytest.raises(TypeError):
+        dispatcher.wrap(async_handler, "a")
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_dispatcher():
+    payloads = [(i * 10**6, bytes([i, 0, 0, 0])) for i in range(1, 11)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    threads = set()
+    received = []
+
+    def handler(record):
+        threads.add(threading.get_ident())
+        received.append(record.tvoc)
+
+    dispatcher = ExecutorDispatcher(ThreadPoolExecutor(max_workers=2))
+    async with client:
+        await gatt_notify(client, AtmotubeProGATT_UUID.SGPC3,
+                          AtmotubeProSGPC3, handler, records=True,
+                          delivery=Delivery(dispatcher=dispatcher))
+        await client.wait_replayed()
+        await dispatcher.join()
+    assert received == [i / 1000 for i in range(1, 11)]
+    assert threading.get_ident() not in threads
+
+
+@pytest.mark.asyncio
+async def test_ble_callback_wrapper_dispatcher():
+    fleet = virtual_fleet(3)
+    devices = {device.address: device.stream(AtmotubeProBLEAdvertising,
+                                             count=10)
+               for device in fleet}
+    received = {}
+
+    def handler(device, packet):
+        received.setdefault(device.address, []).append(packet.date_time)
+
+    dispatcher = ExecutorDispatcher(ThreadPoolExecutor(max_workers=3))
+    callback = ble_callback_wrapper(handler, drop_none=True,
+                                    delivery=Delivery(dispatcher=dispatcher))
+    async with FakeBleakScanner(callback, devices, speed=None) as scanner:
+        await scanner.wait_replayed()
+        await dispatcher.join()
+    assert received.keys() == devices.keys()
+    for times in received.values():
+        assert len(times) == 10
+        assert times == sorted(times)
+
+
+@pytest.mark.asyncio
+async def test_process_pool_dispatcher():
+    payloads = [(i * 10**6, bytes([i, 0, 0, 0])) for i in range(1, 6)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        dispatcher = ExecutorDispatcher(executor)
+        async with client:
+            await gatt_notify(client, AtmotubeProGATT_UUID.SGPC3,
+                              AtmotubeProSGPC3, tvoc, records=True,
+                              delivery=Delivery(dispatcher=dispatcher))
+            await client.wait_replayed()
+            await dispatcher.join()
+    assert dispatcher.stats.completed == 5
+    assert dispatcher.stats.error is None
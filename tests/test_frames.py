@@ -0,0 +1,96 @@
+import pytest
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProStatus,
+    AtmotubeProSPS30,
+    AtmotubeProBME280,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    CaptureSource,
+    CaptureWriter,
+    VirtualAtmotube)
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from atmotube.frames import capture_frames, to_frame, to_polars  # noqa: E402
+
+MAC = "C2:2B:42:15:30:89"
+
+PACKET_CLASSES = [AtmotubeProStatus, AtmotubeProSPS30, AtmotubeProBME280,
+                  AtmotubeProSGPC3, AtmotubeProBLEAdvertising,
+                  AtmotubeProBLEScanResponse]
+
+
+def naive_frame(packets):
+    # The frame built one attribute at a time
+    return pd.DataFrame([{name: getattr(packet, name)
+                          for name in packet._field_names_}
+                         for packet in packets])
+
+
+@pytest.mark.parametrize("packet_cls", PACKET_CLASSES)
+def test_to_frame_matches_packets(packet_cls):
+    stream = list(VirtualAtmotube("AA:BB:CC:DD:EE:FF").stream(packet_cls,
+                                                              count=20))
+    packets = [packet_cls(payload, timestamp_ns=timestamp)
+               for timestamp, payload in stream]
+    frame = to_frame(packets)
+    assert list(frame.index.asi8) == [t for t, _ in stream]
+    assert str(frame.index.tz) == "UTC"
+    expected = naive_frame(packets)
+    assert sorted(frame.columns) == sorted(expected.columns)
+    for name in expected.columns:
+        assert [None if pd.isna(value) else value
+                for value in frame[name]] == list(expected[name])
+    records = [packet_cls.record(payload, timestamp_ns=timestamp)
+               for timestamp, payload in stream]
+    assert to_frame(records).equals(frame)
+    columns = packet_cls.decode_many(b''.join(p for _, p in stream),
+                                     [t for t, _ in stream])
+    assert to_frame(columns).equals(frame)
+
+
+def test_to_frame_types():
+    packets = [AtmotubeProSGPC3.from_values(tvoc=tvoc, timestamp_ns=i)
+               for i, tvoc in enumerate([0.002, None, 0.004])]
+    frame = to_frame(packets)
+    assert frame['tvoc'].dtype == pd.Float64Dtype()
+    assert frame['tvoc'].isna().tolist() == [False, True, False]
+    frame = to_frame([AtmotubeProStatus(b'Ad', timestamp_ns=0)])
+    assert frame['pre_heating'].dtype == bool
+    assert frame['battery_level'].dtype == np.uint8
+    frame = to_frame([], AtmotubeProBLEScanResponse)
+    assert frame['firmware_version'].dtype == pd.StringDtype()
+    assert len(frame) == 0
+    with pytest.raises(ValueError):
+        to_frame([])
+    with pytest.raises(TypeError):
+        to_frame([AtmotubeProStatus(b'Ad'), AtmotubeProSGPC3(b'\2\0\0\0')])
+
+
+def test_capture_frames(tmp_path):
+    path = tmp_path / "capture.bin"
+    device = VirtualAtmotube(MAC)
+    with CaptureWriter(path) as writer:
+        tap = writer.gatt_tap(MAC)
+        for _, payload in device.stream(AtmotubeProSPS30, count=10):
+            tap(AtmotubeProGATT_UUID.SPS30, payload)
+    frames = capture_frames(path)
+    sps30 = frames[(CaptureSource("gatt", MAC, AtmotubeProGATT_UUID.SPS30),
+                    AtmotubeProSPS30)]
+    assert len(sps30) == 10
+    assert sps30['pm2_5'].dtype == pd.Float64Dtype()
+    assert sps30.index.is_monotonic_increasing
+
+
+def test_to_polars():
+    pl = pytest.importorskip("polars")
+    packets = [AtmotubeProSGPC3.from_values(tvoc=tvoc, timestamp_ns=i)
+               for i, tvoc in enumerate([0.002, None])]
+    frame = to_polars(packets)
+    assert frame.columns == ["date_time", "tvoc"]
+    assert frame["date_time"].dtype == pl.Datetime("ns", "UTC")
+    assert frame["tvoc"].to_list() == [0.002, None]
@@ -70,4 +70,119 @@ def test_packet_inequality_different_datetime():
     for packet_cls, data in example_data:
         p1 = packet_cls(data['valid_byte'], date_time=datetime_obj)
         p2 = packet_cls(data['valid_byte'])
-        assert p1 != p2
\ No newline at end of file
+        assert p1 != p2
+
+
+@pytest.mark.parametrize("packet_cls,data", example_data)
+def test_packet_equality_sub_microsecond(packet_cls, data):
+    # Packets are equal when their date_time is, stamps that only differ
+    # below a microsecond don't make them unequal
+    timestamp_ns = 1_704_110_400_000_000_000
+    p1 = packet_cls(data['valid_byte'], timestamp_ns=timestamp_ns)
+    p2 = packet_cls(data['valid_byte'], timestamp_ns=timestamp_ns + 999)
+    p3 = packet_cls(data['valid_byte'], timestamp_ns=timestamp_ns + 1000)
+    assert p1.date_time == p2.date_time
+    assert p1 == p2
+    assert p1 != p3
+    assert p1 == packet_cls(data['valid_byte'], date_time=p1.date_time)
+
+
+@pytest.mark.parametrize("packet_cls,data", example_data)
+def test_packet_record(packet_cls, data):
+    packet = packet_cls(data['valid_byte'], date_time=datetime_obj)
+    record = packet_cls.record(data['valid_byte'], date_time=datetime_obj)
+    assert isinstance(record, packet_cls._record_)
+    assert record._fields == ('timestamp_ns',) + packet_cls._field_names_
+    for name in record._fields:
+        assert getattr(record, name) == getattr(packet, name)
+    assert not hasattr(record, '__dict__')
+    assert packet_cls.record(data['valid_byte']).date_time != datetime_obj
+    with pytest.raises(InvalidByteData):
+        packet_cls.record(data['invalid_byte'], date_time=datetime_obj)
+
+
+@pytest.mark.parametrize("packet_cls,data", example_data)
+def test_lazy_packet(packet_cls, data):
+    eager = packet_cls(data['valid_byte'], date_time=datetime_obj)
+    lazy = packet_cls(data['valid_byte'], date_time=datetime_obj, lazy=True)
+    assert '_values_' not in lazy.__dict__
+    assert str(lazy) == data['str']
+    assert '_values_' in lazy.__dict__
+    assert packet_cls(data['valid_byte'], date_time=datetime_obj,
+                      lazy=True) == eager
+    with pytest.raises(AttributeError):
+        lazy.not_a_field
+
+
+@pytest.mark.parametrize("packet_cls,data", example_data)
+def test_packet_from_view(packet_cls, data):
+    size = packet_cls._byte_size_
+    buffer = bytearray(b'\x00' * 3) + data['valid_byte'] + data['alt_byte']
+    expected = packet_cls(data['valid_byte'], date_time=datetime_obj)
+
+    shared = packet_cls.from_view(buffer, 3, date_time=datetime_obj)
+    assert shared == expected
+    assert packet_cls.from_view(bytes(buffer), 3,
+                                date_time=datetime_obj) == expected
+    assert packet_cls.from_view(memoryview(buffer), 3 + size,
+                                date_time=datetime_obj) == \
+        packet_cls(data['alt_byte'], date_time=datetime_obj)
+    assert packet_cls.record_from_view(bytes(buffer), 3,
+                                       date_time=datetime_obj) == \
+        packet_cls.record(data['valid_byte'], date_time=datetime_obj)
+
+    # the packet shares memory with the buffer, which can't be resized
+    buffer[3] ^= 0xff
+    assert bytes(shared)[0] == buffer[3]
+    with pytest.raises(BufferError):
+        buffer.extend(b'\x00')
+
+    with pytest.raises(InvalidByteData):
+        packet_cls.from_view(buffer, 4 + size)
+    with pytest.raises(InvalidByteData):
+        packet_cls.record_from_view(buffer, -1)
+
+
+@pytest.mark.parametrize("packet_cls,data", example_data)
+def test_packet_encode(packet_cls, data):
+    packet = packet_cls(data['valid_byte'], date_time=datetime_obj)
+    values = {name: getattr(packet, name) for name in packet_cls._field_names_}
+    assert packet_cls.encode(**values) == data['valid_byte']
+    assert packet_cls.from_values(date_time=datetime_obj, **values) == packet
+    with pytest.raises(ValueError):
+        packet_cls.encode()
+    with pytest.raises(ValueError):
+        packet_cls.encode(not_a_field=1, **values)
+
+
+def test_sps30_encode_range():
+    values = {'pm1': None, 'pm2_5': -1.5, 'pm10': 80000.0, 'pm4': 1.0}
+    packet = AtmotubeProSPS30.from_values(**values)
+    assert (packet.pm1, packet.pm2_5, packet.pm10, packet.pm4) == \
+        (None, None, 80000.0, 1.0)
+    with pytest.raises(ValueError):
+        AtmotubeProSPS30.encode(**{**values, 'pm10': 90000.0})
+    with pytest.raises(ValueError):
+        AtmotubeProSGPC3.encode(tvoc=40.0)
+
+
+def test_encode_integer_readings():
+    # humidity decodes as an integer, whole floats are fine
+    values = {'temperature': 23.3, 'pressure': 940.9}
+    assert AtmotubeProBME280.encode(humidity=14.0, **values) == \
+        AtmotubeProBME280.encode(humidity=14, **values)
+    with pytest.raises(ValueError, match="humidity must be a whole number"):
+        AtmotubeProBME280.encode(humidity=45.5, **values)
+
+
+def test_bme280_encode_temperature_range():
+    # the temperature is read from T_dec, which holds more than the coarse
+    # signed byte next to it
+    for temperature in (-200.5, 150.25, 300.0):
+        packet = AtmotubeProBME280.from_values(humidity=14,
+                                               temperature=temperature,
+                                               pressure=940.9)
+        assert packet.temperature == temperature
+    with pytest.raises(ValueError):
+        AtmotubeProBME280.encode(humidity=14, temperature=400.0,
+                                 pressure=940.9)
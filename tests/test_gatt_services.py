@@ -10,10 +10,12 @@ from atmotube import (
     AtmotubeProSPS30,
     AtmotubeProBME280,
     AtmotubeProSGPC3,
+    AtmotubeProSPS30Record,
     InvalidAtmotubeService,
     get_available_characteristics,
     gatt_notify,
     start_gatt_notifications)
+from atmotube.clock import datetime_from_ns
 
 ALL_PACKETS = [(AtmotubeProGATT_UUID.STATUS, AtmotubeProStatus),
                (AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30),
@@ -149,3 +151,55 @@ async def test_start_gatt_notifications():
         packet = call.args[0]
         assert isinstance(packet, MockPacket)
         assert packet.data[1] == TEST_PACKETS[packet.data[0]]
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_records():
+    uuid = AtmotubeProGATT_UUID.SPS30
+    client = AsyncMock(spec=BleakClient)
+    callback = Mock()
+
+    await gatt_notify(client, uuid, AtmotubeProSPS30, callback, records=True)
+    packet_callback = client.start_notify.call_args[0][1]
+    packet_callback(None, TEST_PACKETS[uuid])
+
+    record = callback.call_args.args[0]
+    assert isinstance(record, AtmotubeProSPS30Record)
+    assert record.pm2_5 == 1.85
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_tap():
+    uuid = AtmotubeProGATT_UUID.SGPC3
+    client = AsyncMock(spec=BleakClient)
+    callback = Mock()
+    tap = Mock()
+
+    await gatt_notify(client, uuid, AtmotubeProSGPC3, callback, tap=tap)
+    packet_callback = client.start_notify.call_args[0][1]
+    packet_callback(None, TEST_PACKETS[uuid])
+
+    tap.assert_called_once_with(uuid, TEST_PACKETS[uuid])
+    callback.assert_called_once()
+
+
+class DateTimePacket(MockPacket):
+    def __init__(self, data, date_time=None):
+        super().__init__(data)
+        self.date_time = date_time
+
+
+@pytest.mark.asyncio
+async def test_gatt_notify_timestamps():
+    uuid = AtmotubeProGATT_UUID.SGPC3
+    client = AsyncMock(spec=BleakClient)
+    callback = Mock()
+
+    # Packet classes are only passed the keywords they take
+    for packet_cls in (AtmotubeProSGPC3, DateTimePacket):
+        await gatt_notify(client, uuid, packet_cls, callback,
+                          clock_ns=lambda: 1_704_110_400_000_000_000)
+        packet_callback = client.start_notify.call_args[0][1]
+        packet_callback(None, TEST_PACKETS[uuid])
+        assert callback.call_args.args[0].date_time == \
+            datetime_from_ns(1_704_110_400_000_000_000)
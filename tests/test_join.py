@@ -0,0 +1,127 @@
+import pytest
+
+import asyncio
+from unittest.mock import Mock
+
+from atmotube import (
+    AtmotubeProStatus,
+    AtmotubeProSPS30,
+    AtmotubeProBME280,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEScanResponse,
+    Reading,
+    ReadingJoiner,
+    fake_clients,
+    get_available_characteristics,
+    start_gatt_notifications,
+    virtual_fleet)
+from atmotube.clock import datetime_from_ns
+from atmotube.gatt import ATMOTUBE_PRO_PACKETS
+
+SECOND = 1_000_000_000
+STATUS_BYTE = b'Ad'
+SPS30_BYTE = b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00'
+BME280_BYTE = b'\x0e\x17\x8ao\x01\x00\x1a\t'
+SGPC3_BYTE = b'\x02\x00\x00\x00'
+
+
+def test_join_on_update():
+    readings = []
+    joiner = ReadingJoiner(readings.append)
+    joiner.update(AtmotubeProSGPC3(SGPC3_BYTE, timestamp_ns=1), "AA")
+    joiner.update(AtmotubeProSPS30.record(SPS30_BYTE, timestamp_ns=2), "AA")
+    joiner.update(AtmotubeProStatus(STATUS_BYTE, timestamp_ns=3), "BB")
+    joiner.update(AtmotubeProBME280(BME280_BYTE, timestamp_ns=4), "AA")
+    assert readings[0] == Reading(1, "AA", None, None, None, None, None,
+                                  None, None, 0.002, None)
+    assert readings[1].pm2_5 == 1.85 and readings[1].tvoc == 0.002
+    assert readings[2] == Reading(3, "BB", *[None] * 8, 100)
+    assert readings[3].timestamp_ns == 4
+    assert readings[3].date_time == datetime_from_ns(4)
+    assert (readings[3].humidity, readings[3].temperature) == (14, 23.3)
+    assert readings[3].pm2_5 == 1.85
+    assert len(joiner) == 2
+    with pytest.raises(TypeError):
+        joiner.update(AtmotubeProBLEScanResponse(
+            b'\x00\x02\x00\x03\x00\x04t\x05\x1e'))
+
+
+def test_join_staleness():
+    readings = []
+    joiner = ReadingJoiner(readings.append, max_age=10)
+    joiner.update(AtmotubeProSGPC3(SGPC3_BYTE, timestamp_ns=0))
+    joiner.update(AtmotubeProStatus(STATUS_BYTE, timestamp_ns=10 * SECOND))
+    joiner.update(AtmotubeProStatus(STATUS_BYTE,
+                                    timestamp_ns=10 * SECOND + 1))
+    assert [r.tvoc for r in readings] == [0.002, 0.002, None]
+    assert joiner.reading(timestamp_ns=30 * SECOND) is None
+    assert joiner.reading("CC") is None
+    forever = ReadingJoiner(Mock(), max_age=None)
+    forever.update(AtmotubeProSGPC3(SGPC3_BYTE, timestamp_ns=0))
+    assert forever.reading(timestamp_ns=10**6 * SECOND).tvoc == 0.002
+
+
+def test_join_tick():
+    readings = []
+    now = Mock(return_value=5 * SECOND)
+    joiner = ReadingJoiner(readings.append, max_age=10, clock_ns=now)
+    joiner._store(AtmotubeProSGPC3(SGPC3_BYTE, timestamp_ns=0), "AA")
+    joiner._store(AtmotubeProStatus(STATUS_BYTE, timestamp_ns=SECOND), "BB")
+    assert [r.address for r in joiner.tick()] == ["AA", "BB"]
+    assert all(r.timestamp_ns == 5 * SECOND for r in readings)
+    now.return_value = 11 * SECOND
+    assert [r.address for r in joiner.tick()] == ["BB"]
+    assert len(joiner) == 1
+    now.return_value = 12 * SECOND
+    assert joiner.tick() == []
+    assert len(joiner) == 0
+
+
+@pytest.mark.asyncio
+async def test_join_interval():
+    readings = []
+    joiner = ReadingJoiner(readings.append, interval=0.01)
+    joiner.update(AtmotubeProSGPC3(SGPC3_BYTE), "AA")
+    assert readings == []
+    await asyncio.sleep(0.055)
+    await joiner.close()
+    assert 3 <= len(readings) <= 6
+    stamps = [r.timestamp_ns for r in readings]
+    assert stamps == sorted(stamps)
+    with pytest.raises(ValueError):
+        ReadingJoiner(Mock(), interval=0)
+
+
+@pytest.mark.asyncio
+async def test_join_async_callback():
+    readings = []
+
+    async def callback(reading):
+        await asyncio.sleep(0)
+        readings.append(reading)
+
+    joiner = ReadingJoiner(callback)
+    await joiner.update(AtmotubeProSGPC3(SGPC3_BYTE), "AA")
+    ticked = ReadingJoiner(callback, interval=10)
+    ticked._store(AtmotubeProSGPC3(SGPC3_BYTE), "BB")
+    ticked.tick()
+    await ticked.close()
+    assert [r.address for r in readings] == ["AA", "BB"]
+
+
+@pytest.mark.asyncio
+async def test_join_gatt_notifications():
+    fleet = virtual_fleet(3)
+    readings = []
+    joiner = ReadingJoiner(readings.append)
+    for client in fake_clients(fleet, rate=5.0, count=10, speed=None):
+        async with client:
+            await start_gatt_notifications(
+                client, joiner.gatt_callback(client.address),
+                packet_list=get_available_characteristics(client))
+            await client.wait_replayed()
+    assert len(readings) == 3 * len(ATMOTUBE_PRO_PACKETS) * 10
+    assert len(joiner) == 3
+    for device in fleet:
+        reading = joiner.reading(device.address)
+        assert None not in reading
@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime
+
+from atmotube import (
+    AtmotubeProStatus,
+    AtmotubeProSPS30,
+    AtmotubeProBME280,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    VirtualAtmotube,
+    get_ble_packet)
+from atmotube.sink import TABLE_NAMES
+
+pa = pytest.importorskip("pyarrow")
+
+import pyarrow.parquet as pq  # noqa: E402
+
+from atmotube.parquet import SCHEMAS, ParquetSink  # noqa: E402
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0)
+
+PACKET_CLASSES = [AtmotubeProStatus, AtmotubeProSPS30, AtmotubeProBME280,
+                  AtmotubeProSGPC3, AtmotubeProBLEAdvertising,
+                  AtmotubeProBLEScanResponse]
+
+
+def test_schemas_match_packets():
+    for packet_cls in PACKET_CLASSES:
+        assert SCHEMAS[packet_cls].names == \
+            ["date_time", "address", *packet_cls._field_names_]
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_parquet_sink(tmp_path, format):
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    with ParquetSink(tmp_path, row_group_size=4, format=format) as sink:
+        for packet_cls in PACKET_CLASSES:
+            for timestamp_ns, payload in device.stream(packet_cls, count=10):
+                if packet_cls in (AtmotubeProBLEAdvertising,
+                                  AtmotubeProBLEScanResponse):
+                    packet = get_ble_packet(payload,
+                                            timestamp_ns=timestamp_ns)
+                else:
+                    packet = packet_cls(payload, timestamp_ns=timestamp_ns)
+                sink.write(packet, device.address)
+        # None readings are stored as nulls
+        sink.write(AtmotubeProSGPC3.record(b'\x00\x00\x00\x00',
+                                           datetime_obj))
+    assert sink.stats.rows == 61
+    assert sorted(path.parent.name for path in sink.paths) == \
+        ["advertising", "bme280", "scan_response", "sgpc3", "sps30",
+         "status"]
+    for path in sink.paths:
+        if format == "parquet":
+            table = pq.read_table(path)
+            row_groups = pq.ParquetFile(path).num_row_groups
+        else:
+            with pa.ipc.open_file(path) as reader:
+                table = reader.read_all()
+                row_groups = reader.num_record_batches
+        packet_cls = next(cls for cls, name in TABLE_NAMES.items()
+                          if name == path.parent.name)
+        assert table.schema == SCHEMAS[packet_cls]
+        assert row_groups == 3
+        if packet_cls is AtmotubeProSGPC3:
+            assert table.num_rows == 11
+            assert table.column("tvoc").null_count == 1
+            assert table.column("address").to_pylist()[-1] is None
+        else:
+            assert table.num_rows == 10
+            assert table.column("address").to_pylist() == \
+                [device.address] * 10
+
+
+def test_parquet_sink_rolls_files(tmp_path):
+    with ParquetSink(tmp_path, row_group_size=10, max_file_size=1) as sink:
+        for i in range(1, 31):
+            sink.write(AtmotubeProSGPC3.from_values(tvoc=i / 1000))
+    assert len(sink.paths) == 3
+    table = pa.concat_tables(pq.read_table(path) for path in sink.paths)
+    assert table.column("tvoc").to_pylist() == [i / 1000
+                                                for i in range(1, 31)]
+    with pytest.raises(ValueError):
+        ParquetSink(tmp_path, format="csv")
@@ -0,0 +1,170 @@
+import pytest
+from unittest.mock import Mock
+from bleak.exc import BleakCharacteristicNotFoundError
+
+import asyncio
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSPS30,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    CaptureReader,
+    CaptureWriter,
+    FakeBleakClient,
+    FakeBleakScanner,
+    ble_callback_wrapper,
+    get_available_characteristics,
+    start_gatt_notifications)
+
+SPS30_BYTE = bytes(b'd\x00\x00\xb9\x00\x00J\x01\x00o\x00\x00')
+SGPC3_BYTE = bytes(b'\x02\x00\x00\x00')
+ADV_BYTE = bytes(b'\x0052?\x16\x15\x00\x01i\x92Ac')
+SCN_BYTE = bytes(b'\x00\x02\x00\x03\x00\x04t\x05\x1e')
+
+STREAMS = {AtmotubeProGATT_UUID.SPS30: [(i * 10**8, SPS30_BYTE)
+                                        for i in range(5)],
+           AtmotubeProGATT_UUID.SGPC3: [(i * 10**8, SGPC3_BYTE)
+                                        for i in range(3)]}
+
+
+@pytest.mark.asyncio
+async def test_fake_client_replay():
+    packets = []
+    async with FakeBleakClient("AA:BB", STREAMS, speed=None) as client:
+        assert client.is_connected
+        packet_list = get_available_characteristics(client)
+        assert set(packet_list) == {
+            (AtmotubeProGATT_UUID.SPS30, AtmotubeProSPS30),
+            (AtmotubeProGATT_UUID.SGPC3, AtmotubeProSGPC3)}
+        await start_gatt_notifications(client, packets.append,
+                                       packet_list=packet_list)
+        await client.wait_replayed()
+    assert not client.is_connected
+    assert client.stats.delivered == 8
+    assert sum(isinstance(p, AtmotubeProSPS30) for p in packets) == 5
+    assert sum(isinstance(p, AtmotubeProSGPC3) for p in packets) == 3
+
+
+@pytest.mark.asyncio
+async def test_fake_client_speed():
+    loop = asyncio.get_running_loop()
+    callback = Mock()
+    client = FakeBleakClient("AA:BB", STREAMS, speed=20.0)
+    started = loop.time()
+    await start_gatt_notifications(
+        client, callback, packet_list=[(AtmotubeProGATT_UUID.SPS30,
+                                        AtmotubeProSPS30)])
+    await client.wait_replayed()
+    # 0.4s of data at 20x takes at least 0.02s
+    assert loop.time() - started >= 0.019
+    assert callback.call_count == 5
+
+
+@pytest.mark.asyncio
+async def test_fake_client_stop_notify():
+    callback = Mock()
+    client = FakeBleakClient("AA:BB", STREAMS, speed=1.0)
+    await client.start_notify(AtmotubeProGATT_UUID.SPS30, callback)
+    await asyncio.sleep(0.01)
+    await client.stop_notify(AtmotubeProGATT_UUID.SPS30)
+    await client.wait_replayed()
+    assert callback.call_count == 1
+    with pytest.raises(BleakCharacteristicNotFoundError):
+        await client.start_notify("00001234-0000-1000-8000-00805f9b34fb",
+                                  callback)
+
+
+@pytest.mark.asyncio
+async def test_fake_client_resumes():
+    callback = Mock()
+    client = FakeBleakClient("AA:BB", STREAMS, speed=2.0)
+    await client.connect()
+    await client.start_notify(AtmotubeProGATT_UUID.SPS30, callback)
+    await asyncio.sleep(0.02)
+    await client.disconnect()
+    assert callback.call_count == 1
+    # after reconnecting the stream carries on where it stopped
+    await client.connect()
+    await client.start_notify(AtmotubeProGATT_UUID.SPS30, callback)
+    await client.wait_replayed()
+    assert callback.call_count == 5
+    assert client.stats.delivered == 5
+
+
+@pytest.mark.asyncio
+async def test_fake_client_resumes_on_schedule():
+    # with start_ns set, a resumed stream carries on from its next payload
+    # rather than waiting out the time it was stopped for
+    callback = Mock()
+    stream = {AtmotubeProGATT_UUID.SPS30: [(i * 10**8, SPS30_BYTE)
+                                           for i in range(20)]}
+    client = FakeBleakClient("AA:BB", stream, speed=1.0, start_ns=0)
+    await client.start_notify(AtmotubeProGATT_UUID.SPS30, callback)
+    await asyncio.sleep(0.25)
+    await client.stop_notify(AtmotubeProGATT_UUID.SPS30)
+    assert callback.call_count == 3
+    await asyncio.sleep(0.3)
+    await client.start_notify(AtmotubeProGATT_UUID.SPS30, callback)
+    await asyncio.sleep(0.15)
+    await client.stop_notify(AtmotubeProGATT_UUID.SPS30)
+    assert callback.call_count == 5
+
+
+@pytest.mark.asyncio
+async def test_fake_client_async_callbacks():
+    # async callbacks run as tasks, like with bleak, so a slow callback
+    # doesn't hold up the next payload
+    started = []
+    finished = []
+
+    async def callback(char, data):
+        started.append(data)
+        await asyncio.sleep(0.01)
+        finished.append(data)
+    client = FakeBleakClient("AA:BB", STREAMS, speed=None)
+    await client.start_notify(AtmotubeProGATT_UUID.SGPC3, callback)
+    await asyncio.gather(*client._tasks.values())
+    assert len(started) == 3 and not finished
+    await client.wait_replayed()
+    assert len(finished) == 3
+
+
+@pytest.mark.asyncio
+async def test_fake_scanner_replay():
+    received = []
+    devices = {"AA:BB": [(0, ADV_BYTE), (20, SCN_BYTE)],
+               "CC:DD": [(10, SCN_BYTE), (30, ADV_BYTE)]}
+    callback = ble_callback_wrapper(
+        lambda device, packet: received.append((device.address, packet)))
+    async with FakeBleakScanner(callback, devices, speed=None) as scanner:
+        await scanner.wait_replayed()
+    assert [address for address, _ in received] == ["AA:BB", "CC:DD",
+                                                    "AA:BB", "CC:DD"]
+    assert [type(packet) for _, packet in received] == [
+        AtmotubeProBLEAdvertising, AtmotubeProBLEScanResponse,
+        AtmotubeProBLEScanResponse, AtmotubeProBLEAdvertising]
+    assert scanner.stats.delivered == 4
+
+
+@pytest.mark.asyncio
+async def test_replay_from_capture(tmp_path):
+    path = tmp_path / "capture.bin"
+    with CaptureWriter(path) as writer:
+        tap = writer.gatt_tap("AA:BB")
+        for _ in range(3):
+            tap(AtmotubeProGATT_UUID.SPS30, SPS30_BYTE)
+        writer.ble_tap()(Mock(address="CC:DD"), ADV_BYTE)
+
+    callback = Mock()
+    with CaptureReader(path) as reader:
+        client = FakeBleakClient.from_capture(reader, "AA:BB", speed=None)
+        scanner = FakeBleakScanner.from_capture(callback, reader, speed=None)
+    await start_gatt_notifications(
+        client, callback, packet_list=get_available_characteristics(client))
+    await client.wait_replayed()
+    assert callback.call_count == 3
+    async with scanner:
+        await scanner.wait_replayed()
+    assert callback.call_count == 4
@@ -0,0 +1,229 @@
+import pytest
+
+import asyncio
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    DeviceStats,
+    FakeBleakClient,
+    GATTSession,
+    fake_clients,
+    virtual_fleet)
+from atmotube.gatt import ATMOTUBE_PRO_PACKETS
+
+
+class SlowClient(FakeBleakClient):
+    # Records how many clients are connecting at the same time
+    connecting = 0
+    max_connecting = 0
+
+    async def connect(self, **kwargs) -> bool:
+        SlowClient.connecting += 1
+        SlowClient.max_connecting = max(SlowClient.max_connecting,
+                                        SlowClient.connecting)
+        await asyncio.sleep(0.01)
+        SlowClient.connecting -= 1
+        return await super().connect(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_session_routes_packets():
+    clients = {client.address: client
+               for client in fake_clients(virtual_fleet(5), count=4,
+                                          speed=None)}
+    received = []
+    session = GATTSession(clients, lambda address, packet: received.append(
+                              (address, type(packet))),
+                          client_factory=clients.__getitem__)
+    async with session:
+        assert sorted(session.connected) == sorted(clients)
+        for client in clients.values():
+            await client.wait_replayed()
+    assert not any(client.is_connected for client in clients.values())
+    assert len(received) == 5 * len(ATMOTUBE_PRO_PACKETS) * 4
+    assert {address for address, _ in received} == set(clients)
+    for stats in session.stats.values():
+        assert stats.packets == len(ATMOTUBE_PRO_PACKETS) * 4
+        assert stats.connect_time >= 0
+        assert stats.packet_rate > 0
+        assert stats.error is None
+
+
+@pytest.mark.asyncio
+async def test_session_concurrency_limit():
+    async def callback(address, packet):
+        pass
+
+    addresses = [f"AA:{i:02X}" for i in range(8)]
+    session = GATTSession(
+        addresses, callback, max_concurrent=3,
+        client_factory=lambda address: SlowClient(address, {}, speed=None))
+    await session.start()
+    assert SlowClient.max_connecting == 3
+    assert session.connected == addresses
+    assert all(stats.connect_time >= 0.01
+               for stats in session.stats.values())
+    await session.stop()
+    assert session.clients == {}
+
+
+@pytest.mark.asyncio
+async def test_session_failed_connection():
+    def factory(address):
+        if address == "BAD":
+            raise OSError("no such device")
+        return FakeBleakClient(address, {
+            AtmotubeProGATT_UUID.SGPC3: [(0, b'\x02\x00\x00\x00')]
+        }, speed=None)
+
+    received = []
+    session = GATTSession(["GOOD", "BAD"],
+                          lambda address, record: received.append(record),
+                          client_factory=factory, records=True)
+    async with session:
+        assert session.connected == ["GOOD"]
+        await session.clients["GOOD"].wait_replayed()
+        assert received[0].tvoc == 0.002
+        assert isinstance(session.stats["BAD"].error, OSError)
+    with pytest.raises(ValueError):
+        GATTSession(["GOOD"], print, max_concurrent=0)
+
+
+@pytest.mark.asyncio
+async def test_session_reconnects_after_link_loss():
+    stream = [(i * 10**7, b'\x02\x00\x00\x00') for i in range(100)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: stream})
+    received = []
+    session = GATTSession(["AA"], lambda address, packet: received.append(
+                              packet), client_factory=lambda address: client,
+                          reconnect=True, expected_interval=0.1,
+                          backoff=0.01)
+    async with session:
+        await asyncio.sleep(0.1)
+        await client.disconnect()
+        await asyncio.sleep(0.2)
+        assert session.connected == ["AA"]
+    stats = session.stats["AA"]
+    assert stats.reconnects == 1
+    assert stats.connections == 2
+    assert stats.total_connect_time >= stats.connect_time >= 0
+    assert stats.connected_at is None
+    assert len(session.gaps) == 1
+    gap = session.gaps[0]
+    assert gap.address == "AA"
+    assert gap.uuid == AtmotubeProGATT_UUID.SGPC3
+    assert gap.start in [packet.date_time for packet in received]
+    assert gap.end in [packet.date_time for packet in received]
+    assert gap.start < gap.end
+
+
+@pytest.mark.asyncio
+async def test_session_reconnects_stalled_characteristic():
+    # five notifications, then nothing for a second
+    stream = [(i * 10**7, b'\x02\x00\x00\x00') for i in range(5)] + \
+        [(10**9, b'\x02\x00\x00\x00')]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: stream,
+                                    AtmotubeProGATT_UUID.STATUS: []})
+    session = GATTSession(["AA"], lambda address, packet: None,
+                          client_factory=lambda address: client,
+                          reconnect=True, backoff=0.01, expected_interval={
+                              AtmotubeProGATT_UUID.SGPC3: 0.02})
+    async with session:
+        await asyncio.sleep(0.2)
+    assert session.stats["AA"].reconnects >= 1
+    assert session.gaps
+    assert all(gap.uuid == AtmotubeProGATT_UUID.SGPC3
+               for gap in session.gaps)
+
+
+@pytest.mark.asyncio
+async def test_session_resubscribes_stalled_characteristic():
+    # the SGPC3 stalls while the status keeps notifying, so only the SGPC3
+    # is re-subscribed to, its gap closes when its last packet arrives and
+    # opens again once the stream has run out
+    stream = [(i * 10**7, b'\x02\x00\x00\x00') for i in range(5)] + \
+        [(10**9, b'\x02\x00\x00\x00')]
+    client = FakeBleakClient("AA", {
+        AtmotubeProGATT_UUID.SGPC3: stream,
+        AtmotubeProGATT_UUID.STATUS: [(i * 10**7, b'Ad')
+                                      for i in range(40)]})
+    session = GATTSession(["AA"], lambda address, packet: None,
+                          client_factory=lambda address: client,
+                          reconnect=True, backoff=0.01, expected_interval=0.02)
+    async with session:
+        await asyncio.sleep(0.25)
+        assert session.open_gaps
+    stats = session.stats["AA"]
+    assert stats.reconnects == 0
+    assert stats.resubscribes >= 1
+    assert all(gap.uuid == AtmotubeProGATT_UUID.SGPC3
+               for gap in session.gaps)
+    assert session.gaps[0].start < session.gaps[0].end
+    assert session.gaps[-1].end is None
+    assert session.open_gaps == []
+
+
+@pytest.mark.asyncio
+async def test_session_keeps_gaps_of_lost_devices():
+    class OnceClient(FakeBleakClient):
+        async def connect(self, **kwargs) -> bool:
+            if self.stats.delivered:
+                raise OSError("no such device")
+            return await super().connect(**kwargs)
+
+    stream = [(i * 10**7, b'\x02\x00\x00\x00') for i in range(100)]
+    client = OnceClient("AA", {AtmotubeProGATT_UUID.SGPC3: stream})
+    session = GATTSession(["AA"], lambda address, packet: None,
+                          client_factory=lambda address: client,
+                          reconnect=True, expected_interval=0.02,
+                          backoff=0.01)
+    async with session:
+        await asyncio.sleep(0.05)
+        await client.disconnect()
+        await asyncio.sleep(0.05)
+        assert [gap.end for gap in session.open_gaps] == [None]
+        assert session.gaps == []
+    assert len(session.gaps) == 1
+    assert session.gaps[0].uuid == AtmotubeProGATT_UUID.SGPC3
+    assert session.gaps[0].end is None
+
+
+@pytest.mark.asyncio
+async def test_session_retries_first_connection():
+    attempts = []
+
+    def factory(address):
+        attempts.append(address)
+        if len(attempts) < 3:
+            raise OSError("no such device")
+        return FakeBleakClient(address, {}, speed=None)
+
+    session = GATTSession(["AA"], lambda address, packet: None,
+                          client_factory=factory, reconnect=True,
+                          backoff=0.01)
+    async with session:
+        assert session.connected == []
+        assert isinstance(session.stats["AA"].error, OSError)
+        await asyncio.sleep(0.1)
+        assert session.connected == ["AA"]
+        assert session.stats["AA"].error is None
+    assert len(attempts) == 3
+
+
+def test_device_stats_every_connection():
+    now = [0.0]
+    stats = DeviceStats("AA", lambda: now[0])
+    now[0] = 2.0
+    stats._connected(0.0)
+    stats.packets = 10
+    now[0] = 12.0
+    stats._disconnected()
+    # the time spent disconnected and reconnecting isn't counted
+    now[0] = 100.0
+    stats._connected(99.0)
+    assert stats.connect_time == 1.0
+    assert stats.total_connect_time == 3.0
+    assert stats.connections == 2
+    stats.packets = 20
+    now[0] = 110.0
+    assert stats.packet_rate == 1.0
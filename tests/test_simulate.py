@@ -0,0 +1,74 @@
+import pytest
+
+from atmotube import (
+    AtmotubeProSPS30,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    VirtualAtmotube,
+    ble_callback_wrapper,
+    fake_clients,
+    fake_scanner,
+    get_available_characteristics,
+    get_ble_packet,
+    start_gatt_notifications,
+    virtual_fleet)
+from atmotube.gatt import ATMOTUBE_PRO_PACKETS
+
+
+def test_virtual_device_stream():
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    stream = list(device.stream(AtmotubeProSPS30, rate=10.0, count=20))
+    assert len(stream) == 20
+    timestamps = [t for t, _ in stream]
+    assert 0 <= timestamps[0] < 10**8
+    assert all(b - a == 10**8 for a, b in zip(timestamps, timestamps[1:]))
+    packets = [AtmotubeProSPS30(payload) for _, payload in stream]
+    assert all(p.pm1 < p.pm2_5 < p.pm4 < p.pm10 for p in packets)
+    # the same address always gives the same payloads
+    assert list(VirtualAtmotube("AA:BB:CC:DD:EE:FF").stream(
+        AtmotubeProSPS30, rate=10.0, count=20)) == stream
+
+
+def test_virtual_device_ble_stream():
+    device = VirtualAtmotube("AA:BB:CC:DD:EE:FF")
+    packets = [get_ble_packet(payload) for _, payload in device.stream(
+        (AtmotubeProBLEAdvertising, AtmotubeProBLEScanResponse), count=4)]
+    assert [type(p) for p in packets] == [AtmotubeProBLEAdvertising,
+                                          AtmotubeProBLEScanResponse] * 2
+    assert packets[0].device_id == packets[2].device_id == device.device_id
+    assert packets[1].firmware_version == device.firmware_version
+
+
+def test_virtual_fleet():
+    fleet = virtual_fleet(300)
+    assert len({device.address for device in fleet}) == 300
+    assert [device.address for device in virtual_fleet(300)] == \
+        [device.address for device in fleet]
+    assert fleet[0].device_id == virtual_fleet(1)[0].device_id
+    assert fleet[0].device_id != virtual_fleet(1, seed=1)[0].device_id
+
+
+@pytest.mark.asyncio
+async def test_fake_clients():
+    packets = []
+    for client in fake_clients(virtual_fleet(3), rate=5.0, count=10,
+                               speed=None):
+        async with client:
+            await start_gatt_notifications(
+                client, packets.append,
+                packet_list=get_available_characteristics(client))
+            await client.wait_replayed()
+    assert len(packets) == 3 * len(ATMOTUBE_PRO_PACKETS) * 10
+
+
+@pytest.mark.asyncio
+async def test_fake_scanner():
+    addresses = []
+    scanner = fake_scanner(
+        ble_callback_wrapper(lambda device, packet: addresses.append(
+            device.address)),
+        virtual_fleet(4), rate=2.0, count=10, speed=None)
+    async with scanner:
+        await scanner.wait_replayed()
+    assert len(addresses) == 40
+    assert len(set(addresses)) == 4
@@ -0,0 +1,85 @@
+import pytest
+
+import threading
+from datetime import datetime
+
+from atmotube import (
+    AtmotubeProSGPC3,
+    AtmotubeProBME280,
+    Sink)
+from atmotube.clock import ns_from_datetime
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0)
+timestamp_ns = ns_from_datetime(datetime_obj)
+
+
+class ListSink(Sink):
+    def __init__(self, *args, fail: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = []
+        self.threads = set()
+        self.closed = False
+        self.fail = fail
+
+    def _write_rows(self, packet_cls, rows):
+        self.threads.add(threading.get_ident())
+        if self.fail:
+            raise OSError("disk full")
+        self.groups.append((packet_cls, rows))
+
+    def _close(self):
+        self.closed = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def sgpc3(i):
+    return AtmotubeProSGPC3.from_values(datetime_obj, tvoc=i / 1000)
+
+
+def test_sink_row_groups():
+    with ListSink(row_group_size=3) as sink:
+        for i in range(1, 8):
+            sink.write(sgpc3(i), "AA")
+        sink.write(AtmotubeProBME280.record(b'\x0e\x17\x8ao\x01\x00\x1a\t',
+                                            datetime_obj))
+    assert sink.closed
+    assert threading.get_ident() not in sink.threads
+    assert [len(rows) for cls, rows in sink.groups
+            if cls is AtmotubeProSGPC3] == [3, 3, 1]
+    assert sink.groups[0][1][0] == (timestamp_ns, "AA", 0.001)
+    assert (AtmotubeProBME280, [(timestamp_ns, None, 14, 23.3, 940.9)]) \
+        in sink.groups
+    assert (sink.stats.rows, sink.stats.row_groups) == (8, 4)
+    with pytest.raises(ValueError):
+        sink.write(sgpc3(1))
+    with pytest.raises(ValueError):
+        ListSink(row_group_size=0)
+
+
+def test_sink_flush_interval():
+    clock = FakeClock()
+    sink = ListSink(row_group_size=100, flush_interval=0.01, clock=clock)
+    sink.write_many([sgpc3(1), sgpc3(2)])
+    clock.now = 1.0
+    # the writer thread polls at the flush interval
+    for _ in range(100):
+        if sink.groups:
+            break
+        threading.Event().wait(0.01)
+    assert [len(rows) for _, rows in sink.groups] == [2]
+    sink.close()
+
+
+def test_sink_write_errors():
+    sink = ListSink(row_group_size=2, fail=True)
+    sink.write_many([sgpc3(i) for i in range(1, 4)])
+    sink.close()
+    assert (sink.stats.rows, sink.stats.dropped) == (0, 3)
+    assert isinstance(sink.stats.error, OSError)
@@ -0,0 +1,76 @@
+import pytest
+
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from atmotube import (
+    AtmotubeProStatus,
+    AtmotubeProSPS30,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    SQLiteSink,
+    ble_callback_wrapper,
+    fake_scanner,
+    virtual_fleet)
+from atmotube.sqlite import query
+
+datetime_obj = datetime(2024, 1, 1, 12, 0, 0, 123456)
+
+
+def test_sqlite_sink_round_trip(tmp_path):
+    path = tmp_path / "atmotube.db"
+    payloads = [(AtmotubeProStatus, b'Ad'),
+                (AtmotubeProSPS30,
+                 b'\xff\xff\xff\x00\x00\x00J\x01\x00\x01\x00\x80'),
+                (AtmotubeProBLEScanResponse,
+                 b'\x00\x02\x00\x03\x00\x04t\x05\x1e')]
+    with SQLiteSink(path, row_group_size=2) as sink:
+        for packet_cls, payload in payloads:
+            sink.write(packet_cls.record(payload, datetime_obj), "AA")
+    assert sink.stats.rows == 3
+    for packet_cls, payload in payloads:
+        assert list(sink.query(packet_cls, "AA")) == \
+            [packet_cls.record(payload, datetime_obj)]
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone() == \
+            ("wal",)
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM sps30 WHERE device IS ? "
+            "AND timestamp >= ? AND timestamp < ?", ("AA", 0, 1)).fetchall()
+        assert "sps30_device_timestamp" in str(plan)
+
+
+def test_sqlite_query_time_range(tmp_path):
+    path = tmp_path / "atmotube.db"
+    times = [datetime_obj + timedelta(seconds=i) for i in range(10)]
+    with SQLiteSink(path) as sink:
+        for i, date_time in enumerate(times):
+            for address in ("AA", "BB"):
+                sink.write(AtmotubeProSGPC3.from_values(date_time,
+                                                        tvoc=i / 1000),
+                           address)
+        sink.write(AtmotubeProSGPC3.from_values(datetime_obj, tvoc=None))
+    rows = list(query(path, AtmotubeProSGPC3, "BB", times[2], times[5]))
+    assert [row.date_time for row in rows] == times[2:5]
+    assert [row.tvoc for row in rows] == [0.002, 0.003, 0.004]
+    assert len(list(query(path, AtmotubeProSGPC3, "AA"))) == 10
+    assert [row.tvoc for row in query(path, AtmotubeProSGPC3, None)] == \
+        [None]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sink_ble_callback(tmp_path):
+    fleet = virtual_fleet(2)
+    path = tmp_path / "atmotube.db"
+    sink = SQLiteSink(path)
+    callback = ble_callback_wrapper(sink.ble_callback)
+    async with fake_scanner(callback, fleet, count=20, speed=None) as scanner:
+        await scanner.wait_replayed()
+    sink.close()
+    for device in fleet:
+        rows = list(sink.query(AtmotubeProBLEAdvertising, device.address))
+        assert len(rows) == 10
+        assert all(row.device_id == device.device_id for row in rows)
+        assert isinstance(rows[0].charging, bool)
@@ -0,0 +1,209 @@
+import pytest
+
+import asyncio
+
+from atmotube import (
+    AtmotubeProGATT_UUID,
+    AtmotubeProSGPC3,
+    AtmotubeProBLEAdvertising,
+    AtmotubeProBLEScanResponse,
+    Delivery,
+    FakeBleakClient,
+    FakeBleakScanner,
+    OverflowPolicy,
+    PacketBuffer,
+    StreamStats,
+    ble_stream,
+    stream,
+    virtual_fleet)
+
+
+def fill(buffer, items):
+    for key, item in items:
+        buffer.put_nowait(key, item)
+
+
+async def drain(buffer):
+    buffer.close()
+    return [item async for item in buffer]
+
+
+@pytest.mark.asyncio
+async def test_buffer_drop_policies():
+    items = [("a", 1), ("b", 2), ("a", 3), ("a", 4), ("c", 5)]
+    expected = {OverflowPolicy.DROP_OLDEST: [3, 4, 5],
+                OverflowPolicy.DROP_NEWEST: [1, 2, 3],
+                OverflowPolicy.COALESCE: [4, 2, 5]}
+    for policy, delivered in expected.items():
+        buffer = PacketBuffer(maxsize=3, policy=policy)
+        fill(buffer, items)
+        assert await drain(buffer) == delivered
+        assert (buffer.stats.received, buffer.stats.delivered,
+                buffer.stats.dropped) == (5, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_buffer_coalesce_keeps_key_order():
+    buffer = PacketBuffer(maxsize=10, policy="coalesce")
+    fill(buffer, [("a", 1), ("b", 2), ("a", 3)])
+    assert await drain(buffer) == [3, 2]
+    assert buffer.stats.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_block():
+    buffer = PacketBuffer(maxsize=2)
+    fill(buffer, [("a", 1), ("a", 2)])
+    with pytest.raises(asyncio.QueueFull):
+        buffer.put_nowait("a", 3)
+    putter = asyncio.create_task(buffer.put("a", 3))
+    await asyncio.sleep(0)
+    assert not putter.done()
+    assert await buffer.get() == 1
+    await putter
+    assert await drain(buffer) == [2, 3]
+    assert buffer.stats.dropped == 0
+    with pytest.raises(ValueError):
+        PacketBuffer(maxsize=0)
+
+
+@pytest.mark.asyncio
+async def test_buffer_block_keeps_order():
+    buffer = PacketBuffer(maxsize=1, max_waiting=2)
+    buffer.put_nowait("a", 1)
+    waiting = asyncio.create_task(buffer.put("a", 2))
+    await asyncio.sleep(0)
+    # the slot freed by get goes straight to the waiting put
+    assert await buffer.get() == 1
+    with pytest.raises(asyncio.QueueFull):
+        buffer.put_nowait("a", 0)
+    # a third waiting put is over max_waiting, and is dropped
+    late = [asyncio.create_task(buffer.put("a", i)) for i in (3, 4, 5)]
+    await asyncio.sleep(0)
+    assert await buffer.get() == 2
+    assert await buffer.get() == 3
+    await asyncio.gather(waiting, *late)
+    assert await drain(buffer) == [4]
+    assert (buffer.stats.received, buffer.stats.delivered,
+            buffer.stats.dropped) == (5, 4, 1)
+
+
+@pytest.mark.asyncio
+async def test_buffer_block_cancel_and_close():
+    buffer = PacketBuffer(maxsize=1, max_waiting=2)
+    buffer.put_nowait("a", 1)
+    cancelled = asyncio.create_task(buffer.put("a", 2))
+    closed = asyncio.create_task(buffer.put("a", 3))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    assert await buffer.get() == 1
+    assert await drain(buffer) == [3]
+    await closed
+    buffer = PacketBuffer(maxsize=1)
+    buffer.put_nowait("a", 1)
+    closed = asyncio.create_task(buffer.put("a", 2))
+    await asyncio.sleep(0)
+    assert await drain(buffer) == [1]
+    await closed
+    assert (buffer.stats.received, buffer.stats.delivered,
+            buffer.stats.dropped) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_buffer_waits_for_packets():
+    buffer = PacketBuffer()
+    getter = asyncio.create_task(buffer.get())
+    await asyncio.sleep(0)
+    buffer.put_nowait("a", 1)
+    assert await getter == 1
+
+
+@pytest.mark.asyncio
+async def test_gatt_stream():
+    payloads = [(i * 10**6, bytes([i, 0, 0, 0])) for i in range(1, 11)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    stats = StreamStats()
+    received = []
+    async with client:
+        packets = stream(client, [(AtmotubeProGATT_UUID.SGPC3,
+                                   AtmotubeProSGPC3)],
+                         maxsize=5, policy=OverflowPolicy.BLOCK,
+                         stats=stats, records=True)
+        async for record in packets:
+            received.append(record.tvoc)
+            await asyncio.sleep(0.001)
+            if len(received) == 10:
+                break
+        await packets.aclose()
+        # the stream stopped the notifications
+        assert client._tasks == {}
+    # every notification is a task, so blocking delivers every packet, in
+    # order, while they fit in the buffer and the waiting puts
+    assert received == [i / 1000 for i in range(1, 11)]
+    assert stats.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_gatt_stream_drops():
+    payloads = [(i, bytes([i, 0, 0, 0])) for i in range(1, 11)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    stats = StreamStats()
+    async with client:
+        packets = stream(client, [(AtmotubeProGATT_UUID.SGPC3,
+                                   AtmotubeProSGPC3)],
+                         maxsize=3, policy=OverflowPolicy.DROP_OLDEST,
+                         stats=stats)
+        first = await anext(packets)
+        await client.wait_replayed()
+        rest = [await anext(packets) for _ in range(3)]
+        await packets.aclose()
+    assert first.tvoc == 0.001
+    assert [packet.tvoc for packet in rest] == [0.008, 0.009, 0.010]
+    assert (stats.received, stats.delivered, stats.dropped) == (10, 4, 6)
+
+
+@pytest.mark.asyncio
+async def test_gatt_stream_counts_last_batch():
+    # the last batch is flushed when the stream stops, with no one left to
+    # read it, so it is counted as dropped
+    payloads = [(i, bytes([i, 0, 0, 0])) for i in range(1, 11)]
+    client = FakeBleakClient("AA", {AtmotubeProGATT_UUID.SGPC3: payloads},
+                             speed=None)
+    stats = StreamStats()
+    async with client:
+        packets = stream(client, [(AtmotubeProGATT_UUID.SGPC3,
+                                   AtmotubeProSGPC3)],
+                         stats=stats, delivery=Delivery(3, None))
+        batches = [await anext(packets) for _ in range(3)]
+        await client.wait_replayed()
+        await packets.aclose()
+    assert [len(batch) for batch in batches] == [3, 3, 3]
+    assert (stats.received, stats.delivered, stats.dropped) == (4, 3, 1)
+    buffer = PacketBuffer()
+    buffer.close()
+    buffer.put_nowait("a", 1)
+    assert (buffer.stats.received, buffer.stats.dropped) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_ble_stream():
+    fleet = virtual_fleet(3)
+    devices = {device.address: device.stream(
+        (AtmotubeProBLEAdvertising, AtmotubeProBLEScanResponse), count=10)
+        for device in fleet}
+    stats = StreamStats()
+    latest = {}
+    packets = ble_stream(lambda callback: FakeBleakScanner(
+                             callback, devices, speed=None),
+                         maxsize=100, policy=OverflowPolicy.COALESCE,
+                         stats=stats)
+    async for device, packet in packets:
+        latest[device.address, type(packet)] = packet
+        if len(latest) == 6 and stats.received == 30:
+            break
+    await packets.aclose()
+    assert stats.received == 30
+    assert stats.delivered + stats.dropped == 30